@@ -1,13 +1,23 @@
 import os
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
-from flask import session
+from flask import session, stream_template, get_flashed_messages, Response, jsonify, send_file, abort
+from werkzeug.http import parse_content_range_header
 from werkzeug.utils import secure_filename
-from models import Product, Lead, Visitor, SiteSettings, AdminUser, ProductImage, Category, db
-from forms import LoginForm, ProductForm, SiteSettingsForm, AdminPageForm, CategoryForm
+from models import Product, Lead, SiteSettings, AdminUser, ProductImage, Category, db
+from models import ProductPair, RelatedProduct, ProductTrend, StockReservation
+from forms import LoginForm, ProductForm, SiteSettingsForm, AdminPageForm, CategoryForm, ProductImportForm
 from datetime import datetime, timedelta
 import json
 import csv
+import tempfile
 from io import StringIO
+import catalog_io
+import tasks
+import visitors
+import pricing
+import reporting
+import uploads
+import profiling
 
 bp = Blueprint('admin', __name__)
 
@@ -43,8 +53,10 @@ def get_site_settings():
 
 def calculate_analytics():
     """Calculate analytics for dashboard"""
-    # Total visitors
-    total_visitors = Visitor.query.count()
+    # Unique visitors are estimated from HyperLogLog sketches; include this
+    # worker's buffered visits
+    visitors.flush()
+    total_visitors = visitors.unique_visitors()
     
     # Total product views (sum of all product views)
     total_product_views = db.session.query(db.func.sum(Product.views)).scalar() or 0
@@ -52,9 +64,9 @@ def calculate_analytics():
     # Recent orders (last 10)
     recent_orders = Lead.query.order_by(Lead.created_at.desc()).limit(10).all()
     
-    # Visitors in last 30 days
+    # Visitors in last 30 days: a merge of 30 daily sketches
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_visitors = Visitor.query.filter(Visitor.last_seen >= thirty_days_ago).count()
+    recent_visitors = visitors.unique_visitors(days=30)
     
     # Product views in last 30 days
     recent_products = Product.query.filter(Product.created_at >= thirty_days_ago).all()
@@ -69,7 +81,8 @@ def calculate_analytics():
         'recent_orders': recent_orders,
         'recent_visitors': recent_visitors,
         'recent_product_views': recent_product_views,
-        'recent_orders_count': recent_orders_count
+        'recent_orders_count': recent_orders_count,
+        'visitor_error_percent': round(visitors.RELATIVE_ERROR * 100, 1)
     }
 
 @bp.route('/login', methods=['GET', 'POST'])
@@ -104,18 +117,140 @@ def dashboard():
     
     # Top products by views
     top_products = Product.query.order_by(Product.views.desc()).limit(5).all()
+    unique_viewers = visitors.unique_viewers_by_product([p.id for p in top_products], days=30)
     
     return render_template('admin/dashboard.html', 
                          analytics=analytics,
                          settings=settings,
-                         top_products=top_products)
+                         top_products=top_products,
+                         unique_viewers=unique_viewers)
+
+def filtered_products_query(args):
+    """Build the product list query from the list filters (category, status)"""
+    query = Product.query
+    category_id = args.get('filter_category_id', type=int)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    status = args.get('filter_status', '')
+    if status == 'active':
+        query = query.filter(Product.active == True)
+    elif status == 'inactive':
+        query = query.filter(Product.active == False)
+    elif status == 'hot':
+        query = query.filter(Product.is_hot_product == True)
+    return query
 
 @bp.route('/products')
 @admin_required
 def products():
-    products = Product.query.all()
+    products = filtered_products_query(request.args).all()
     settings = get_site_settings()
-    return render_template('admin/products.html', products=products, settings=settings)
+    categories = Category.query.all()
+    return render_template('admin/products.html', products=products, settings=settings, categories=categories)
+
+# Bulk actions that map to a single set-based UPDATE
+BULK_FLAG_ACTIONS = {
+    'activate': {'active': True},
+    'deactivate': {'active': False},
+    'mark_hot': {'is_hot_product': True},
+    'unmark_hot': {'is_hot_product': False},
+    'clear_discount': {'per_product_discount': None, 'discount_override': None},
+}
+
+def delete_products(ids):
+    """Delete products and every row that refers to them; the caller commits
+
+    SQLite does not enforce the foreign keys, so the images, reservations,
+    trend scores and related/co-purchase rows are deleted here as well.
+    """
+    ProductImage.query.filter(ProductImage.product_id.in_(ids)).delete(synchronize_session=False)
+    StockReservation.query.filter(StockReservation.product_id.in_(ids)).delete(synchronize_session=False)
+    ProductTrend.query.filter(ProductTrend.product_id.in_(ids)).delete(synchronize_session=False)
+    RelatedProduct.query.filter(db.or_(RelatedProduct.product_id.in_(ids),
+                                       RelatedProduct.related_id.in_(ids))).delete(synchronize_session=False)
+    ProductPair.query.filter(db.or_(ProductPair.product_a.in_(ids),
+                                    ProductPair.product_b.in_(ids))).delete(synchronize_session=False)
+    return Product.query.filter(Product.id.in_(ids)).delete(synchronize_session=False)
+
+def apply_bulk_action(query, action, amount=None, category_id=None):
+    """Apply one bulk action to every product matched by ``query``
+
+    Uses a single UPDATE/DELETE statement; the caller commits. Returns the
+    number of affected products and the image files to remove after commit.
+    """
+    if action in BULK_FLAG_ACTIONS:
+        values = dict(BULK_FLAG_ACTIONS[action])
+    elif action == 'set_category':
+        values = {'category_id': category_id}
+    elif action == 'price_percent':
+        if amount is None or amount <= -100:
+            raise ValueError('Enter a percentage greater than -100')
+        new_price = db.func.round(Product.price_inr * (1 + amount / 100.0), 2)
+        values = {'price_inr': db.case((new_price < 0.01, 0.01), else_=new_price)}
+    elif action == 'price_delta':
+        if amount is None:
+            raise ValueError('Enter an amount in INR')
+        new_price = db.func.round(Product.price_inr + amount, 2)
+        values = {'price_inr': db.case((new_price < 0.01, 0.01), else_=new_price)}
+    elif action == 'set_discount':
+        if amount is None or amount < 0 or amount > 100:
+            raise ValueError('Enter a discount between 0 and 100')
+        values = {'per_product_discount': db.literal(amount)}
+    elif action == 'delete':
+        ids = [product_id for (product_id,) in query.with_entities(Product.id)]
+        if not ids:
+            return 0, []
+        # Collect image files now, remove them after the transaction commits
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        image_paths = [os.path.join(upload_folder, filename) for (filename,) in
+                       db.session.query(ProductImage.filename).filter(ProductImage.product_id.in_(ids))]
+        return delete_products(ids), image_paths
+    else:
+        raise ValueError('Unknown bulk action')
+    
+    if any(field in values for field in pricing.PRICE_FIELDS):
+        # Bulk UPDATEs skip the mapper hooks: re-price from the new values in the same statement
+        overrides = {field: db.null() if values[field] is None else values[field]
+                     for field in pricing.PRICE_FIELDS if field in values}
+        values['effective_price'] = pricing.effective_price_sql(
+            pricing.current_global_discount(db.session.connection()), **overrides)
+    
+    values['updated_at'] = datetime.utcnow()
+    return query.update(values, synchronize_session=False), []
+
+@bp.route('/products/bulk', methods=['POST'])
+@admin_required
+def bulk_products():
+    action = request.form.get('action', '')
+    amount = request.form.get('amount', type=float)
+    category_id = request.form.get('category_id', type=int)
+    
+    if request.form.get('scope') == 'filter':
+        # Predicate-based: everything matching the current list filters
+        query = filtered_products_query(request.form)
+    else:
+        product_ids = request.form.getlist('product_ids', type=int)
+        if not product_ids:
+            flash('Select at least one product', 'error')
+            return redirect(url_for('admin.products'))
+        query = Product.query.filter(Product.id.in_(product_ids))
+    
+    try:
+        count, files_to_delete = apply_bulk_action(query, action, amount=amount, category_id=category_id)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+        return redirect(url_for('admin.products'))
+    
+    # Image files go to the background queue so the request returns immediately
+    if files_to_delete:
+        tasks.enqueue(tasks.delete_files, files_to_delete)
+    
+    flash(f'{count} product(s) updated successfully!' if action != 'delete' else f'{count} product(s) deleted successfully!', 'success')
+    return redirect(url_for('admin.products',
+                            filter_category_id=request.form.get('filter_category_id') or None,
+                            filter_status=request.form.get('filter_status') or None))
 
 @bp.route('/products/new', methods=['GET', 'POST'])
 @admin_required
@@ -124,13 +259,19 @@ def new_product():
     settings = get_site_settings()
     
     if form.validate_on_submit():
-        # Validate uploaded images count (1-4)
+        # Validate uploaded images count (1-4), counting finished chunked uploads
         uploaded_files = request.files.getlist('images')
-        if not uploaded_files or len([f for f in uploaded_files if f and f.filename != '']) < 1:
+        try:
+            chunked = uploads.completed(request.form.getlist('upload_ids'))
+        except uploads.UploadError as e:
+            flash(f'{e} - please choose the images again', 'error')
+            return render_template('admin/product_form.html', form=form, settings=settings, title="Add New Product")
+        image_count = len([f for f in uploaded_files if f and f.filename != '']) + len(chunked)
+        if image_count < 1:
             flash('Please upload at least 1 image for the product', 'error')
             return render_template('admin/product_form.html', form=form, settings=settings, title="Add New Product")
         
-        if len([f for f in uploaded_files if f and f.filename != '']) > 4:
+        if image_count > 4:
             flash('You can upload maximum 4 images per product', 'error')
             return render_template('admin/product_form.html', form=form, settings=settings, title="Add New Product")
         
@@ -177,6 +318,7 @@ def new_product():
                     position=i
                 )
                 db.session.add(image)
+        uploads.attach(chunked, product, len(valid_files))
         
         db.session.commit()
         flash('Product added successfully!', 'success')
@@ -219,6 +361,12 @@ def edit_product(product_id):
         product.category_id = category_id
         
         # Handle image uploads
+        try:
+            chunked = uploads.completed(request.form.getlist('upload_ids'))
+        except uploads.UploadError as e:
+            flash(f'{e} - please choose the images again', 'error')
+            return render_template('admin/product_form.html', form=form, settings=settings, product=product, title="Edit Product")
+        
         # Check if user wants to replace images
         replace_images = request.form.get('replace_images', False)
         
@@ -234,11 +382,11 @@ def edit_product(product_id):
             uploaded_files = request.files.getlist('images')
             valid_files = [f for f in uploaded_files if f and f.filename != '']
             
-            if len(valid_files) < 1:
+            if len(valid_files) + len(chunked) < 1:
                 flash('Please upload at least 1 image for the product', 'error')
                 return render_template('admin/product_form.html', form=form, settings=settings, product=product, title="Edit Product")
             
-            if len(valid_files) > 4:
+            if len(valid_files) + len(chunked) > 4:
                 flash('You can upload maximum 4 images per product', 'error')
                 return render_template('admin/product_form.html', form=form, settings=settings, product=product, title="Edit Product")
             
@@ -263,13 +411,14 @@ def edit_product(product_id):
                         position=i
                     )
                     db.session.add(image)
+            uploads.attach(chunked, product, len(valid_files))
         else:
             # Add new images without replacing existing ones
             uploaded_files = request.files.getlist('images')
             valid_files = [f for f in uploaded_files if f and f.filename != '']
             
-            if len(valid_files) > 0:
-                if len(valid_files) > 4:
+            if len(valid_files) + len(chunked) > 0:
+                if len(valid_files) + len(chunked) > 4:
                     flash('You can upload maximum 4 images at a time', 'error')
                     return render_template('admin/product_form.html', form=form, settings=settings, product=product, title="Edit Product")
                 
@@ -297,6 +446,7 @@ def edit_product(product_id):
                             position=next_position + i
                         )
                         db.session.add(image)
+                uploads.attach(chunked, product, next_position + len(valid_files))
         
         db.session.commit()
         flash('Product updated successfully!', 'success')
@@ -305,6 +455,121 @@ def edit_product(product_id):
     categories = Category.query.all()
     return render_template('admin/product_form.html', form=form, settings=settings, product=product, categories=categories, title="Edit Product")
 
+def _upload_error(error):
+    body = {'error': str(error)}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status
+
+@bp.route('/uploads', methods=['POST'])
+@admin_required
+def create_upload():
+    """Start a chunked image upload (see uploads.py)"""
+    data = request.get_json(silent=True) or {}
+    if not allowed_file(data.get('filename') or ''):
+        return jsonify({'error': 'Only JPG, PNG and GIF images can be uploaded'}), 400
+    product_id = data.get('product_id')
+    if product_id is not None and db.session.get(Product, product_id) is None:
+        return jsonify({'error': 'Unknown product'}), 404
+    try:
+        state = uploads.create_upload(data['filename'], data.get('size'), data.get('sha256'), product_id)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(state), 201
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+@admin_required
+def upload_status(upload_id):
+    try:
+        return jsonify(uploads.upload_status(upload_id))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+@admin_required
+def upload_chunk(upload_id):
+    """Append one ``Content-Range`` chunk; a finished upload naming a product is attached to it"""
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes' or content_range.length is None:
+        return jsonify({'error': 'Content-Range: bytes first-last/size is required'}), 400
+    try:
+        state = uploads.write_chunk(upload_id, request.stream, content_range.start, content_range.stop - 1,
+                                    content_range.length, request.headers.get('X-Chunk-SHA256'))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    
+    if state['complete'] and state['product_id'] is not None:
+        product = db.session.get(Product, state['product_id'])
+        if product is None:
+            uploads.discard(upload_id)
+            return jsonify({'error': 'Unknown product'}), 404
+        image, = uploads.attach([state], product, len(product.images))
+        db.session.commit()
+        state['image'] = image.to_dict()
+    return jsonify(state)
+
+@bp.route('/products/import', methods=['GET', 'POST'])
+@admin_required
+def import_products():
+    form = ProductImportForm()
+    settings = get_site_settings()
+    report = None
+    
+    if form.validate_on_submit():
+        data_file = form.data_file.data
+        fmt = catalog_io.detect_format(data_file.filename)
+        
+        # Spool uploads to temporary files so images can be read by the worker pool
+        temp_paths = []
+        try:
+            with tempfile.NamedTemporaryFile(suffix='.' + fmt, delete=False) as tmp:
+                data_file.save(tmp)
+                temp_paths.append(tmp.name)
+                data_path = tmp.name
+            
+            images_path = None
+            if form.images_zip.data and form.images_zip.data.filename:
+                with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp:
+                    form.images_zip.data.save(tmp)
+                    temp_paths.append(tmp.name)
+                    images_path = tmp.name
+            
+            with open(data_path, newline='', encoding='utf-8-sig') as stream:
+                report = catalog_io.import_products(
+                    catalog_io.read_rows(stream, fmt),
+                    images=images_path,
+                    upload_folder=current_app.config['UPLOAD_FOLDER']
+                )
+        except UnicodeDecodeError:
+            db.session.rollback()
+            flash('The catalog file must be UTF-8 encoded', 'error')
+        except (csv.Error, ValueError) as e:
+            db.session.rollback()
+            flash(f'Could not read the catalog file: {e}', 'error')
+        finally:
+            for path in temp_paths:
+                os.remove(path)
+        
+        if report:
+            flash(f'Imported {report.created} new and {report.updated} updated products '
+                  f'({len(report.errors)} rows with errors)',
+                  'success' if not report.errors else 'error')
+    
+    return render_template('admin/product_import.html', form=form, settings=settings, report=report, title="Import Products")
+
+@bp.route('/export/products.<string:fmt>')
+@admin_required
+def export_products(fmt):
+    if fmt not in ('csv', 'jsonl'):
+        return redirect(url_for('admin.products'))
+    
+    from flask import Response, stream_with_context
+    return Response(
+        stream_with_context(catalog_io.export_products(fmt)),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename=products.{fmt}'}
+    )
+
 @bp.route('/products/<int:product_id>/toggle', methods=['POST'])
 @admin_required
 def toggle_product(product_id):
@@ -327,7 +592,7 @@ def delete_product(product_id):
         if os.path.exists(image_path):
             os.remove(image_path)
     
-    db.session.delete(product)
+    delete_products([product.id])
     db.session.commit()
     
     flash('Product deleted successfully!', 'success')
@@ -463,50 +728,80 @@ def settings():
     
     return render_template('admin/settings.html', form=form, settings=settings)
 
+# Rows fetched per round trip by the streamed list pages
+STREAM_CHUNK_SIZE = 500
+
+def stream_page(template_name, **context):
+    """Stream a template so the page chrome is sent before its rows are rendered
+
+    The view's database session is closed once it returns, so rows must come
+    from lazy iterators (``iter_rows``, ``iter_leads``) that query while the
+    page streams; other ORM objects in the context must already be loaded.
+    """
+    # Pop the flashed messages now: the session cookie is sent before the body
+    get_flashed_messages(with_categories=True)
+    return Response(_buffered(stream_template(template_name, **context)), mimetype='text/html')
+
+def _buffered(pieces, size=4096):
+    """Join Jinja's many small output pieces into writes of about ``size`` characters"""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def iter_rows(statement):
+    """Run ``statement`` only when iteration starts, fetching STREAM_CHUNK_SIZE rows at a time"""
+    yield from db.session.execute(statement.execution_options(yield_per=STREAM_CHUNK_SIZE)).scalars()
+
+def iter_leads(*conditions):
+    """Leads newest first, read in chunks, each with ``product_titles`` attached"""
+    query = (db.select(Lead).where(*conditions)
+             .order_by(Lead.created_at.desc(), Lead.id.desc())
+             .execution_options(yield_per=STREAM_CHUNK_SIZE))
+    titles = {}
+    for chunk in db.session.execute(query).scalars().partitions():
+        lines = {lead.id: lead.get_products() for lead in chunk}
+        wanted = {item['product_id'] for items in lines.values() for item in items} - titles.keys()
+        if wanted:
+            titles.update(dict.fromkeys(wanted))
+            titles.update(db.session.execute(
+                db.select(Product.id, Product.title).where(Product.id.in_(wanted))).all())
+        for lead in chunk:
+            lead.product_titles = [f"{titles[item['product_id']]} (x{item['quantity']})"
+                                   for item in lines[lead.id] if titles.get(item['product_id'])]
+            yield lead
+
 @bp.route('/leads')
 @admin_required
 def leads():
-    leads = Lead.query.order_by(Lead.created_at.desc()).all()
     settings = get_site_settings()
-    
-    # Get product titles for each lead
-    for lead in leads:
-        products_data = json.loads(lead.products_json) if lead.products_json else []
-        product_titles = []
-        for item in products_data:
-            product = Product.query.get(item['product_id'])
-            if product:
-                product_titles.append(f"{product.title} (x{item['quantity']})")
-        lead.product_titles = product_titles
-    
-    return render_template('admin/leads.html', leads=leads, settings=settings)
+    lead_count = db.session.scalar(db.select(db.func.count(Lead.id)))
+    return stream_page('admin/leads.html', leads=iter_leads(), lead_count=lead_count, settings=settings)
 
 @bp.route('/orders')
 @admin_required
 def orders():
-    # Get all orders
-    orders = Lead.query.order_by(Lead.created_at.desc()).all()
     settings = get_site_settings()
+    counts = dict(db.session.execute(db.select(Lead.status, db.func.count(Lead.id)).group_by(Lead.status)).all())
+    pending_count = counts.pop('pending', 0)
+    completed_count = counts.pop('completed', 0)
+    other_count = sum(counts.values())
     
-    pending_orders = [order for order in orders if order.status == 'pending']
-    completed_orders = [order for order in orders if order.status == 'completed']
-    other_orders = [order for order in orders if order.status not in ['pending', 'completed']]
-    
-    # Get product titles for each order
-    for order in orders:
-        products_data = json.loads(order.products_json) if order.products_json else []
-        product_titles = []
-        for item in products_data:
-            product = Product.query.get(item['product_id'])
-            if product:
-                product_titles.append(f"{product.title} (x{item['quantity']})")
-        order.product_titles = product_titles
-    
-    return render_template('admin/orders.html', 
-                         pending_orders=pending_orders,
-                         completed_orders=completed_orders,
-                         other_orders=other_orders,
-                         settings=settings)
+    # Each section reads its rows only when the template reaches it
+    return stream_page('admin/orders.html', 
+                       pending_orders=iter_leads(Lead.status == 'pending'),
+                       completed_orders=iter_leads(Lead.status == 'completed'),
+                       other_orders=iter_leads(db.or_(Lead.status.notin_(['pending', 'completed']),
+                                                      Lead.status.is_(None))),
+                       pending_count=pending_count,
+                       completed_count=completed_count,
+                       other_count=other_count,
+                       settings=settings)
 
 @bp.route('/order/<string:order_id>')
 @admin_required
@@ -573,16 +868,34 @@ def order_lookup():
 @bp.route('/analytics')
 @admin_required
 def analytics():
-    settings = get_site_settings()
     analytics_data = calculate_analytics()
+    # Loaded after calculate_analytics commits, so it is not expired when the page streams
+    settings = get_site_settings()
+    
+    # Product rows are read in chunks while the table streams
+    product_count = db.session.scalar(db.select(db.func.count(Product.id)))
+    all_products = iter_rows(db.select(Product).order_by(Product.id))
     
-    # Get product analytics
-    all_products = Product.query.all()
+    # Revenue and conversion report for the chosen date range (default: last 30 days)
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=29)
+    try:
+        if request.args.get('start'):
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        if request.args.get('end'):
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    except ValueError:
+        flash('Dates must look like 2024-01-31', 'error')
+    if start > end:
+        start, end = end, start
+    report = reporting.revenue_report(start, end)
     
-    return render_template('admin/analytics.html', 
-                         analytics=analytics_data,
-                         products=all_products,
-                         settings=settings)
+    return stream_page('admin/analytics.html', 
+                       analytics=analytics_data,
+                       products=all_products,
+                       product_count=product_count,
+                       report=report,
+                       settings=settings)
 
 @bp.route('/export/orders.csv')
 @admin_required
@@ -684,4 +997,71 @@ def toggle_hot_product(product_id):
     
     status = "marked as hot" if product.is_hot_product else "removed from hot"
     flash(f'Product {status} successfully!', 'success')
-    return redirect(url_for('admin.products'))
\ No newline at end of file
+    return redirect(url_for('admin.products'))
+
+
+@bp.route('/profiles', methods=['GET', 'POST'])
+@admin_required
+def profiles():
+    """Stored request profiles and the 1-in-N sampling setting"""
+    if request.method == 'POST':
+        endpoint = request.form.get('endpoint') or None
+        every = request.form.get('every', 0, type=int)
+        if endpoint and endpoint not in current_app.view_functions:
+            flash('Unknown endpoint', 'error')
+        elif endpoint and every < 1:
+            flash('Sample rate must be 1 or more (1 profiles every request)', 'error')
+        else:
+            profiling.set_sampling(endpoint, every)
+            flash(f'Profiling 1 in {every} requests to {endpoint}' if endpoint else 'Sampling stopped', 'success')
+        return redirect(url_for('admin.profiles'))
+    
+    settings = get_site_settings()
+    endpoints = sorted(name for name in current_app.view_functions if name != 'static')
+    return render_template('admin/profiles.html', settings=settings, profiles=profiling.list_profiles(),
+                           sampling=profiling.get_sampling(), endpoints=endpoints)
+
+@bp.route('/profiles/<name>')
+@admin_required
+def profile_detail(name):
+    settings = get_site_settings()
+    limit = min(max(request.args.get('limit', 30, type=int), 1), 500)
+    try:
+        details, stats = profiling.load(name)
+    except profiling.ProfileNotFound:
+        abort(404)
+    return render_template('admin/profile_detail.html', settings=settings, profile=details, limit=limit,
+                           rows=profiling.top_functions(stats, limit))
+
+@bp.route('/profiles/<name>/collapsed')
+@admin_required
+def profile_collapsed(name):
+    """Folded stacks for flamegraph.pl / speedscope"""
+    try:
+        _, stats = profiling.load(name)
+    except profiling.ProfileNotFound:
+        abort(404)
+    return Response(''.join(line + '\n' for line in profiling.collapsed_stacks(stats)), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={name}.folded'})
+
+@bp.route('/profiles/<name>/download')
+@admin_required
+def profile_download(name):
+    """Raw cProfile stats for pstats / snakeviz"""
+    try:
+        path = profiling.profile_path(name)
+    except profiling.ProfileNotFound:
+        abort(404)
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=f'{name}.prof')
+
+@bp.route('/profiles/<name>/delete', methods=['POST'])
+@admin_required
+def delete_profile(name):
+    try:
+        profiling.delete(name)
+    except profiling.ProfileNotFound:
+        abort(404)
+    flash('Profile deleted', 'success')
+    return redirect(url_for('admin.profiles'))
@@ -0,0 +1,153 @@
+"""Crawler classification and burst admission control.
+
+Every storefront page writes to the database (visitor row, view counter),
+so an aggressive crawler turns into SQLite write-lock contention that slows
+down checkouts. Before each request we:
+
+- classify the client: known bots are still served but skip tracking writes
+- take a token from a per-client token bucket; clients that exceed their
+  rate get ``429 Too Many Requests``
+- always admit priority paths (checkout and the admin panel)
+
+Bucket state lives in a small SQLite file of its own (``ADMISSION_DB_PATH``)
+so the limit holds across all gunicorn workers on a host without touching
+the main database.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, request
+
+BOT_USER_AGENT_RE = re.compile(
+    r'bot|crawl|spider|slurp|scrapy|curl|wget|python-requests|python-urllib|'
+    r'httpclient|go-http-client|okhttp|headless|phantomjs|facebookexternalhit|'
+    r'ahrefs|semrush|mj12|dotbot|petalbot|bytespider|gptbot',
+    re.IGNORECASE,
+)
+
+# Never limited: losing these requests costs conversions or locks admins out
+PRIORITY_PREFIXES = ('/checkout', '/admin-pn')
+
+# Not worth a bucket lookup
+EXEMPT_PREFIXES = ('/static/', '/metrics')
+
+_local = threading.local()
+_ops = 0
+
+# Refill by elapsed time, then take a token if one is available; a refused
+# request leaves the bucket as is so that clients recover at the full rate
+UPSERT_RETURNING = """
+    INSERT INTO buckets (key, tokens, updated, admitted) VALUES (:key, :capacity - 1, :now, 1)
+    ON CONFLICT(key) DO UPDATE SET
+        tokens = MIN(:capacity, tokens + (:now - updated) * :rate)
+                 - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1),
+        admitted = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1,
+        updated = :now
+    RETURNING admitted
+"""
+
+
+def classify(path, user_agent):
+    """Return 'priority', 'exempt', 'bot' or 'normal' for a request"""
+    if path.startswith(PRIORITY_PREFIXES):
+        return 'priority'
+    if path.startswith(EXEMPT_PREFIXES):
+        return 'exempt'
+    if not user_agent or BOT_USER_AGENT_RE.search(user_agent):
+        return 'bot'
+    return 'normal'
+
+
+def _connection(path):
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != path or getattr(_local, 'pid', None) != os.getpid():
+        conn = sqlite3.connect(path, timeout=0.05, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # The buckets are disposable; durability is not needed
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                     '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, '
+                     'admitted INTEGER NOT NULL DEFAULT 1)')
+        _local.conn, _local.path, _local.pid = conn, path, os.getpid()
+    return conn
+
+
+def take_token(path, key, rate, capacity, now=None):
+    """Atomically take one token from ``key``'s bucket; True if admitted
+
+    Fails open (admits) if the bucket store is busy or unavailable.
+    """
+    global _ops
+    now = time.time() if now is None else now
+    params = {'key': key, 'capacity': float(capacity), 'rate': float(rate), 'now': now}
+    try:
+        conn = _connection(path)
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            admitted = bool(conn.execute(UPSERT_RETURNING, params).fetchone()[0])
+        else:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                admitted = tokens >= 1
+                conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated, admitted) '
+                             'VALUES (?, ?, ?, ?)', (key, tokens - admitted, now, int(admitted)))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        # Occasionally drop buckets idle for an hour so the table stays small
+        _ops += 1
+        if _ops % 1000 == 0:
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 3600,))
+    except sqlite3.Error:
+        return True
+    return admitted
+
+
+def before_request():
+    config = current_app.config
+    kind = classify(request.path, request.headers.get('User-Agent', ''))
+    g.client_class = kind
+    # Bots are served, but never write visitor rows or view counters
+    g.skip_tracking = kind == 'bot'
+
+    enabled = config['ADMISSION_ENABLED']
+    if enabled is None:
+        enabled = not current_app.testing
+    if not enabled or kind in ('priority', 'exempt'):
+        return None
+
+    if kind == 'bot':
+        rate, burst = config['ADMISSION_BOT_RATE'], config['ADMISSION_BOT_BURST']
+    else:
+        rate, burst = config['ADMISSION_RATE'], config['ADMISSION_BURST']
+
+    key = f"{kind}:{request.remote_addr}"
+    if take_token(config['ADMISSION_DB_PATH'], key, rate, burst):
+        return None
+
+    retry_after = max(1, int(round(1.0 / rate))) if rate > 0 else 60
+    return current_app.response_class(
+        'Too many requests, please slow down.\n', status=429, mimetype='text/plain',
+        headers={'Retry-After': str(retry_after)}
+    )
+
+
+def init_app(app):
+    """Install the admission check and its configuration"""
+    enabled = os.environ.get('ADMISSION_ENABLED')
+    app.config.setdefault('ADMISSION_ENABLED', None if enabled is None else enabled == '1')
+    app.config.setdefault('ADMISSION_DB_PATH', os.environ.get(
+        'ADMISSION_DB_PATH', os.path.join(app.instance_path, 'admission.db')))
+    # Sustained requests per second and burst size per client IP
+    app.config.setdefault('ADMISSION_RATE', float(os.environ.get('ADMISSION_RATE', 5)))
+    app.config.setdefault('ADMISSION_BURST', float(os.environ.get('ADMISSION_BURST', 30)))
+    app.config.setdefault('ADMISSION_BOT_RATE', float(os.environ.get('ADMISSION_BOT_RATE', 0.5)))
+    app.config.setdefault('ADMISSION_BOT_BURST', float(os.environ.get('ADMISSION_BOT_BURST', 5)))
+    os.makedirs(os.path.dirname(app.config['ADMISSION_DB_PATH']), exist_ok=True)
+    app.before_request(before_request)
@@ -1,5 +1,7 @@
 import os
+import click
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 
 # Import models first (db is initialized in models module)
 from models import db
@@ -12,7 +14,7 @@ except ImportError:
     # dotenv not available, continue without it
     pass
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     
     # Configuration
@@ -22,16 +24,88 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = 'static/uploads'
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     
+    # Settings passed in (tests) win over the environment and the defaults below
+    app.config.update(config or {})
+    
+    # Optional read replica bind (DATABASE_REPLICA_URL)
+    import replica
+    replica.configure(app)
+    
     # Initialize extensions
     db.init_app(app)
     
-    # Import flask_migrate only when needed
-    try:
-        from flask_migrate import Migrate
-        migrate = Migrate(app, db)
-    except ImportError:
-        # flask_migrate is not available, continue without it
-        migrate = None
+    # Request, database, cache and checkout metrics on /metrics (first, so
+    # its timer also covers requests refused by later hooks)
+    import metrics
+    metrics.init_app(app)
+    
+    # cProfile single requests on demand (admins) or 1-in-N for one endpoint
+    import profiling
+    profiling.init_app(app)
+    
+    # Import flask_migrate only when needed: migrations run from the `flask db`
+    # CLI, so web workers skip importing alembic
+    migrate = None
+    if click.get_current_context(silent=True) is not None:
+        try:
+            from flask_migrate import Migrate
+            migrate = Migrate(app, db)
+        except ImportError:
+            # flask_migrate is not available, continue without it
+            migrate = None
+    
+    # Compiled templates are cached on disk and shared by all workers
+    cache_dir = app.config.setdefault('JINJA_CACHE_DIR', os.environ.get(
+        'JINJA_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache')))
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    
+    # Fragment cache ({% cache %}) and commit-driven invalidation
+    import cache
+    cache.init_app(app)
+    
+    # Immutable per-worker snapshot of the active catalog for storefront pages
+    import catalog
+    catalog.init_app(app)
+    
+    # Crawler classification and per-client rate limiting
+    import admission
+    admission.init_app(app)
+    
+    # Unique visitors are counted in HyperLogLog sketches buffered per worker
+    import visitors
+    visitors.init_app(app)
+    
+    # Decayed popularity scores behind "Trending now" / "Top in category"
+    import trending
+    trending.init_app(app)
+    
+    # Keep Product.effective_price in step with prices and discounts
+    import pricing
+    pricing.init_app(app)
+    
+    # Checkout stock reservations and their expiry sweep
+    import inventory
+    inventory.init_app(app)
+    
+    # Chunked, resumable admin image uploads
+    import uploads
+    uploads.init_app(app)
+    
+    # Static files and product images via sendfile, X-Accel-Redirect or X-Sendfile
+    import delivery
+    delivery.init_app(app)
+    
+    # Cached revenue and conversion reports for the admin
+    import reporting
+    reporting.init_app(app)
+    
+    # Send read-only storefront and report queries to the replica
+    replica.init_app(app)
+    
+    # Online database backups (flask backup, scheduled from cron or a systemd timer)
+    import backup
+    backup.init_app(app)
     
     # Register blueprints
     from main import bp as main_bp
@@ -40,7 +114,31 @@ def create_app():
     from admin import bp as admin_bp
     app.register_blueprint(admin_bp, url_prefix='/admin-pn')
     
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+    
+    # gzip/brotli for text responses, outermost so it sees the final body
+    import compression
+    compression.init_app(app)
+    
     # Create upload directory if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
-    return app, db
\ No newline at end of file
+    return app, db
+
+
+def warm_up(app):
+    """Compile every template and import lazily loaded modules
+
+    Called before a worker accepts traffic (in the gunicorn master when the
+    app is preloaded), so the first requests do not pay for it.
+    """
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+    
+    # WTForms imports email_validator on the first Email() validation
+    try:
+        import email_validator
+    except ImportError:
+        pass
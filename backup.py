@@ -0,0 +1,365 @@
+"""Online database backups (``flask backup``).
+
+SQLite is copied with the online backup API, ``BACKUP_PAGES_PER_STEP``
+pages at a time with a ``BACKUP_STEP_SLEEP`` pause between steps. A step
+holds a read lock only while it copies its pages, so writers wait a few
+milliseconds at most. If a write lands mid-copy SQLite starts the copy over;
+each restart doubles the step (up to ``BACKUP_MAX_STEP_PAGES``) so a busy
+store still finishes, and after ``BACKUP_MAX_ATTEMPTS`` the backup gives up
+rather than lock the database for longer. PostgreSQL is dumped with
+``pg_dump`` (an MVCC snapshot that never blocks writes).
+
+Each backup in ``BACKUP_DIR`` is a compressed snapshot
+(``<name>.sqlite3.gz`` or a custom-format ``<name>.pgdump``) and
+``<name>.json``, a manifest with the archive's SHA-256, the row count of
+every table and the files in ``static/uploads`` (name, size, mtime), plus
+any image the snapshot references that is missing on disk. Verifying a
+backup restores the SQLite snapshot to a scratch file and checks its
+integrity and row counts (``pg_restore --list`` for PostgreSQL). The newest
+``BACKUP_KEEP`` backups are kept.
+
+Scheduled backups run ``flask backup --if-due`` from cron or a systemd
+timer, outside the gunicorn workers, so recycling a worker never cuts a long
+copy short. It takes a backup only once the newest one is older than
+``BACKUP_INTERVAL_HOURS``. A lock file makes sure only one backup runs at a
+time on the host, and the due check is made while holding it, so
+overlapping runs never take two.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import text
+
+from models import db
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: backups are not serialised across processes
+
+_NAME = re.compile(r'^baign_mart-[0-9]{8}T[0-9]{6}_[0-9]{6}$')
+
+# Steps in a row that may find a writer holding the database before an attempt is abandoned
+MAX_BUSY_STEPS = 100
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupRunning(BackupError):
+    """Another process holds the backup lock"""
+
+
+class _Restarted(Exception):
+    """The source changed mid-copy (or stayed locked) and the attempt was abandoned"""
+
+
+def _folder():
+    return current_app.config['BACKUP_DIR']
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _lock():
+    """The held backup lock file (None without fcntl); BackupError if a backup is running"""
+    if fcntl is None:
+        return None
+    f = open(os.path.join(_folder(), 'backup.lock'), 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        raise BackupRunning('Another backup is running')
+    return f
+
+
+# ---------------------------------------------------------------------------
+# Snapshots
+# ---------------------------------------------------------------------------
+
+def _copy_sqlite(source_path, target_path):
+    """Online copy of a live SQLite database; returns (steps, restarts)"""
+    config = current_app.config
+    pages = config['BACKUP_PAGES_PER_STEP']
+    step_sleep = config['BACKUP_STEP_SLEEP']
+    source = sqlite3.connect(source_path, timeout=30)
+    steps = [0]
+    try:
+        for attempt in range(config['BACKUP_MAX_ATTEMPTS']):
+            remaining_before = [None]
+            busy = [0]
+
+            def progress(status, remaining, total):
+                steps[0] += 1
+                if status in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED):
+                    # A writer holds the database; the backup sleeps and retries the step
+                    busy[0] += 1
+                    if busy[0] > MAX_BUSY_STEPS:
+                        raise _Restarted()
+                    return
+                busy[0] = 0
+                if status == sqlite3.SQLITE_OK:
+                    # A copied step that did not shrink what is left means the copy started over
+                    if remaining_before[0] is not None and remaining >= remaining_before[0]:
+                        raise _Restarted()
+                    remaining_before[0] = remaining
+                    time.sleep(step_sleep)  # No lock is held between steps
+
+            target = sqlite3.connect(target_path)
+            try:
+                source.backup(target, pages=pages, progress=progress, sleep=step_sleep)
+                return steps[0], attempt
+            except _Restarted:
+                pages = min(pages * 2, config['BACKUP_MAX_STEP_PAGES'])
+            finally:
+                target.close()
+    finally:
+        source.close()
+    raise BackupError('The database kept changing during the backup; try again later')
+
+
+def _table_counts(connection):
+    tables = [row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return {table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+
+def _backup_sqlite(source_path, name):
+    raw_path = os.path.join(_folder(), f'{name}.sqlite3.tmp')
+    archive = os.path.join(_folder(), f'{name}.sqlite3.gz')
+    try:
+        steps, restarts = _copy_sqlite(source_path, raw_path)
+        snapshot = sqlite3.connect(raw_path)
+        try:
+            tables = _table_counts(snapshot)
+            referenced = [row[0] for row in snapshot.execute('SELECT filename FROM product_images')] \
+                if 'product_images' in tables else []
+        finally:
+            snapshot.close()
+        with open(raw_path, 'rb') as src, open(archive + '.tmp', 'wb') as out:
+            with gzip.GzipFile(f'{name}.sqlite3', 'wb', compresslevel=6, fileobj=out) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(archive + '.tmp', archive)
+    finally:
+        for path in (raw_path, archive + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+    return archive, {'tables': tables, 'steps': steps, 'restarts': restarts}, referenced
+
+
+def _pg_url(url):
+    """libpq URL for pg_dump (password passed separately) and its password"""
+    return url.set(drivername='postgresql', password=None).render_as_string(hide_password=False), url.password
+
+
+def _backup_postgres(url, name):
+    archive = os.path.join(_folder(), f'{name}.pgdump')
+    target, password = _pg_url(url)
+    env = dict(os.environ, PGPASSWORD=password) if password else None
+    try:
+        subprocess.run([current_app.config['PG_DUMP'], '--format=custom', '--no-owner',
+                        f'--file={archive}.tmp', f'--dbname={target}'],
+                       env=env, check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        if os.path.exists(archive + '.tmp'):
+            os.remove(archive + '.tmp')
+        raise BackupError(f"pg_dump failed: {getattr(e, 'stderr', b'') or e}")
+    os.replace(archive + '.tmp', archive)
+    referenced = list(db.session.scalars(text('SELECT filename FROM product_images')))
+    return archive, {'tables': None}, referenced
+
+
+def uploads_manifest(referenced=()):
+    """(files in UPLOAD_FOLDER with size and mtime, referenced filenames missing there)"""
+    folder = current_app.config['UPLOAD_FOLDER']
+    files = []
+    try:
+        entries = sorted(os.scandir(folder), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        if entry.is_file():
+            stat = entry.stat()
+            files.append({'name': entry.name, 'bytes': stat.st_size, 'mtime': int(stat.st_mtime)})
+    present = {item['name'] for item in files}
+    return files, sorted(set(referenced) - present)
+
+
+def create_backup(verify=True, if_due=False):
+    """Snapshot the database, write its manifest, verify and rotate; returns the manifest
+
+    With ``if_due``, returns None instead when the newest backup is not yet
+    ``BACKUP_INTERVAL_HOURS`` old.
+    """
+    os.makedirs(_folder(), exist_ok=True)
+    lock = _lock()
+    try:
+        if if_due and not is_due():
+            return None
+        for filename in os.listdir(_folder()):
+            if filename.endswith('.tmp'):
+                os.remove(os.path.join(_folder(), filename))  # Left by an interrupted backup
+        started = time.monotonic()
+        now = datetime.utcnow()
+        name = f"baign_mart-{now:%Y%m%dT%H%M%S_%f}"
+        url = db.engine.url
+        backend = url.get_backend_name()
+        if backend == 'sqlite':
+            if not url.database or url.database == ':memory:':
+                raise BackupError('An in-memory SQLite database cannot be backed up')
+            archive, details, referenced = _backup_sqlite(url.database, name)
+        elif backend == 'postgresql':
+            archive, details, referenced = _backup_postgres(url, name)
+        else:
+            raise BackupError(f'Backups of {backend} databases are not supported')
+
+        uploads, missing = uploads_manifest(referenced)
+        manifest = dict(details, **{
+            'name': name,
+            'created': now.isoformat(timespec='seconds'),
+            'backend': backend,
+            'archive': os.path.basename(archive),
+            'bytes': os.path.getsize(archive),
+            'sha256': _sha256(archive),
+            'seconds': round(time.monotonic() - started, 3),
+            'uploads': uploads,
+            'missing_uploads': missing,
+        })
+        _write_manifest(manifest)
+        if verify:
+            manifest = verify_backup(name)
+        rotate()
+        return manifest
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+def _manifest_path(name):
+    if not _NAME.match(name or ''):
+        raise BackupError(f'No backup named {name}')
+    return os.path.join(_folder(), f'{name}.json')
+
+
+def _write_manifest(manifest):
+    path = _manifest_path(manifest['name'])
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def load_manifest(name):
+    try:
+        with open(_manifest_path(name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise BackupError(f'No backup named {name}')
+
+
+def list_backups():
+    """Names of the stored backups, newest first"""
+    try:
+        filenames = os.listdir(_folder())
+    except FileNotFoundError:
+        return []
+    names = [filename[:-5] for filename in filenames if filename.endswith('.json') and _NAME.match(filename[:-5])]
+    return sorted(names, reverse=True)
+
+
+# ---------------------------------------------------------------------------
+# Verification and rotation
+# ---------------------------------------------------------------------------
+
+def verify_backup(name):
+    """Check that a backup restores intact; records the result in its manifest"""
+    manifest = load_manifest(name)
+    archive = os.path.join(_folder(), manifest['archive'])
+    if not os.path.exists(archive):
+        raise BackupError(f"{manifest['archive']} is missing")
+    if _sha256(archive) != manifest['sha256']:
+        raise BackupError(f"{manifest['archive']} does not match its checksum")
+
+    if manifest['backend'] == 'sqlite':
+        restored = os.path.join(_folder(), f'{name}.verify.tmp')
+        try:
+            with gzip.open(archive, 'rb') as src, open(restored, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            connection = sqlite3.connect(restored)
+            try:
+                result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+                if result != 'ok':
+                    raise BackupError(f'Integrity check failed: {result}')
+                if _table_counts(connection) != manifest['tables']:
+                    raise BackupError('Restored row counts differ from the manifest')
+            finally:
+                connection.close()
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            raise BackupError(f'Could not restore {manifest["archive"]}: {e}')
+        finally:
+            if os.path.exists(restored):
+                os.remove(restored)
+    else:
+        try:
+            subprocess.run([current_app.config['PG_RESTORE'], '--list', archive],
+                           check=True, capture_output=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise BackupError(f"pg_restore could not read {manifest['archive']}: {e}")
+
+    manifest['verified'] = datetime.utcnow().isoformat(timespec='seconds')
+    _write_manifest(manifest)
+    return manifest
+
+
+def rotate(keep=None):
+    """Delete all but the newest ``keep`` (BACKUP_KEEP) backups; returns the names deleted"""
+    keep = current_app.config['BACKUP_KEEP'] if keep is None else keep
+    deleted = list_backups()[keep:]
+    for name in deleted:
+        for suffix in ('.sqlite3.gz', '.pgdump', '.json'):
+            path = os.path.join(_folder(), name + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+    return deleted
+
+
+# ---------------------------------------------------------------------------
+# Schedule
+# ---------------------------------------------------------------------------
+
+def is_due():
+    """Whether the newest backup is older than BACKUP_INTERVAL_HOURS"""
+    names = list_backups()
+    if not names:
+        return True
+    created = datetime.fromisoformat(load_manifest(names[0])['created'])
+    return (datetime.utcnow() - created).total_seconds() >= current_app.config['BACKUP_INTERVAL_HOURS'] * 3600
+
+
+def init_app(app):
+    """Configure database backups for an application"""
+    app.config.setdefault('BACKUP_DIR', os.environ.get(
+        'BACKUP_DIR', os.path.join(app.instance_path, 'backups')))
+    app.config.setdefault('BACKUP_KEEP', int(os.environ.get('BACKUP_KEEP', 14)))
+    app.config.setdefault('BACKUP_INTERVAL_HOURS', float(os.environ.get('BACKUP_INTERVAL_HOURS', 24)))
+    app.config.setdefault('BACKUP_PAGES_PER_STEP', 100)
+    app.config.setdefault('BACKUP_MAX_STEP_PAGES', 2000)
+    app.config.setdefault('BACKUP_MAX_ATTEMPTS', 10)
+    app.config.setdefault('BACKUP_STEP_SLEEP', 0.01)
+    app.config.setdefault('PG_DUMP', os.environ.get('PG_DUMP', 'pg_dump'))
+    app.config.setdefault('PG_RESTORE', os.environ.get('PG_RESTORE', 'pg_restore'))
@@ -0,0 +1,6 @@
+"""Load-test and benchmark tooling for Baign Mart.
+
+- ``benchmarks.seed``: bulk data generator for large catalogs
+- ``benchmarks.app``: gunicorn target that reports queries per request
+- ``benchmarks.loadtest``: concurrent HTTP driver with latency percentiles
+"""
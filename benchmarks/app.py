@@ -0,0 +1,42 @@
+"""Gunicorn entry point used by the load test.
+
+Same application as production, plus an ``X-Query-Count`` response header
+so the load test can report queries per request:
+
+    gunicorn -w 4 -b 127.0.0.1:8000 benchmarks.app:app
+
+Admission control is off by default here: every simulated user shares one
+IP address. Set ``ADMISSION_ENABLED=1`` to measure the limiter itself.
+"""
+import os
+
+from flask import g
+from sqlalchemy import event
+
+from app import create_app
+from models import db
+
+os.environ.setdefault('ADMISSION_ENABLED', '0')
+app, database = create_app()
+
+
+def install_query_counter(app):
+    """Count SQL statements per request and expose them as a header"""
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        try:
+            g.query_count = g.get('query_count', 0) + 1
+        except RuntimeError:
+            # Outside of an application context (e.g. startup)
+            pass
+
+    @app.after_request
+    def add_query_count_header(response):
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
+
+
+install_query_counter(app)
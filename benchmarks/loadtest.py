@@ -0,0 +1,329 @@
+"""Concurrent load test against a running (or spawned) gunicorn server.
+
+Drives the real storefront and admin routes with a pool of client threads
+and reports p50/p95/p99 latency, requests per second and queries per request
+(from the ``X-Query-Count`` header added by ``benchmarks.app``). A response
+with a status its scenario does not expect (``EXPECTED_STATUS``; e.g. a 429,
+a redirect to the login page, an order refused for stock) counts as an error
+and is left out of the latency and throughput figures.
+
+Usage:
+    # Spawn gunicorn on the seeded database and save a baseline
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.loadtest \\
+        --spawn --duration 30 --concurrency 16 --save benchmarks/baseline.json
+
+    # Later: compare a new run against the saved baseline
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.loadtest \\
+        --spawn --duration 30 --concurrency 16 --compare benchmarks/baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+PRODUCT_LINK_RE = re.compile(r'/product/(\d+)')
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+# Scenario name -> relative weight in the traffic mix
+DEFAULT_MIX = {
+    'home': 30,
+    'product': 40,
+    'cart_add': 15,
+    'checkout': 5,
+    'admin_products': 3,
+    'admin_leads': 2,
+    'admin_orders': 2,
+    'admin_export': 1,
+    'category': 2,
+}
+
+# Scenario name -> status codes of a successful response (redirects are not followed)
+EXPECTED_STATUS = {
+    'home': {200},
+    'product': {200},
+    'category': {200},
+    'cart_add': {302},
+    'checkout': {200},
+    'admin_products': {200},
+    'admin_leads': {200},
+    'admin_orders': {200},
+    'admin_export': {200},
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Results:
+    """Thread-safe collector of per-scenario samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, scenario, seconds, response):
+        with self.lock:
+            if response is None or response.status_code not in EXPECTED_STATUS[scenario]:
+                self.errors[scenario] += 1
+                status = 'failed' if response is None else str(response.status_code)
+                self.error_statuses[scenario][status] += 1
+                return
+            self.latencies[scenario].append(seconds)
+            if 'X-Query-Count' in response.headers:
+                self.queries[scenario].append(int(response.headers['X-Query-Count']))
+
+    def summary(self, elapsed):
+        scenarios = {}
+        all_latencies = []
+        total_errors = 0
+        for scenario in sorted(set(self.latencies) | set(self.errors)):
+            samples = self.latencies[scenario]
+            all_latencies.extend(samples)
+            total_errors += self.errors[scenario]
+            queries = self.queries[scenario]
+            scenarios[scenario] = {
+                'requests': len(samples) + self.errors[scenario],
+                'errors': self.errors[scenario],
+                'error_statuses': dict(self.error_statuses[scenario]),
+                'rps': round(len(samples) / elapsed, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                'p95_ms': round(percentile(samples, 95) * 1000, 2),
+                'p99_ms': round(percentile(samples, 99) * 1000, 2),
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'total': {
+                'requests': len(all_latencies) + total_errors,
+                'errors': total_errors,
+                'rps': round(len(all_latencies) / elapsed, 2),
+                'p50_ms': round(percentile(all_latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(all_latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(all_latencies, 99) * 1000, 2),
+            },
+            'scenarios': scenarios,
+        }
+
+
+BROWSER_USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/124.0 Safari/537.36 baign-loadtest')
+
+
+class Client:
+    """One simulated user with its own cookie jar"""
+
+    def __init__(self, base_url, product_ids, category_ids, admin_credentials, rng):
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+        # Look like a browser so the storefront tracks (and limits) us as one
+        self.http.headers['User-Agent'] = BROWSER_USER_AGENT
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.admin_credentials = admin_credentials
+        self.rng = rng
+        self.admin_logged_in = False
+
+    def url(self, path):
+        return self.base_url + path
+
+    def csrf_token(self, path):
+        response = self.http.get(self.url(path))
+        match = CSRF_RE.search(response.text)
+        return match.group(1) if match else ''
+
+    def login_admin(self):
+        username, password = self.admin_credentials
+        token = self.csrf_token('/admin-pn/login')
+        self.http.post(self.url('/admin-pn/login'),
+                       data={'csrf_token': token, 'username': username, 'password': password})
+        self.admin_logged_in = True
+
+    def run(self, scenario):
+        """Execute one scenario and return the measured response"""
+        if scenario == 'home':
+            return self.http.get(self.url('/'), allow_redirects=False)
+        if scenario == 'product':
+            return self.http.get(self.url(f'/product/{self.rng.choice(self.product_ids)}'), allow_redirects=False)
+        if scenario == 'category':
+            return self.http.get(self.url(f'/category/{self.rng.choice(self.category_ids)}'), allow_redirects=False)
+        if scenario == 'cart_add':
+            return self.http.post(self.url('/cart/add'), allow_redirects=False,
+                                  data={'product_id': self.rng.choice(self.product_ids), 'quantity': 1})
+        if scenario == 'checkout':
+            # A checkout needs a non-empty cart and a fresh CSRF token
+            self.http.post(self.url('/cart/add'), allow_redirects=False,
+                           data={'product_id': self.rng.choice(self.product_ids), 'quantity': 1})
+            token = self.csrf_token('/checkout')
+            return self.http.post(self.url('/checkout'), allow_redirects=False, data={
+                'csrf_token': token,
+                'full_name': 'Load Test',
+                'email': 'loadtest@example.com',
+                'phone_number': '9876543210',
+                'telegram_username': '',
+                'message': '',
+            })
+        if not self.admin_logged_in:
+            self.login_admin()
+        if scenario == 'admin_products':
+            return self.http.get(self.url('/admin-pn/products'), allow_redirects=False)
+        if scenario == 'admin_leads':
+            return self.http.get(self.url('/admin-pn/leads'), allow_redirects=False)
+        if scenario == 'admin_orders':
+            return self.http.get(self.url('/admin-pn/orders'), allow_redirects=False)
+        if scenario == 'admin_export':
+            return self.http.get(self.url('/admin-pn/export/orders.csv'), allow_redirects=False)
+        raise ValueError(f'Unknown scenario: {scenario}')
+
+
+def discover_ids(base_url):
+    """Find product and category ids by crawling the storefront once"""
+    home = requests.get(base_url.rstrip('/') + '/').text
+    product_ids = sorted({int(pid) for pid in PRODUCT_LINK_RE.findall(home)})
+    categories = requests.get(base_url.rstrip('/') + '/categories').text
+    category_ids = sorted({int(cid) for cid in re.findall(r'/category/(\d+)', categories)})
+    return product_ids, category_ids
+
+
+def worker(client, mix, deadline, results):
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    while time.monotonic() < deadline:
+        scenario = client.rng.choices(scenarios, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = client.run(scenario)
+        except requests.RequestException:
+            response = None
+        results.record(scenario, time.perf_counter() - started, response)
+
+
+def run_load(base_url, concurrency=8, duration=30, mix=None, seed_value=42,
+             admin_credentials=('admin', 'admin @root')):
+    """Run the traffic mix for ``duration`` seconds and return a summary dict"""
+    mix = mix or DEFAULT_MIX
+    product_ids, category_ids = discover_ids(base_url)
+    if not product_ids:
+        raise SystemExit('No products found on the homepage; seed the database first')
+    if not category_ids:
+        mix = {name: weight for name, weight in mix.items() if name != 'category'}
+
+    results = Results()
+    deadline = time.monotonic() + duration
+    threads = []
+    started = time.perf_counter()
+    for i in range(concurrency):
+        client = Client(base_url, product_ids, category_ids, admin_credentials,
+                        random.Random(seed_value + i))
+        thread = threading.Thread(target=worker, args=(client, mix, deadline, results), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    summary = results.summary(time.perf_counter() - started)
+    summary['config'] = {'concurrency': concurrency, 'duration_s': duration, 'mix': mix}
+    return summary
+
+
+def spawn_gunicorn(bind, workers):
+    """Start gunicorn serving ``benchmarks.app`` and wait until it answers"""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', bind,
+         '--log-level', 'warning', 'benchmarks.app:app'],
+        env=dict(os.environ),
+    )
+    base_url = f'http://{bind}'
+    for _ in range(100):
+        try:
+            requests.get(base_url + '/', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn did not start')
+
+
+def compare(summary, baseline, tolerance):
+    """Print a comparison table and return True if there is a regression"""
+    regressed = False
+    print(f"{'scenario':<16}{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    rows = [('total', summary['total'], baseline.get('total', {}))]
+    for name, current in summary['scenarios'].items():
+        rows.append((name, current, baseline.get('scenarios', {}).get(name, {})))
+
+    for name, current, base in rows:
+        for metric, higher_is_better in (('rps', True), ('p95_ms', False),
+                                         ('p99_ms', False), ('queries_per_request', False)):
+            old, new = base.get(metric), current.get(metric)
+            if old in (None, 0) or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            regressed = regressed or worse
+            flag = '  <-- regression' if worse else ''
+            print(f"{name:<16}{metric:<22}{old:>12}{new:>12}{change:>+10.1%}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Baign Mart load test')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--spawn', action='store_true', help='Start gunicorn for the duration of the run')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers when --spawn is used')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='Write the results as a JSON baseline to this path')
+    parser.add_argument('--compare', help='Compare the results against this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Relative change treated as a regression (default 10%%)')
+    args = parser.parse_args(argv)
+
+    process = None
+    base_url = args.url
+    if args.spawn:
+        bind = base_url.split('://', 1)[-1].rstrip('/')
+        process, base_url = spawn_gunicorn(bind, args.workers)
+
+    try:
+        summary = run_load(base_url, concurrency=args.concurrency,
+                           duration=args.duration, seed_value=args.seed)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(summary, indent=2))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(summary, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Bulk data generator for benchmarking large catalogs.
+
+Generates categories, products (with image files), leads and visitors using
+chunked bulk inserts, so millions of rows load in minutes instead of hours.
+The output is deterministic for a given ``--seed``.
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.seed \\
+        --products 10000 --leads 1000000 --visitors 5000000
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Allow running as ``python benchmarks/seed.py`` as well as ``-m``
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Product, ProductImage, Category, Lead, Visitor, AdminUser, SiteSettings
+import pricing
+
+DEFAULT_IMAGE = os.path.join('static', 'images', 'logo.jpg')
+
+CATEGORY_NAMES = [
+    'Andrew Tate Course', 'Grant Cardone Course', 'Dating Course', 'Fitness Course',
+    'Business Course', 'Crypto Course', 'Marketing Course', 'Coding Course',
+]
+
+WORDS = [
+    'Ultimate', 'Masterclass', 'Blueprint', 'Bootcamp', 'Secrets', 'Mindset', 'Wealth',
+    'Sales', 'Power', 'Habits', 'Strategy', 'Elite', 'Advanced', 'Complete', 'Pro',
+]
+
+
+def chunked_insert(table, rows, chunk_size):
+    """Insert an iterable of row dicts in chunks, committing after each one"""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+
+def tune_sqlite_for_bulk_load():
+    """Relax durability while seeding; the data is disposable"""
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text('PRAGMA journal_mode=WAL'))
+        db.session.execute(db.text('PRAGMA synchronous=OFF'))
+
+
+def seed_reference_data():
+    """Create admin user, settings and categories; return category ids"""
+    if not SiteSettings.query.first():
+        db.session.add(SiteSettings())
+
+    admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
+    admin_password = os.environ.get('ADMIN_PASSWORD', 'admin @root')
+    if not AdminUser.query.filter_by(username=admin_username).first():
+        db.session.add(AdminUser(username=admin_username, password_hash=admin_password))
+
+    existing = {c.name for c in Category.query.all()}
+    for name in CATEGORY_NAMES:
+        if name not in existing:
+            db.session.add(Category(name=name, description=f'{name} (benchmark)', is_active=True))
+    db.session.commit()
+
+    return [c.id for c in Category.query.all()]
+
+
+def product_rows(rng, count, category_ids, now):
+    for i in range(count):
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        yield {
+            'title': f"{rng.choice(WORDS)} {rng.choice(WORDS)} #{i + 1}",
+            'description': ' '.join(rng.choice(WORDS) for _ in range(40)),
+            'price_inr': float(rng.randint(99, 9999)),
+            'active': rng.random() > 0.05,
+            'stock': rng.choice([None, None, rng.randint(0, 500)]),
+            'views': rng.randint(0, 50000),
+            'add_to_cart_count': rng.randint(0, 2000),
+            'featured': rng.random() < 0.1,
+            'discount_override': None,
+            'per_product_discount': rng.choice([None, None, None, float(rng.randint(5, 60))]),
+            'created_at': created,
+            'updated_at': created,
+            'category_id': rng.choice(category_ids),
+            'is_hot_product': rng.random() < 0.01,
+        }
+
+
+def seed_images(product_ids, per_product, upload_folder, image_source, chunk_size):
+    """Create image files (hard links when possible) and their rows"""
+    os.makedirs(upload_folder, exist_ok=True)
+
+    def rows():
+        for product_id in product_ids:
+            for position in range(per_product):
+                filename = f"bench_{product_id}_{position}.jpg"
+                path = os.path.join(upload_folder, filename)
+                if not os.path.exists(path):
+                    try:
+                        os.link(image_source, path)
+                    except OSError:
+                        shutil.copyfile(image_source, path)
+                yield {
+                    'product_id': product_id,
+                    'filename': filename,
+                    'position': position,
+                    'created_at': datetime.utcnow(),
+                }
+
+    return chunked_insert(ProductImage.__table__, rows(), chunk_size)
+
+
+def lead_rows(rng, count, product_ids, now):
+    for i in range(count):
+        lines = [
+            {'product_id': rng.choice(product_ids), 'quantity': rng.randint(1, 3)}
+            for _ in range(rng.randint(1, 4))
+        ]
+        yield {
+            'order_id': f"BENCH{i:012d}",
+            'full_name': f"Customer {i}",
+            'email': f"customer{i}@example.com",
+            'phone_number': f"9{i:09d}"[:15],
+            'telegram_username': None,
+            'products_json': json.dumps(lines),
+            'total_amount': float(sum(line['quantity'] * rng.randint(59, 5999) for line in lines)),
+            'message': None,
+            'status': rng.choice(['new', 'pending', 'contacted', 'completed']),
+            'created_at': now - timedelta(seconds=rng.randint(0, 90 * 24 * 3600)),
+        }
+
+
+def visitor_rows(rng, count, now):
+    for i in range(count):
+        first_seen = now - timedelta(seconds=rng.randint(0, 180 * 24 * 3600))
+        yield {
+            'ip_hash': hashlib.sha256(f"bench-visitor-{i}".encode()).hexdigest(),
+            'first_seen': first_seen,
+            'last_seen': first_seen + timedelta(seconds=rng.randint(0, 3600 * 24 * 7)),
+            'views_count': rng.randint(1, 50),
+        }
+
+
+def seed(app, products=10000, images_per_product=2, leads=100000, visitors=500000,
+         chunk_size=5000, seed_value=42, image_source=DEFAULT_IMAGE, log=print):
+    """Populate the app's database with a reproducible large data set"""
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+
+    with app.app_context():
+        db.create_all()
+        tune_sqlite_for_bulk_load()
+        category_ids = seed_reference_data()
+
+        started = time.perf_counter()
+        first_new_id = (db.session.query(db.func.max(Product.id)).scalar() or 0) + 1
+        count = chunked_insert(Product.__table__, product_rows(rng, products, category_ids, now), chunk_size)
+        product_ids = list(range(first_new_id, first_new_id + count))
+        # Core inserts skip the pricing hooks; price the new rows in one UPDATE
+        pricing.refresh_effective_prices(db.session, where=Product.id >= first_new_id)
+        db.session.commit()
+        log(f"products: {count} in {time.perf_counter() - started:.1f}s")
+
+        if images_per_product and product_ids:
+            started = time.perf_counter()
+            count = seed_images(product_ids, images_per_product, app.config['UPLOAD_FOLDER'],
+                                image_source, chunk_size)
+            log(f"product images: {count} in {time.perf_counter() - started:.1f}s")
+
+        all_product_ids = [row[0] for row in db.session.query(Product.id).all()]
+        if leads and all_product_ids:
+            started = time.perf_counter()
+            count = chunked_insert(Lead.__table__, lead_rows(rng, leads, all_product_ids, now), chunk_size)
+            log(f"leads: {count} in {time.perf_counter() - started:.1f}s")
+
+        if visitors:
+            started = time.perf_counter()
+            count = chunked_insert(Visitor.__table__, visitor_rows(rng, visitors, now), chunk_size)
+            log(f"visitors: {count} in {time.perf_counter() - started:.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed a large benchmark data set')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--images-per-product', type=int, default=2)
+    parser.add_argument('--leads', type=int, default=1000000)
+    parser.add_argument('--visitors', type=int, default=5000000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--image-source', default=DEFAULT_IMAGE,
+                        help='Image file copied (or hard linked) for every product image')
+    args = parser.parse_args(argv)
+
+    app, _ = create_app()
+    print(f"Seeding {app.config['SQLALCHEMY_DATABASE_URI']}")
+    seed(app,
+         products=args.products,
+         images_per_product=args.images_per_product,
+         leads=args.leads,
+         visitors=args.visitors,
+         chunk_size=args.chunk_size,
+         seed_value=args.seed,
+         image_source=args.image_source)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Worker start-up time benchmark.
+
+Each run starts a fresh interpreter and measures how long it takes to import
+and build the app, to warm it up (compile templates), and to serve the first
+request for a few pages. Medians over several runs are reported so that
+start-up regressions (a heavy import, a query at import time) show up.
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.startup --runs 7
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.startup --save benchmarks/startup.json
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.startup --compare benchmarks/startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON object
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app, warm_up
+app, db = create_app()
+imported = time.perf_counter()
+if WARM:
+    warm_up(app)
+warmed = time.perf_counter()
+client = app.test_client()
+first = {}
+for path in PATHS:
+    t = time.perf_counter()
+    client.get(path)
+    first[path] = (time.perf_counter() - t) * 1000
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'warm_up_ms': (warmed - imported) * 1000,
+    'first_request_ms': first,
+    'total_ms': (time.perf_counter() - started) * 1000,
+}))
+'''
+
+DEFAULT_PATHS = ['/', '/categories', '/cart', '/admin-pn/login']
+
+
+def run_once(paths, warm, cold_cache):
+    env = dict(os.environ)
+    cold_dir = None
+    if cold_cache:
+        # Point Jinja at an empty cache directory to measure a first deploy
+        cold_dir = tempfile.mkdtemp(prefix='jinja-cold-')
+        env['JINJA_CACHE_DIR'] = cold_dir
+    code = f"WARM = {warm!r}\nPATHS = {paths!r}\n" + PROBE
+    try:
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    finally:
+        if cold_dir:
+            shutil.rmtree(cold_dir, ignore_errors=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(runs=5, paths=None, warm=True, cold_cache=False):
+    """Return median start-up timings over ``runs`` fresh interpreters"""
+    paths = paths or DEFAULT_PATHS
+    samples = [run_once(paths, warm, cold_cache) for _ in range(runs)]
+    return {
+        'runs': runs,
+        'warm_up': warm,
+        'cold_template_cache': cold_cache,
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'warm_up_ms': round(statistics.median(s['warm_up_ms'] for s in samples), 1),
+        'total_ms': round(statistics.median(s['total_ms'] for s in samples), 1),
+        'first_request_ms': {
+            path: round(statistics.median(s['first_request_ms'][path] for s in samples), 1)
+            for path in paths
+        },
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Print changes against a baseline; return True on a regression"""
+    regressed = False
+    metrics = [('import_ms', result['import_ms'], baseline.get('import_ms')),
+               ('warm_up_ms', result['warm_up_ms'], baseline.get('warm_up_ms')),
+               ('total_ms', result['total_ms'], baseline.get('total_ms'))]
+    for path, value in result['first_request_ms'].items():
+        metrics.append((f'first {path}', value, baseline.get('first_request_ms', {}).get(path)))
+
+    for name, new, old in metrics:
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = change > tolerance
+        regressed = regressed or worse
+        print(f"{name:<28}{old:>10}{new:>10}{change:>+10.1%}{'  <-- regression' if worse else ''}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure worker start-up time')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--no-warm-up', action='store_true', help='Skip the warm-up step')
+    parser.add_argument('--cold-cache', action='store_true', help='Start with an empty template bytecode cache')
+    parser.add_argument('--save', help='Write the results as a JSON baseline to this path')
+    parser.add_argument('--compare', help='Compare the results against this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.20)
+    args = parser.parse_args(argv)
+
+    result = measure(runs=args.runs, warm=not args.no_warm_up, cold_cache=args.cold_cache)
+    print(json.dumps(result, indent=2))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""Per-worker caching with cross-worker tag invalidation.
+
+Cached values carry tags (table names such as ``products`` or
+``site_settings``). Every tag has a version stamp kept as the mtime of a
+small file under ``CACHE_VERSION_DIR``, so all gunicorn workers on a host
+see the same versions with one ``stat()`` per tag and request. Cache keys
+include the versions of their tags: committing a change to a tagged table
+bumps its version and every worker's stale entries stop matching.
+
+The ``{% cache %}`` Jinja tag caches rendered template fragments:
+
+    {% cache 'layout-footer', 'site_settings' %} ... {% endcache %}
+
+and ``@cached_query(tag, ...)`` caches the results of query functions (see
+queries.py).
+
+Both rebuild through ``cached_build``, which lets a single caller per host
+rebuild a stale entry (``single_flight``: a per-process lock plus a lock
+file shared by the workers). While it runs, the others get the previous
+value, or wait up to ``SINGLE_FLIGHT_WAIT`` seconds when there is none, so
+an invalidation under load does not send every request to the database.
+"""
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: rebuilds are only coalesced within each process
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with optional per-entry TTL"""
+
+    def __init__(self, maxsize=256, name=None):
+        self.maxsize = maxsize
+        self.name = name  # Reported to metrics as cache=<name> when set
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.peek(key, _MISSING)
+        self.record('miss' if value is _MISSING else 'hit')
+        return default if value is _MISSING else value
+
+    def peek(self, key, default=None):
+        """Like ``get`` without counting a hit or miss"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] is not None and entry[1] < time.monotonic():
+                del self._data[key]
+                entry = _MISSING
+            if entry is not _MISSING:
+                self._data.move_to_end(key)
+        return default if entry is _MISSING else entry[0]
+
+    def record(self, result):
+        """Count a lookup: 'hit', 'miss' or 'stale' (previous value served)"""
+        with self._lock:
+            if result == 'miss':
+                self.misses += 1
+            else:
+                self.hits += 1
+        if self.name:
+            metrics.cache_lookup(self.name, result)
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ---------------------------------------------------------------------------
+# Tag versions shared across worker processes
+# ---------------------------------------------------------------------------
+
+def _version_path(tag):
+    return os.path.join(current_app.config['CACHE_VERSION_DIR'], tag)
+
+
+def tag_version(tag):
+    """Current version stamp of a tag (0 if it was never bumped)"""
+    memo = g.setdefault('_cache_tag_versions', {}) if has_request_context() else None
+    if memo is not None and tag in memo:
+        return memo[tag]
+    try:
+        version = os.stat(_version_path(tag)).st_mtime_ns
+    except FileNotFoundError:
+        version = 0
+    if memo is not None:
+        memo[tag] = version
+    return version
+
+
+def tag_versions(tags):
+    return tuple(tag_version(tag) for tag in tags)
+
+
+def bump_tags(tags):
+    """Invalidate every cached entry carrying any of ``tags``, in all workers"""
+    for tag in tags:
+        path = _version_path(tag)
+        try:
+            previous = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            with open(path, 'a'):
+                pass
+            previous = 0
+        # Strictly increasing even if the clock is coarse or goes backwards
+        stamp = max(time.time_ns(), previous + 1)
+        os.utime(path, ns=(stamp, stamp))
+    if has_request_context():
+        g.pop('_cache_tag_versions', None)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation from SQLAlchemy commits
+# ---------------------------------------------------------------------------
+
+# Only these tables feed cached data; writes elsewhere never invalidate
+TAGGED_TABLES = {'products', 'product_images', 'categories', 'site_settings'}
+
+# Counter columns that change on every page view but are never cached
+UNTRACKED_COLUMNS = {'views', 'add_to_cart_count', 'updated_at'}
+
+
+def _changed_attributes(obj):
+    return {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+
+
+def _collect_flush_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for obj in list(session.new) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in TAGGED_TABLES:
+            tags.add(table)
+    for obj in session.dirty:
+        table = getattr(obj, '__tablename__', None)
+        if table in TAGGED_TABLES and not _changed_attributes(obj) <= UNTRACKED_COLUMNS:
+            tags.add(table)
+
+
+def _collect_statement_tags(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush; counter updates
+    # opt out with .execution_options(skip_cache_invalidation=True), and
+    # .execution_options(cache_tags=(...)) bumps those tags instead of the table's
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    options = orm_execute_state.execution_options
+    if options.get('skip_cache_invalidation'):
+        return
+    if options.get('cache_tags') is not None:
+        orm_execute_state.session.info.setdefault('cache_tags', set()).update(options['cache_tags'])
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) in TAGGED_TABLES:
+        orm_execute_state.session.info.setdefault('cache_tags', set()).add(table.name)
+
+
+def _bump_committed_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags and has_app_context():
+        bump_tags(sorted(tags))
+
+
+def _discard_tags(session):
+    session.info.pop('cache_tags', None)
+
+
+_listeners_installed = False
+
+
+def install_listeners():
+    """Register the session hooks once per process"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Session, 'after_flush', _collect_flush_tags)
+    event.listen(Session, 'do_orm_execute', _collect_statement_tags)
+    event.listen(Session, 'after_commit', _bump_committed_tags)
+    event.listen(Session, 'after_rollback', _discard_tags)
+    _listeners_installed = True
+
+
+# ---------------------------------------------------------------------------
+# Single-flight rebuilds
+# ---------------------------------------------------------------------------
+
+# Keys hash onto a fixed set of locks and lock files, so neither grows with
+# the number of keys; keys sharing a stripe occasionally wait for each other
+FLIGHT_STRIPES = 256
+
+_flight_locks = [threading.Lock() for _ in range(FLIGHT_STRIPES)]
+_flights_held = threading.local()
+
+
+def _stripe(key):
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') % FLIGHT_STRIPES
+
+
+def _lease_path(stripe):
+    return os.path.join(current_app.config['CACHE_LOCK_DIR'], f'{stripe:02x}.lock')
+
+
+def _take_lease(stripe, deadline):
+    """The locked lease file, None without fcntl, or False if another worker kept it until ``deadline``"""
+    if fcntl is None:
+        return None
+    f = open(_lease_path(stripe), 'a')
+    while True:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f  # Released by closing, or by the kernel if the worker dies
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                f.close()
+                return False
+            time.sleep(0.01)
+
+
+@contextmanager
+def single_flight(key, wait=0):
+    """Let one caller on this host at a time rebuild ``key``
+
+    Yields True to the caller that should rebuild (after checking whether a
+    caller it waited for already did). Yields False if another thread or
+    worker still holds ``key`` after ``wait`` seconds, at once if ``wait``
+    is 0.
+    """
+    stripe = _stripe(key)
+    held = _flights_held.__dict__.setdefault('stripes', set())
+    if stripe in held:
+        yield True  # Nested in a rebuild of this thread that holds the stripe
+        return
+    deadline = time.monotonic() + wait
+    lock = _flight_locks[stripe]
+    if not (lock.acquire(timeout=wait) if wait > 0 else lock.acquire(blocking=False)):
+        yield False
+        return
+    try:
+        lease = _take_lease(stripe, deadline)
+        if lease is False:
+            yield False
+            return
+        held.add(stripe)
+        try:
+            yield True
+        finally:
+            held.discard(stripe)
+            if lease is not None:
+                lease.close()
+    finally:
+        lock.release()
+
+
+def _is_fresh(entry, versions):
+    return entry[0] == versions and (entry[1] is None or entry[1] > time.monotonic())
+
+
+def cached_build(store, key, versions, build, ttl=None):
+    """``store``'s value of ``key`` at tag ``versions``, calling ``build`` on a miss
+
+    Entries keep their previous value after they go stale, so while one
+    caller rebuilds the others can be answered from it.
+    """
+    entry = store.peek(key)
+    if entry is not None and _is_fresh(entry, versions):
+        store.record('hit')
+        return entry[2]
+    stale = _MISSING if entry is None else entry[2]
+    wait = current_app.config['SINGLE_FLIGHT_WAIT'] if stale is _MISSING else 0
+    with single_flight((store.name, key), wait) as leader:
+        if leader:
+            entry = store.peek(key)
+            if entry is not None and _is_fresh(entry, versions):
+                store.record('hit')  # Built by the caller this one waited for
+                return entry[2]
+        elif stale is not _MISSING:
+            store.record('stale')
+            return stale
+        # The rebuilding caller, or one that waited in vain and builds anyway
+        store.record('miss')
+        value = build()
+        store.set(key, (versions, time.monotonic() + ttl if ttl else None, value))
+        return value
+
+
+# ---------------------------------------------------------------------------
+# Jinja fragment cache
+# ---------------------------------------------------------------------------
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, tag1, tag2 %}...{% endcache %}`` fragment caching
+
+    The rendered block is stored per worker under the key and the current
+    versions of its tags. Keep per-user content (cart badge, admin links)
+    outside of cached blocks.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        tags = []
+        while parser.stream.skip_if('comma'):
+            tags.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [key, nodes.List(tags)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, key, tags, caller):
+        if not current_app.config.get('FRAGMENT_CACHE_ENABLED', True):
+            return caller()
+        return cached_build(current_app.extensions['fragment_cache'], key, tag_versions(tags), caller)
+
+
+# ---------------------------------------------------------------------------
+# Query result cache
+# ---------------------------------------------------------------------------
+
+def cached_query(*tags, ttl=None):
+    """Cache a query function's results per worker under its arguments and ``tags``
+
+    The function must return read-only values, never ORM instances: cached
+    results are shared by every request in the worker. Entries go stale when
+    a commit touches one of ``tags`` and expire after ``ttl`` seconds
+    (``QUERY_CACHE_TTL`` by default). ``func.uncached`` skips the cache.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['QUERY_CACHE_ENABLED']:
+                return func(*args, **kwargs)
+            # Versions are read before querying: a commit racing with the
+            # query leaves its result labelled as older, so it is rebuilt
+            return cached_build(
+                current_app.extensions['query_cache'], (name, args, tuple(sorted(kwargs.items()))),
+                tag_versions(tags), lambda: func(*args, **kwargs),
+                ttl or current_app.config['QUERY_CACHE_TTL'],
+            )
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Configure caching for an application"""
+    app.config.setdefault('CACHE_VERSION_DIR', os.environ.get(
+        'CACHE_VERSION_DIR', os.path.join(app.instance_path, 'cache_versions')))
+    app.config.setdefault('FRAGMENT_CACHE_SIZE', 256)
+    app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+    app.config.setdefault('QUERY_CACHE_SIZE', int(os.environ.get('QUERY_CACHE_SIZE', 2048)))
+    app.config.setdefault('QUERY_CACHE_TTL', int(os.environ.get('QUERY_CACHE_TTL', 300)))
+    app.config.setdefault('QUERY_CACHE_ENABLED', True)
+    app.config.setdefault('CACHE_LOCK_DIR', os.environ.get(
+        'CACHE_LOCK_DIR', os.path.join(app.instance_path, 'cache_locks')))
+    app.config.setdefault('SINGLE_FLIGHT_WAIT', float(os.environ.get('SINGLE_FLIGHT_WAIT', 2)))
+    os.makedirs(app.config['CACHE_VERSION_DIR'], exist_ok=True)
+    os.makedirs(app.config['CACHE_LOCK_DIR'], exist_ok=True)
+    app.extensions['fragment_cache'] = LRUCache(app.config['FRAGMENT_CACHE_SIZE'], name='fragment')
+    app.extensions['query_cache'] = LRUCache(app.config['QUERY_CACHE_SIZE'], name='query')
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    install_listeners()
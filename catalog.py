@@ -0,0 +1,142 @@
+"""In-memory snapshot of the storefront catalog.
+
+Each worker keeps one immutable ``Catalog``: the active products (with their
+images and precomputed discounted prices) and active categories as slotted
+records from queries.py, plus the indexes the storefront needs (listing
+orders, products per category, pinned hot products, product counts).
+Storefront pages read it without touching the ORM.
+
+The snapshot is labelled with the versions of the catalog cache tags. When a
+commit bumps one of them, the next request builds a new snapshot in four
+queries and swaps it in by reference; requests already holding the old one
+keep using it. Only one thread on the host rebuilds at a time
+(``cache.single_flight``); the others keep serving their previous snapshot
+meanwhile. Snapshots are always read from the primary:
+one built from a lagging replica would stay stale until the next change.
+"""
+from datetime import datetime
+from types import MappingProxyType
+
+from flask import current_app
+from sqlalchemy.orm import selectinload
+
+import queries
+import replica
+from cache import single_flight, tag_versions
+from models import Category, Product
+
+CATALOG_TAGS = ('products', 'product_images', 'categories', 'site_settings')
+
+
+class CatalogProduct(queries.ProductRecord):
+    """Active product with its discounted price under the current settings"""
+    __slots__ = ('discounted_price',)
+
+
+# Sort name -> (key, reverse): the orders of facets.SORTS, on the precomputed price
+SORT_KEYS = {
+    'newest': (lambda p: (p.created_at or datetime.min, p.id), True),
+    'price_asc': (lambda p: (p.discounted_price, p.id), False),
+    'price_desc': (lambda p: (-p.discounted_price, p.id), False),
+}
+
+
+class Catalog:
+    """Immutable catalog snapshot; build with ``Catalog.load``"""
+    __slots__ = ('version', 'products', 'categories', 'category_by_id', 'category_counts',
+                 'orders', 'hot')
+
+    def __init__(self, version, products, categories):
+        setattr_ = object.__setattr__
+        setattr_(self, 'version', version)
+        setattr_(self, 'products', MappingProxyType({product.id: product for product in products}))
+        setattr_(self, 'categories', tuple(categories))
+        setattr_(self, 'category_by_id', MappingProxyType({category.id: category for category in categories}))
+
+        counts = {}
+        for product in products:
+            counts[product.category_id] = counts.get(product.category_id, 0) + 1
+        setattr_(self, 'category_counts', MappingProxyType(counts))
+
+        # (category_id or None for all products, sort) -> products in that order
+        orders = {}
+        for sort, (key, reverse) in SORT_KEYS.items():
+            ordered = sorted(products, key=key, reverse=reverse)
+            orders[(None, sort)] = tuple(ordered)
+            for category_id in self.category_by_id:
+                orders[(category_id, sort)] = tuple(p for p in ordered if p.category_id == category_id)
+        setattr_(self, 'orders', MappingProxyType(orders))
+
+        # category_id or None for all products -> products flagged hot, by id
+        hot = {None: []}
+        for product in sorted(products, key=lambda p: p.id):
+            if product.is_hot_product:
+                hot[None].append(product)
+                if product.category_id is not None:
+                    hot.setdefault(product.category_id, []).append(product)
+        setattr_(self, 'hot', MappingProxyType({key: tuple(value) for key, value in hot.items()}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Catalog snapshots are read-only')
+
+    @classmethod
+    def load(cls, version):
+        with replica.primary_reads():
+            settings = queries.site_settings.uncached()
+            global_discount = settings.global_discount_percent if settings else 0
+            categories = [queries.CategoryRecord.from_row(row) for row in
+                          Category.query.filter_by(is_active=True).order_by(Category.name)]
+            products = [
+                CatalogProduct.from_row(row, discounted_price=row.get_discounted_price(global_discount))
+                for row in Product.query.filter_by(active=True).options(selectinload(Product.images))
+            ]
+        return cls(version, products, categories)
+
+    def listing(self, args, category_id=None):
+        """Products for ?sort=, ?min_price= and ?max_price=, and the options applied"""
+        sort = args.get('sort', 'newest')
+        if sort not in SORT_KEYS:
+            sort = 'newest'
+        min_price = args.get('min_price', type=float)
+        max_price = args.get('max_price', type=float)
+        products = self.orders.get((category_id, sort), ())
+        if min_price is not None or max_price is not None:
+            products = [p for p in products
+                        if (min_price is None or p.discounted_price >= min_price)
+                        and (max_price is None or p.discounted_price <= max_price)]
+        return list(products), {'sort': sort, 'min_price': min_price, 'max_price': max_price}
+
+    def hot_products(self, category_id=None):
+        return self.hot.get(category_id, ())
+
+
+class _Holder:
+    """Per-app reference to the current snapshot"""
+
+    def __init__(self):
+        self.snapshot = None
+
+
+def current():
+    """This worker's snapshot, rebuilt first if the catalog changed"""
+    holder = current_app.extensions['catalog']
+    # Versions are read before loading: a commit during the build leaves
+    # the snapshot labelled as older, so the next request rebuilds again
+    version = tag_versions(CATALOG_TAGS)
+    snapshot = holder.snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    # Without a snapshot callers wait for the first build; afterwards they
+    # keep serving the previous one while another caller rebuilds
+    wait = current_app.config['SINGLE_FLIGHT_WAIT'] if snapshot is None else 0
+    with single_flight('catalog', wait) as leader:
+        if not leader and snapshot is not None:
+            return snapshot
+        if holder.snapshot is None or holder.snapshot.version != version:
+            holder.snapshot = Catalog.load(version)
+        return holder.snapshot
+
+
+def init_app(app):
+    """Keep a catalog snapshot for an application"""
+    app.extensions['catalog'] = _Holder()
@@ -0,0 +1,458 @@
+"""Bulk catalog import and export.
+
+Imports read CSV or JSONL rows, validate them, upsert categories and
+products with chunked bulk statements and copy product images (from a zip
+archive or a local directory) in a thread pool. Exports stream the catalog
+in the same format so it can be edited and imported again.
+"""
+import csv
+import io
+import json
+import math
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import insert, update
+from werkzeug.utils import secure_filename
+
+from models import Product, ProductImage, Category, compute_effective_price, db
+import pricing
+
+# Column order for exports; imports accept any subset that includes title and price_inr
+EXPORT_FIELDS = [
+    'id', 'title', 'description', 'price_inr', 'active', 'stock', 'featured',
+    'is_hot_product', 'discount_override', 'per_product_discount', 'category', 'images',
+]
+
+ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+MAX_IMAGES_PER_PRODUCT = 4
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off', ''}
+
+
+class RowError(ValueError):
+    """A single import row failed validation"""
+
+
+class ImportReport:
+    """Summary of a bulk import: counts plus per-row errors"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.images = 0
+        self.categories_created = 0
+        self.errors = []  # (line number, message)
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'images': self.images,
+            'categories_created': self.categories_created,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Reading and validation
+# ---------------------------------------------------------------------------
+
+def detect_format(filename):
+    """Return 'csv' or 'jsonl' based on a file name"""
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a text stream"""
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, RowError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(row, dict):
+                yield line_no, RowError('Each line must be a JSON object')
+                continue
+            yield line_no, row
+    else:
+        reader = csv.DictReader(stream)
+        # Line 1 is the header
+        for line_no, row in enumerate(reader, start=2):
+            yield line_no, row
+
+
+def _text(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _bool(value, field, default):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text == '' and default is not None:
+        return default
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f'{field}: expected a true/false value, got {value!r}')
+
+
+def _float(value, field, minimum=None, maximum=None, required=False):
+    text = _text(value)
+    if text == '':
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    try:
+        number = float(text)
+    except ValueError:
+        raise RowError(f'{field}: {value!r} is not a number')
+    if not math.isfinite(number):
+        raise RowError(f'{field}: {value!r} is not a number')
+    if minimum is not None and number < minimum:
+        raise RowError(f'{field} must be at least {minimum}')
+    if maximum is not None and number > maximum:
+        raise RowError(f'{field} must be at most {maximum}')
+    return number
+
+
+def _int(value, field, minimum=None):
+    text = _text(value)
+    if text == '':
+        return None
+    try:
+        number = int(float(text))
+    except (ValueError, OverflowError):
+        raise RowError(f'{field}: {value!r} is not a whole number')
+    if minimum is not None and number < minimum:
+        raise RowError(f'{field} must be at least {minimum}')
+    return number
+
+
+def _images(value):
+    if isinstance(value, list):
+        names = [_text(v) for v in value]
+    else:
+        names = [part.strip() for part in _text(value).split(';')]
+    names = [name for name in names if name]
+    if len(names) > MAX_IMAGES_PER_PRODUCT:
+        raise RowError(f'images: at most {MAX_IMAGES_PER_PRODUCT} images per product')
+    for name in names:
+        if '.' not in name or name.rsplit('.', 1)[1].lower() not in ALLOWED_IMAGE_EXTENSIONS:
+            raise RowError(f'images: {name!r} is not an allowed image type')
+    return names
+
+
+def validate_row(row):
+    """Validate and normalise one import row; raise RowError on failure"""
+    if isinstance(row, RowError):
+        raise row
+
+    title = _text(row.get('title'))
+    if not title:
+        raise RowError('title is required')
+    if len(title) > 200:
+        raise RowError('title must be at most 200 characters')
+
+    category = _text(row.get('category'))
+    if len(category) > 100:
+        raise RowError('category must be at most 100 characters')
+
+    return {
+        'id': _int(row.get('id'), 'id', minimum=1),
+        'title': title,
+        'description': _text(row.get('description')),
+        'price_inr': _float(row.get('price_inr'), 'price_inr', minimum=0.01, required=True),
+        'active': _bool(row.get('active'), 'active', default=True),
+        'stock': _int(row.get('stock'), 'stock', minimum=0),
+        'featured': _bool(row.get('featured'), 'featured', default=False),
+        'is_hot_product': _bool(row.get('is_hot_product'), 'is_hot_product', default=False),
+        'discount_override': _float(row.get('discount_override'), 'discount_override', 0, 100),
+        'per_product_discount': _float(row.get('per_product_discount'), 'per_product_discount', 0, 100),
+        'category': category or None,
+        'images': _images(row.get('images')),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Image sources
+# ---------------------------------------------------------------------------
+
+class ImageSource:
+    """Resolves image names from a zip archive or a local directory"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.is_zip = bool(path) and zipfile.is_zipfile(path)
+        self._names = None
+        if self.is_zip:
+            with zipfile.ZipFile(path) as archive:
+                # Match on the base name so archives with folders still work
+                self._names = {os.path.basename(n): n for n in archive.namelist() if not n.endswith('/')}
+
+    def exists(self, name):
+        if not self.path:
+            return False
+        if self.is_zip:
+            return os.path.basename(name) in self._names
+        return os.path.isfile(self._local_path(name))
+
+    def _local_path(self, name):
+        # Only allow files inside the configured directory
+        root = os.path.abspath(self.path)
+        candidate = os.path.abspath(os.path.join(root, name))
+        if os.path.commonpath([root, candidate]) != root:
+            return ''
+        return candidate
+
+    def copy_to(self, name, destination):
+        """Copy one image to ``destination``; safe to call from worker threads"""
+        if self.is_zip:
+            # Each call opens its own handle; ZipFile objects are not thread-safe
+            with zipfile.ZipFile(self.path) as archive:
+                with archive.open(self._names[os.path.basename(name)]) as src, open(destination, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+        else:
+            shutil.copyfile(self._local_path(name), destination)
+
+
+def _ingest_image(source, upload_folder, product_id, name, position):
+    base, ext = os.path.splitext(secure_filename(os.path.basename(name)))
+    timestamp = int(datetime.utcnow().timestamp())
+    filename = f"{product_id}_{base}_{timestamp}_{position}{ext.lower()}"
+    source.copy_to(name, os.path.join(upload_folder, filename))
+    return filename
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+def _upsert_categories(names, category_ids, report):
+    """Create missing categories in one bulk insert; fills ``category_ids``"""
+    missing = sorted({name for name in names if name and name not in category_ids})
+    if not missing:
+        return
+    now = datetime.utcnow()
+    db.session.execute(insert(Category), [
+        {'name': name, 'description': '', 'is_active': True, 'featured': False,
+         'created_at': now, 'updated_at': now}
+        for name in missing
+    ])
+    for category_id, name in db.session.query(Category.id, Category.name).filter(Category.name.in_(missing)):
+        category_ids[name] = category_id
+    report.categories_created += len(missing)
+
+
+def _import_chunk(chunk, category_ids, image_source, upload_folder, pool, report):
+    _upsert_categories([row['category'] for _, row in chunk], category_ids, report)
+
+    requested_ids = [row['id'] for _, row in chunk if row['id']]
+    existing_ids = set()
+    existing_images = {}
+    if requested_ids:
+        existing_ids = {pid for (pid,) in db.session.query(Product.id).filter(Product.id.in_(requested_ids))}
+        for image in ProductImage.query.filter(ProductImage.product_id.in_(requested_ids)):
+            existing_images.setdefault(image.product_id, set()).add(image.filename)
+
+    now = datetime.utcnow()
+    global_discount = pricing.current_global_discount(db.session.connection())
+    new_rows, new_lines, updates = [], [], []
+    for line_no, row in chunk:
+        values = {key: row[key] for key in EXPORT_FIELDS if key not in ('id', 'category', 'images')}
+        values['category_id'] = category_ids.get(row['category']) if row['category'] else None
+        # Bulk statements bypass the pricing hooks
+        values['effective_price'] = compute_effective_price(
+            values['price_inr'], values['discount_override'], values['per_product_discount'], global_discount)
+        values['updated_at'] = now
+        if row['id'] in existing_ids:
+            values['id'] = row['id']
+            updates.append(values)
+        else:
+            # Unknown ids are treated as new products; the database assigns the id
+            values['created_at'] = now
+            values['views'] = 0
+            values['add_to_cart_count'] = 0
+            new_rows.append(values)
+            new_lines.append((line_no, row))
+
+    if updates:
+        db.session.execute(update(Product), updates)
+        report.updated += len(updates)
+
+    product_ids = {}
+    if new_rows:
+        result = db.session.execute(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True), new_rows
+        )
+        for (line_no, row), (product_id,) in zip(new_lines, result):
+            product_ids[line_no] = product_id
+        report.created += len(new_rows)
+    for line_no, row in chunk:
+        if row['id'] in existing_ids:
+            product_ids[line_no] = row['id']
+
+    # Copy images in parallel; database rows are written from this thread only
+    jobs = []
+    replaced = set()
+    stale_files = []
+    for line_no, row in chunk:
+        if not row['images']:
+            continue
+        product_id = product_ids[line_no]
+        known = existing_images.get(product_id, set())
+        if set(row['images']) == known:
+            continue  # Unchanged round-trip export
+        missing = [name for name in row['images'] if name not in known and not image_source.exists(name)]
+        if missing:
+            report.add_error(line_no, f"images not found: {', '.join(missing)}")
+            continue
+        replaced.add(product_id)
+        stale_files.extend(known - set(row['images']))
+        for position, name in enumerate(row['images']):
+            if name in known:
+                jobs.append((line_no, product_id, position, name, None))
+            else:
+                future = pool.submit(_ingest_image, image_source, upload_folder, product_id, name, position)
+                jobs.append((line_no, product_id, position, name, future))
+
+    if replaced:
+        ProductImage.query.filter(ProductImage.product_id.in_(replaced)).delete(synchronize_session=False)
+
+    image_rows = []
+    for line_no, product_id, position, name, future in jobs:
+        if future is None:
+            filename = name
+        else:
+            try:
+                filename = future.result()
+            except (OSError, KeyError, zipfile.BadZipFile) as e:
+                report.add_error(line_no, f'image {name!r} could not be copied: {e}')
+                continue
+        image_rows.append({'product_id': product_id, 'filename': filename,
+                           'position': position, 'created_at': now})
+    if image_rows:
+        db.session.execute(insert(ProductImage), image_rows)
+        report.images += len(image_rows)
+
+    db.session.commit()
+
+    # Remove files of images that were replaced, only once the new rows are committed
+    for filename in stale_files:
+        path = os.path.join(upload_folder, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def import_products(rows, images=None, upload_folder='static/uploads', chunk_size=500,
+                    workers=4, progress=None):
+    """Bulk import (line number, row) pairs and return an ImportReport
+
+    Rows with an ``id`` that exists are updated, everything else is inserted.
+    Each chunk is validated, written and committed as one transaction; rows
+    that fail validation are reported and skipped.
+    """
+    report = ImportReport()
+    image_source = images if isinstance(images, ImageSource) else ImageSource(images)
+    os.makedirs(upload_folder, exist_ok=True)
+    category_ids = {name: category_id for category_id, name in db.session.query(Category.id, Category.name)}
+
+    processed = 0
+    chunk = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for line_no, raw in rows:
+            processed += 1
+            try:
+                chunk.append((line_no, validate_row(raw)))
+            except RowError as e:
+                report.add_error(line_no, str(e))
+            if len(chunk) >= chunk_size:
+                _import_chunk(chunk, category_ids, image_source, upload_folder, pool, report)
+                chunk = []
+                if progress:
+                    progress(processed, report)
+        if chunk:
+            _import_chunk(chunk, category_ids, image_source, upload_folder, pool, report)
+    if progress:
+        progress(processed, report)
+    return report
+
+
+def import_file(path, images=None, **kwargs):
+    """Import a CSV or JSONL file from disk"""
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return import_products(read_rows(stream, detect_format(path)), images=images, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def iter_export_rows(batch_size=1000):
+    """Yield export dicts for every product without loading the whole catalog"""
+    categories = dict(db.session.query(Category.id, Category.name))
+    last_id = 0
+    while True:
+        # Keyset pagination keeps each batch an indexed range scan
+        batch = Product.query.filter(Product.id > last_id).order_by(Product.id).limit(batch_size).all()
+        if not batch:
+            break
+        images = {}
+        for image in ProductImage.query.filter(ProductImage.product_id.in_([p.id for p in batch])) \
+                .order_by(ProductImage.product_id, ProductImage.position):
+            images.setdefault(image.product_id, []).append(image.filename)
+        for product in batch:
+            yield {
+                'id': product.id,
+                'title': product.title,
+                'description': product.description or '',
+                'price_inr': product.price_inr,
+                'active': bool(product.active),
+                'stock': product.stock,
+                'featured': bool(product.featured),
+                'is_hot_product': bool(product.is_hot_product),
+                'discount_override': product.discount_override,
+                'per_product_discount': product.per_product_discount,
+                'category': categories.get(product.category_id),
+                'images': images.get(product.id, []),
+            }
+        last_id = batch[-1].id
+        db.session.expunge_all()
+
+
+def export_products(fmt='csv', batch_size=1000):
+    """Yield the catalog as CSV or JSONL text chunks, suitable for streaming"""
+    if fmt == 'jsonl':
+        for row in iter_export_rows(batch_size):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for i, row in enumerate(iter_export_rows(batch_size), start=1):
+        row['images'] = ';'.join(row['images'])
+        row['active'] = int(row['active'])
+        row['featured'] = int(row['featured'])
+        row['is_hot_product'] = int(row['is_hot_product'])
+        writer.writerow(row)
+        if i % 100 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
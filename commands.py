@@ -0,0 +1,182 @@
+"""Flask CLI commands (``python -m flask --app run <command>``)."""
+import os
+import sys
+
+import click
+
+DEFAULT_CATEGORIES = [
+    {'name': 'Andrew Tate Course', 'description': 'Courses by Andrew Tate'},
+    {'name': 'Grant Cardone Course', 'description': 'Courses by Grant Cardone'},
+    {'name': 'Dating Course', 'description': 'Courses about dating and relationships'},
+    {'name': 'Fitness Course', 'description': 'Courses about fitness and health'},
+    {'name': 'Business Course', 'description': 'Courses about business and entrepreneurship'},
+]
+
+
+def init_database(app, create_admin=True):
+    """Create tables and seed default data; safe to run repeatedly
+
+    Run once per deploy (``flask init-db``), never at import time, so that
+    gunicorn workers start without touching the schema.
+    """
+    from models import db, Category, AdminUser, SiteSettings
+
+    with app.app_context():
+        db.create_all()
+        print("Database tables created successfully!")
+
+        if create_admin:
+            admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
+            admin_password = os.environ.get('ADMIN_PASSWORD', 'admin @root')
+            if not AdminUser.query.filter_by(username=admin_username).first():
+                # The check_password method does direct comparison
+                db.session.add(AdminUser(username=admin_username, password_hash=admin_password))
+                print(f"Default admin user '{admin_username}' created successfully!")
+
+        if not SiteSettings.query.first():
+            db.session.add(SiteSettings())
+
+        if not Category.query.first():
+            for cat_data in DEFAULT_CATEGORIES:
+                db.session.add(Category(name=cat_data['name'],
+                                        description=cat_data['description'],
+                                        is_active=True))
+            print("Default categories created successfully!")
+        else:
+            print("Categories already exist, skipping initialization.")
+
+        db.session.commit()
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's CLI"""
+
+    @app.cli.command('init-db')
+    @click.option('--no-admin', is_flag=True, help='Do not create the default admin user')
+    def init_db_command(no_admin):
+        """Create tables and seed default categories and settings."""
+        init_database(app, create_admin=not no_admin)
+
+    @app.cli.command('import-products')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--images', type=click.Path(exists=True),
+                  help='ZIP archive or directory containing the images named in the file')
+    @click.option('--chunk-size', default=500, show_default=True, help='Rows per transaction')
+    @click.option('--workers', default=4, show_default=True, help='Image copy threads')
+    def import_products_command(path, images, chunk_size, workers):
+        """Bulk import products from a CSV or JSONL file."""
+        import csv
+        import catalog_io
+
+        def progress(processed, report):
+            click.echo(f"{processed} rows processed: {report.created} created, "
+                       f"{report.updated} updated, {len(report.errors)} errors")
+
+        try:
+            report = catalog_io.import_file(path, images=images,
+                                            upload_folder=app.config['UPLOAD_FOLDER'],
+                                            chunk_size=chunk_size, workers=workers,
+                                            progress=progress)
+        except (csv.Error, ValueError) as e:
+            raise click.ClickException(f'Could not read {path}: {e}')
+        for line, message in report.errors:
+            click.echo(f"line {line}: {message}", err=True)
+        click.echo(f"Done: {report.created} created, {report.updated} updated, "
+                   f"{report.images} images, {report.categories_created} new categories")
+        if report.errors:
+            sys.exit(1)
+
+    @app.cli.command('export-products')
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+    def export_products_command(path):
+        """Export the catalog to a CSV or JSONL file."""
+        import catalog_io
+
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            for chunk in catalog_io.export_products(catalog_io.detect_format(path)):
+                f.write(chunk)
+        click.echo(f"Catalog exported to {path}")
+
+    @app.cli.command('backfill-visitor-sketches')
+    def backfill_visitor_sketches_command():
+        """Count legacy visitor rows in the unique-visitor sketches (run once)."""
+        import visitors
+
+        count = visitors.backfill_from_visitor_table()
+        click.echo(f"{count} legacy visitors added to the sketches")
+
+    @app.cli.command('rebuild-related')
+    def rebuild_related_command():
+        """Recompute co-purchase counts and related products for every product."""
+        import related
+
+        pairs, products = related.rebuild_all()
+        click.echo(f"Related products rebuilt for {products} products from {pairs} co-purchased pairs")
+
+    @app.cli.command('release-reservations')
+    def release_reservations_command():
+        """Return expired checkout stock reservations to stock."""
+        import inventory
+
+        count = inventory.release_expired()
+        click.echo(f"{count} expired stock reservations released")
+
+    @app.cli.command('purge-uploads')
+    def purge_uploads_command():
+        """Remove unfinished chunked image uploads older than UPLOAD_EXPIRY_HOURS."""
+        import uploads
+
+        count = uploads.purge_expired()
+        click.echo(f"{count} stale uploads removed")
+
+    @app.cli.command('sync-replica')
+    def sync_replica_command():
+        """Copy the SQLite primary onto the SQLite replica (local testing)."""
+        import replica
+
+        try:
+            primary, copy = replica.sync_sqlite_replica()
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Replica {copy} now matches {primary}")
+
+    @app.cli.command('backup')
+    @click.option('--no-verify', is_flag=True, help='Skip the restore check')
+    @click.option('--if-due', is_flag=True,
+                  help='Only back up if the newest backup is BACKUP_INTERVAL_HOURS old (for cron)')
+    def backup_command(no_verify, if_due):
+        """Back up the database online, with a manifest of static/uploads."""
+        import backup
+
+        try:
+            manifest = backup.create_backup(verify=not no_verify, if_due=if_due)
+        except backup.BackupRunning as e:
+            if not if_due:
+                raise click.ClickException(str(e))
+            click.echo(f"Skipped: {e}")
+            return
+        except backup.BackupError as e:
+            raise click.ClickException(str(e))
+        if manifest is None:
+            click.echo(f"No backup due: the newest is less than {app.config['BACKUP_INTERVAL_HOURS']:g} hours old")
+            return
+        click.echo(f"Backup {manifest['archive']} written ({manifest['bytes']} bytes, "
+                   f"{len(manifest['uploads'])} upload files listed) in {manifest['seconds']}s")
+        if manifest['missing_uploads']:
+            click.echo(f"Warning: {len(manifest['missing_uploads'])} product images are missing from "
+                       f"{app.config['UPLOAD_FOLDER']}")
+
+    @app.cli.command('verify-backup')
+    @click.argument('name', required=False)
+    def verify_backup_command(name):
+        """Restore a backup to a scratch copy and check it (default: the newest)."""
+        import backup
+
+        try:
+            name = name or next(iter(backup.list_backups()), None)
+            if name is None:
+                raise backup.BackupError(f"No backups in {app.config['BACKUP_DIR']}")
+            backup.verify_backup(name)
+        except backup.BackupError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Backup {name} verified")
@@ -0,0 +1,237 @@
+"""gzip / brotli compression of dynamic responses (WSGI middleware).
+
+Text responses (HTML, JSON, CSV, CSS, JS, SVG, ...) are compressed when the
+client accepts it: brotli if the ``brotli`` package is installed and the
+client prefers or allows it, gzip otherwise. Responses with a known length
+below ``COMPRESS_MIN_SIZE`` are sent as is. Streamed responses (no
+``Content-Length``, e.g. CSV exports) are compressed incrementally and
+flushed after the first chunk and then every ``COMPRESS_STREAM_FLUSH_BYTES``
+of input, so the client gets the page head at once and keeps receiving data
+while the body is generated.
+
+Images, already-encoded bodies, partial content, ``no-transform``
+responses and ``X-Sendfile`` / ``X-Accel-Redirect`` hand-offs (whose file
+the web server sends) are never touched. Every compressible response gets
+``Vary: Accept-Encoding`` so shared caches keep the variants apart.
+Set ``COMPRESS_ENABLED=0`` when a reverse proxy compresses instead.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+})
+
+SKIP_STATUSES = frozenset({204, 206, 304})
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header"""
+    codings = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[name] = q
+    return codings
+
+
+def negotiate(header, brotli_available=None):
+    """'br', 'gzip' or None for an Accept-Encoding header"""
+    brotli_available = brotli is not None if brotli_available is None else brotli_available
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get('*', 0.0)
+    candidates = ['br', 'gzip'] if brotli_available else ['gzip']
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress eligible responses of the wrapped WSGI application"""
+
+    def __init__(self, app, min_size=1024, gzip_level=6, brotli_level=4, stream_flush_bytes=8192,
+                 types=COMPRESSIBLE_TYPES):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_level = brotli_level
+        self.stream_flush_bytes = stream_flush_bytes
+        self.types = types
+
+    def _compressor(self, coding):
+        return _Brotli(self.brotli_level) if coding == 'br' else _Gzip(self.gzip_level)
+
+    def _compressible(self, environ, status, headers):
+        if environ.get('REQUEST_METHOD') == 'HEAD' or int(status.split(' ', 1)[0]) in SKIP_STATUSES:
+            return False
+        content_type = headers.get('content-type', '').split(';', 1)[0].strip().lower()
+        if content_type not in self.types:
+            return False
+        if headers.get('content-encoding', 'identity').lower() != 'identity':
+            return False
+        if 'x-sendfile' in headers or 'x-accel-redirect' in headers:
+            return False
+        return 'no-transform' not in headers.get('cache-control', '').lower()
+
+    def __call__(self, environ, start_response):
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return _no_write
+
+        app_iter = self.app(environ, capture)
+        if not captured:
+            # Response started lazily; nothing to inspect, pass it through untouched
+            return _passthrough(app_iter, captured, start_response)
+        status, headers, exc_info = captured
+        lookup = {name.lower(): value for name, value in headers}
+        if exc_info or not self._compressible(environ, status, lookup):
+            start_response(status, headers, exc_info)
+            return app_iter
+
+        headers = _add_vary(headers)
+        coding = negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        length = lookup.get('content-length')
+        if coding is None or (length is not None and int(length) < self.min_size):
+            start_response(status, headers)
+            return app_iter
+
+        headers = [(name, value) for name, value in headers
+                   if name.lower() not in ('content-length', 'accept-ranges')]
+        headers = [(name, _weaken_etag(value)) if name.lower() == 'etag' else (name, value)
+                   for name, value in headers]
+        headers.append(('Content-Encoding', coding))
+        compressor = self._compressor(coding)
+
+        if length is not None:
+            try:
+                body = compressor.compress(b''.join(app_iter)) + compressor.finish()
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            start_response(status, headers + [('Content-Length', str(len(body)))])
+            return [body]
+
+        start_response(status, headers)
+        return self._stream(app_iter, compressor)
+
+    def _stream(self, app_iter, compressor):
+        # Flushing the first chunk sends a streamed page's <head> right away
+        # instead of just the gzip header
+        pending = self.stream_flush_bytes
+        try:
+            for chunk in app_iter:
+                if not chunk:
+                    continue
+                data = compressor.compress(chunk)
+                pending += len(chunk)
+                if pending >= self.stream_flush_bytes:
+                    data += compressor.flush()
+                    pending = 0
+                if data:
+                    yield data
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+
+def _no_write(data):
+    raise RuntimeError('write() is not supported by the compression middleware')
+
+
+def _passthrough(app_iter, captured, start_response):
+    """Forward a response whose start_response is only called during iteration"""
+    started = False
+    try:
+        for chunk in app_iter:
+            if not started and captured:
+                start_response(*captured)
+                started = True
+            yield chunk
+        if not started and captured:
+            start_response(*captured)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+
+def _add_vary(headers):
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == 'vary':
+            fields = [field.strip().lower() for field in value.split(',')]
+            if 'accept-encoding' in fields or '*' in fields:
+                return headers
+            return headers[:i] + [(name, f'{value}, Accept-Encoding')] + headers[i + 1:]
+    return headers + [('Vary', 'Accept-Encoding')]
+
+
+def _weaken_etag(value):
+    """The compressed body is not byte-identical, so a strong ETag becomes weak"""
+    return value if value.startswith('W/') else f'W/{value}'
+
+
+def init_app(app):
+    """Wrap the application's WSGI callable with the compression middleware"""
+    app.config.setdefault('COMPRESS_ENABLED', os.environ.get('COMPRESS_ENABLED', '1') == '1')
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.environ.get('COMPRESS_MIN_SIZE', 1024)))
+    app.config.setdefault('COMPRESS_GZIP_LEVEL', int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)))
+    app.config.setdefault('COMPRESS_BROTLI_LEVEL', int(os.environ.get('COMPRESS_BROTLI_LEVEL', 4)))
+    app.config.setdefault('COMPRESS_STREAM_FLUSH_BYTES', 8192)
+    if not app.config['COMPRESS_ENABLED']:
+        return
+    app.wsgi_app = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=app.config['COMPRESS_MIN_SIZE'],
+        gzip_level=app.config['COMPRESS_GZIP_LEVEL'],
+        brotli_level=app.config['COMPRESS_BROTLI_LEVEL'],
+        stream_flush_bytes=app.config['COMPRESS_STREAM_FLUSH_BYTES'],
+    )
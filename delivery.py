@@ -0,0 +1,78 @@
+"""Static file and product image delivery.
+
+``FILE_DELIVERY`` picks who moves the bytes of ``/static/...`` (which
+includes the product images in ``static/uploads``):
+
+- ``sendfile`` (default): Flask's ``send_file``. Gunicorn passes the open
+  file to the kernel's ``sendfile`` and Range / conditional requests are
+  answered, but a worker is busy for the whole download.
+- ``x-accel-redirect``: nginx. The app only checks the file exists and
+  answers with an empty response carrying ``X-Accel-Redirect:
+  <X_ACCEL_REDIRECT_PREFIX><path>``; an ``internal`` nginx location serves it.
+- ``x-sendfile``: Apache ``mod_xsendfile`` / lighttpd, via Flask's
+  ``USE_X_SENDFILE``.
+
+Better still, let the proxy serve ``/static/`` directly so these requests
+never reach Python (see PRODUCTION.md). ``upload_url`` builds image URLs and
+can point them at a CDN with ``UPLOAD_URL``.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, abort, current_app, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+MODES = ('sendfile', 'x-accel-redirect', 'x-sendfile')
+
+
+def _max_age(filename):
+    # Uploaded image names are unique per upload, so they never change in place
+    if filename.startswith('uploads/'):
+        return current_app.config['UPLOAD_MAX_AGE']
+    return current_app.get_send_file_max_age(filename)
+
+
+def send_path(directory, filename, internal_prefix, max_age=None):
+    """Deliver ``directory/filename`` in the configured ``FILE_DELIVERY`` mode"""
+    if current_app.config['FILE_DELIVERY'] != 'x-accel-redirect':
+        return send_from_directory(directory, filename, max_age=max_age)
+
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = internal_prefix + quote(filename)
+    if max_age is not None:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    return response
+
+
+def send_static(filename):
+    """Replacement for Flask's ``static`` view"""
+    return send_path(current_app.static_folder, filename,
+                     current_app.config['X_ACCEL_REDIRECT_PREFIX'], _max_age(filename))
+
+
+def upload_url(filename):
+    """URL of an uploaded product image"""
+    base = current_app.config['UPLOAD_URL']
+    if base:
+        return base.rstrip('/') + '/' + quote(filename)
+    return url_for('static', filename='uploads/' + filename)
+
+
+def init_app(app):
+    """Configure file delivery for an application"""
+    app.config.setdefault('FILE_DELIVERY', os.environ.get('FILE_DELIVERY', 'sendfile'))
+    app.config.setdefault('X_ACCEL_REDIRECT_PREFIX', os.environ.get('X_ACCEL_REDIRECT_PREFIX', '/_protected/static/'))
+    app.config.setdefault('UPLOAD_URL', os.environ.get('UPLOAD_URL'))
+    app.config.setdefault('UPLOAD_MAX_AGE', 30 * 24 * 3600)
+    if app.config['FILE_DELIVERY'] not in MODES:
+        raise ValueError(f"FILE_DELIVERY must be one of {', '.join(MODES)}")
+    if app.config['FILE_DELIVERY'] == 'x-sendfile':
+        app.config['USE_X_SENDFILE'] = True
+    if 'static' in app.view_functions:
+        app.view_functions['static'] = send_static
+    app.add_template_global(upload_url)
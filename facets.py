@@ -0,0 +1,163 @@
+"""Faceted catalog browsing (``/browse``).
+
+Filter state lives in the query string (``?category=2&category=5&price=0-500
+&in_stock=1&sort=price_asc&page=2``). All facet counts come from one
+aggregate query: each facet value is a ``SUM(CASE WHEN ...)`` column over
+the active products. Counts are disjunctive: a value's count applies the
+filters of every *other* facet group, so ticking one category still shows
+how many products the other categories would add.
+
+The rendered results are cached with ``{% cache %}`` under the filter state
+and the catalog tag versions, so repeated browses cost no queries until the
+catalog changes.
+"""
+from sqlalchemy import and_, case, func, or_, select, true
+from sqlalchemy.orm import selectinload
+
+from models import Category, Product, SiteSettings, db
+from pricing import DEFAULT_GLOBAL_DISCOUNT, effective_discount_sql
+
+PAGE_SIZE = 24
+
+# Sort name -> ORDER BY on indexed columns (shared with the other listings)
+SORTS = {
+    'newest': (Product.created_at.desc(),),
+    'price_asc': (Product.effective_price.asc(), Product.id),
+    'price_desc': (Product.effective_price.desc(), Product.id),
+}
+
+# Price band key -> (label, lower bound, upper bound) on the effective price
+PRICE_BANDS = {
+    '0-500': ('Under ₹500', None, 500),
+    '500-1000': ('₹500 - ₹1,000', 500, 1000),
+    '1000-2000': ('₹1,000 - ₹2,000', 1000, 2000),
+    '2000-': ('Over ₹2,000', 2000, None),
+}
+
+# "Extra discount" means a product's own discount beats the store-wide one.
+# Percentages are compared rather than prices, which rounding could tip
+_GLOBAL_DISCOUNT = func.coalesce(
+    select(SiteSettings.global_discount_percent).order_by(SiteSettings.id).limit(1).scalar_subquery(),
+    DEFAULT_GLOBAL_DISCOUNT)
+
+# Yes/no filters: URL parameter -> (label, condition)
+FLAGS = {
+    'discounted': ('Extra discount', effective_discount_sql(_GLOBAL_DISCOUNT) > _GLOBAL_DISCOUNT),
+    'in_stock': ('In stock', or_(Product.stock.is_(None), Product.stock > 0)),
+    'featured': ('Featured', Product.featured == True),
+    'hot': ('Hot', Product.is_hot_product == True),
+}
+
+
+def _band_condition(key):
+    _, low, high = PRICE_BANDS[key]
+    conditions = []
+    if low is not None:
+        conditions.append(Product.effective_price >= low)
+    if high is not None:
+        conditions.append(Product.effective_price < high)
+    return and_(*conditions)
+
+
+class BrowseState:
+    """Normalised filter state parsed from, and written back to, the URL"""
+
+    def __init__(self, categories=(), prices=(), flags=(), sort='newest', page=1):
+        self.categories = tuple(sorted(set(categories)))
+        self.prices = tuple(sorted(set(p for p in prices if p in PRICE_BANDS)))
+        self.flags = tuple(sorted(set(f for f in flags if f in FLAGS)))
+        self.sort = sort if sort in SORTS else 'newest'
+        self.page = max(1, page)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            categories=args.getlist('category', type=int),
+            prices=args.getlist('price'),
+            flags=[name for name in FLAGS if args.get(name) == '1'],
+            sort=args.get('sort', 'newest'),
+            page=args.get('page', 1, type=int) or 1,
+        )
+
+    def key(self):
+        return (self.categories, self.prices, self.flags, self.sort, self.page)
+
+    def params(self):
+        params = {}
+        if self.categories:
+            params['category'] = list(self.categories)
+        if self.prices:
+            params['price'] = list(self.prices)
+        for name in self.flags:
+            params[name] = '1'
+        if self.sort != 'newest':
+            params['sort'] = self.sort
+        if self.page > 1:
+            params['page'] = self.page
+        return params
+
+    def toggled(self, group, value):
+        """State with one facet value switched on or off (back on page 1)"""
+        categories, prices, flags = set(self.categories), set(self.prices), set(self.flags)
+        selected = {'category': categories, 'price': prices, 'flag': flags}[group]
+        selected.symmetric_difference_update({value})
+        return BrowseState(categories, prices, flags, self.sort)
+
+    def with_page(self, page):
+        return BrowseState(self.categories, self.prices, self.flags, self.sort, page)
+
+    def group_conditions(self):
+        """{group: condition} for every facet group with a selection"""
+        groups = {}
+        if self.categories:
+            groups['category'] = Product.category_id.in_(self.categories)
+        if self.prices:
+            groups['price'] = or_(*[_band_condition(key) for key in self.prices])
+        for name in self.flags:
+            groups[name] = FLAGS[name][1]
+        return groups
+
+
+def _count(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def facet_counts(state, categories):
+    """Total matches and every facet value's count, in one aggregate query"""
+    groups = state.group_conditions()
+
+    def others(group):
+        return [condition for name, condition in groups.items() if name != group]
+
+    columns = [_count(and_(*groups.values()) if groups else true()).label('total')]
+    for category_id, _ in categories:
+        columns.append(_count(and_(Product.category_id == category_id, *others('category'))).label(f'c{category_id}'))
+    for key in PRICE_BANDS:
+        columns.append(_count(and_(_band_condition(key), *others('price'))).label(f'p{key}'))
+    for name, (_, condition) in FLAGS.items():
+        columns.append(_count(and_(condition, *others(name))).label(f'f{name}'))
+
+    row = db.session.execute(select(*columns).where(Product.active == True)).one()._mapping
+    return {
+        'total': row['total'],
+        'categories': {category_id: row[f'c{category_id}'] for category_id, _ in categories},
+        'prices': {key: row[f'p{key}'] for key in PRICE_BANDS},
+        'flags': {name: row[f'f{name}'] for name in FLAGS},
+    }
+
+
+def browse(state):
+    """Facet counts and the requested page of matching products"""
+    categories = db.session.execute(
+        select(Category.id, Category.name).where(Category.is_active == True).order_by(Category.name)
+    ).all()
+    counts = facet_counts(state, categories)
+    pages = max(1, -(-counts['total'] // PAGE_SIZE))
+    products = (Product.query
+                .filter(Product.active == True, *state.group_conditions().values())
+                .order_by(*SORTS[state.sort])
+                .options(selectinload(Product.images))
+                .offset((state.page - 1) * PAGE_SIZE)
+                .limit(PAGE_SIZE)
+                .all())
+    return {'categories': categories, 'counts': counts, 'products': products, 'pages': pages}
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, TextAreaField, FloatField, IntegerField, BooleanField, SelectField, PasswordField, HiddenField
 from wtforms.validators import DataRequired, Length, Email, NumberRange, Optional
 from wtforms.widgets import TextArea
@@ -71,4 +71,12 @@ class CategoryForm(FlaskForm):
 
 
 class AdminPageForm(FlaskForm):
-    content = TextAreaField('Content', widget=TextArea(), validators=[DataRequired()])
\ No newline at end of file
+    content = TextAreaField('Content', widget=TextArea(), validators=[DataRequired()])
+
+
+class ProductImportForm(FlaskForm):
+    data_file = FileField('Catalog File (CSV or JSONL)', validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'jsonl', 'ndjson', 'json'], 'CSV or JSONL files only')
+    ])
+    images_zip = FileField('Images (ZIP, optional)', validators=[FileAllowed(['zip'], 'ZIP archives only')])
\ No newline at end of file
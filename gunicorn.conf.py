@@ -0,0 +1,101 @@
+"""Gunicorn configuration for Baign Mart.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden from the environment (see PRODUCTION.md).
+Reloading: ``kill -HUP $(cat gunicorn.pid)`` starts fresh workers from the
+preloaded application and retires the old ones after their in-flight
+requests finish. Deploying new code needs a binary upgrade instead:
+``kill -USR2`` (start a new master), then ``kill -WINCH`` and ``kill -QUIT``
+the old master.
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+
+def _int_env(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+# Worker sizing: sync-style request handling is I/O bound on SQLite and
+# outbound notifications, so use a few threads per process
+workers = _int_env('WEB_CONCURRENCY', cpu_count * 2 + 1)
+threads = _int_env('GUNICORN_THREADS', 2)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Import the app once in the master; workers share it copy-on-write
+preload_app = True
+
+# Recycle workers to bound memory growth; jitter avoids restarting all at once
+max_requests = _int_env('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _int_env('GUNICORN_MAX_REQUESTS_JITTER', 100)
+max_worker_rss_mb = _int_env('GUNICORN_MAX_WORKER_RSS_MB', 512)
+
+timeout = _int_env('GUNICORN_TIMEOUT', 120)
+graceful_timeout = _int_env('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _int_env('GUNICORN_KEEPALIVE', 5)
+
+# Workers write their metrics to files here and /metrics merges them; set
+# before the preloaded app imports prometheus_client
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'baign_mart_metrics'))
+os.makedirs(metrics_dir, exist_ok=True)
+
+pidfile = os.environ.get('GUNICORN_PIDFILE', 'gunicorn.pid')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux), or None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with children
+    from wsgi import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_request(worker, req, environ, resp):
+    # Gracefully retire a worker whose memory has grown past the limit
+    if not max_worker_rss_mb:
+        return
+    rss = current_rss_mb()
+    if rss is not None and rss > max_worker_rss_mb:
+        worker.log.info("Worker %s RSS %.0f MB exceeds %s MB, recycling", worker.pid, rss, max_worker_rss_mb)
+        worker.alive = False
+
+
+def when_ready(server):
+    server.log.info("Baign Mart ready: %s workers x %s threads (%s)", workers, threads, worker_class)
+
+
+def on_starting(server):
+    # Samples left by a previous run would be merged into the new counters
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (connections in use, queued tasks)
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,99 @@
+"""HyperLogLog cardinality sketches.
+
+A sketch estimates the number of distinct items added to it in a fixed
+``2 ** precision`` bytes, whatever the number of items. Sketches with the
+same precision merge losslessly (register-wise max), so per-worker and
+per-day sketches can be combined into any date range. The relative standard
+error is ``1.04 / sqrt(2 ** precision)``: about 1.6% at the default
+precision of 12 (4 KB per sketch, a few bytes when nearly empty and
+compressed).
+"""
+import hashlib
+import math
+import zlib
+
+DEFAULT_PRECISION = 12
+_FORMAT_VERSION = 1
+
+
+def hash64(value):
+    """Stable 64-bit hash of a string (the same in every process)"""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Mergeable distinct-count estimator"""
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError('register count does not match precision')
+
+    @property
+    def relative_error(self):
+        """Relative standard error of :meth:`count`"""
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value):
+        """Add an item; return True if the sketch changed"""
+        h = hash64(value)
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Fold another sketch into this one (union of the counted sets)"""
+        if other.precision != self.precision:
+            raise ValueError('cannot merge sketches with different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimated number of distinct items added"""
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Small cardinalities: linear counting is more accurate. A 64-bit hash
+        # needs no large-range correction.
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def is_empty(self):
+        return not any(self.registers)
+
+    def to_bytes(self):
+        """Compact serialised form (version, precision, compressed registers)"""
+        return bytes((_FORMAT_VERSION, self.precision)) + zlib.compress(bytes(self.registers), 1)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data or data[0] != _FORMAT_VERSION:
+            raise ValueError('unsupported sketch format')
+        return cls(precision=data[1], registers=zlib.decompress(data[2:]))
+
+    @classmethod
+    def union(cls, sketches, precision=DEFAULT_PRECISION):
+        """Merge sketches into a new one"""
+        sketches = list(sketches)
+        registers = [sketch.registers for sketch in sketches]
+        if any(sketch.precision != precision for sketch in sketches):
+            raise ValueError('cannot merge sketches with different precision')
+        if not registers:
+            return cls(precision)
+        # One pass over all sketches instead of one per pair
+        return cls(precision, bytearray(map(max, *registers)) if len(registers) > 1 else registers[0])
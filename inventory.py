@@ -0,0 +1,223 @@
+"""Stock reservations and oversell-safe decrements.
+
+``Product.stock`` is the number of units still available (``None`` means
+stock is not tracked). Every change to it is a single conditional UPDATE:
+
+    UPDATE products SET stock = stock - :q WHERE id = :id AND stock >= :q
+
+so two buyers can never both take the last unit, and no table lock is held
+beyond the statement itself. These updates bump only the ``stock`` cache
+tag, so reserving a cart does not rebuild the catalog snapshot or drop the
+query cache; code that checks stock reads it from the database.
+
+Opening the checkout page reserves the cart (takes the units from stock and
+records a ``StockReservation`` that expires after
+``STOCK_RESERVATION_MINUTES``). Placing the order converts the reservations
+inside the lead's transaction, taking any shortfall with the same
+conditional UPDATE; if a line cannot be covered the whole order is rolled
+back. Expired reservations are returned to stock by ``release_expired``.
+Each worker schedules it in the background at most every
+``STOCK_SWEEP_SECONDS`` when a shopper opens a product page, adds to the
+cart or opens checkout, and the ``release-reservations`` command runs it on
+demand. Adding to the cart also releases the product's expired holds on the
+spot before refusing for lack of stock, so an abandoned checkout never
+blocks the next shopper.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, session
+from sqlalchemy import delete, select, update
+
+from models import Product, StockReservation, db
+import tasks
+
+# Cache tag bumped by stock movements (not 'products'; see the module docstring)
+STOCK_TAG = 'stock'
+
+
+class InsufficientStock(Exception):
+    """A cart line asks for more units than are available"""
+
+    def __init__(self, product_id, requested, available):
+        super().__init__(f"Only {available} of product {product_id} available, {requested} requested")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def reservation_token():
+    """Identifier of the current visitor's reservations (kept in the session)"""
+    token = session.get('reservation_token')
+    if not token:
+        token = session['reservation_token'] = secrets.token_urlsafe(16)
+    return token
+
+
+def _cart_quantities(cart_items):
+    quantities = {}
+    for item in cart_items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return quantities
+
+
+def _tracked(product_ids):
+    """Ids among ``product_ids`` whose stock is tracked"""
+    if not product_ids:
+        return set()
+    return set(db.session.scalars(
+        select(Product.id).where(Product.id.in_(product_ids), Product.stock.isnot(None))
+    ))
+
+
+def take_stock(product_id, quantity):
+    """Atomically take ``quantity`` units; raise InsufficientStock if not available"""
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock.isnot(None), Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .execution_options(synchronize_session=False, cache_tags=(STOCK_TAG,))
+    )
+    if result.rowcount != 1:
+        available = db.session.scalar(select(Product.stock).where(Product.id == product_id)) or 0
+        raise InsufficientStock(product_id, quantity, available)
+
+
+def return_stock(product_id, quantity):
+    db.session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock.isnot(None))
+        .values(stock=Product.stock + quantity)
+        .execution_options(synchronize_session=False, cache_tags=(STOCK_TAG,))
+    )
+
+
+def _claim_reservations(token):
+    """Delete the token's reservations; return {product_id: units} actually held
+
+    A reservation removed concurrently by the sweeper has already been
+    returned to stock, so only rows this transaction deletes count.
+    """
+    held = {}
+    for reservation_id, product_id, quantity in db.session.execute(
+        select(StockReservation.id, StockReservation.product_id, StockReservation.quantity).filter_by(token=token)
+    ).all():
+        deleted = db.session.execute(delete(StockReservation).where(StockReservation.id == reservation_id))
+        if deleted.rowcount:
+            held[product_id] = held.get(product_id, 0) + quantity
+    return held
+
+
+def _settle(token, cart_items):
+    """Move stock so exactly the cart's tracked units are taken; return them
+
+    Releases the token's reservations and takes or returns only the
+    difference, in ascending product order so concurrent carts touch rows
+    in the same order.
+    """
+    wanted = _cart_quantities(cart_items)
+    tracked = _tracked(list(wanted))
+    held = _claim_reservations(token)
+    taken = {}
+    for product_id in sorted(set(held) | tracked):
+        quantity = wanted.get(product_id, 0) if product_id in tracked else 0
+        difference = quantity - held.get(product_id, 0)
+        if difference > 0:
+            take_stock(product_id, difference)
+        elif difference < 0:
+            return_stock(product_id, -difference)
+        if quantity:
+            taken[product_id] = quantity
+    return taken
+
+
+def reserve_cart(token, cart_items, now=None):
+    """Hold the cart's tracked units for this token (caller commits)
+
+    Re-reserving adjusts the held quantities and extends the expiry. Raises
+    InsufficientStock, leaving the session to be rolled back, if a line
+    cannot be held.
+    """
+    now = now or datetime.utcnow()
+    expires_at = now + timedelta(minutes=current_app.config['STOCK_RESERVATION_MINUTES'])
+    for product_id, quantity in _settle(token, cart_items).items():
+        db.session.add(StockReservation(token=token, product_id=product_id,
+                                        quantity=quantity, expires_at=expires_at))
+    maybe_sweep()
+
+
+def available_stock(product_id, quantity):
+    """Units of the product available (None if untracked) for a request of ``quantity``
+
+    If fewer than ``quantity`` are left, the product's expired reservations
+    are returned to stock first (and committed) instead of waiting for the
+    sweeper.
+    """
+    stock = db.session.scalar(select(Product.stock).where(Product.id == product_id))
+    if stock is not None and stock < quantity and release_expired(product_id=product_id):
+        stock = db.session.scalar(select(Product.stock).where(Product.id == product_id))
+    return stock
+
+
+def commit_cart(token, cart_items):
+    """Turn the token's reservations into a sale, in the caller's transaction
+
+    Lines without a (still valid) reservation are taken directly from stock.
+    Raises InsufficientStock if any line cannot be covered; the caller must
+    then roll back so nothing is sold.
+    """
+    _settle(token, cart_items)
+
+
+def release_expired(now=None, batch_size=500, product_id=None):
+    """Return expired reservations (of one product, if given) to stock; returns how many were released"""
+    now = now or datetime.utcnow()
+    released = 0
+    query = select(StockReservation.id, StockReservation.product_id, StockReservation.quantity) \
+        .where(StockReservation.expires_at < now)
+    if product_id is not None:
+        query = query.where(StockReservation.product_id == product_id)
+    while True:
+        expired = db.session.execute(query.limit(batch_size)).all()
+        if not expired:
+            break
+        for reservation_id, product_id, quantity in expired:
+            deleted = db.session.execute(delete(StockReservation).where(
+                StockReservation.id == reservation_id, StockReservation.expires_at < now))
+            if deleted.rowcount:
+                return_stock(product_id, quantity)
+                released += 1
+        db.session.commit()
+    return released
+
+
+def _sweep(app):
+    with app.app_context():
+        try:
+            release_expired()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+def maybe_sweep():
+    """Schedule a background sweep if this worker has not run one recently"""
+    global _last_sweep
+    with _sweep_lock:
+        if time.monotonic() - _last_sweep < current_app.config['STOCK_SWEEP_SECONDS']:
+            return
+        _last_sweep = time.monotonic()
+    tasks.enqueue(_sweep, current_app._get_current_object())
+
+
+def init_app(app):
+    app.config.setdefault('STOCK_RESERVATION_MINUTES', 15)
+    app.config.setdefault('STOCK_SWEEP_SECONDS', 60)
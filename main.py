@@ -1,14 +1,18 @@
 import os
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, g, abort
 from flask import jsonify
-from models import Product, Lead, Visitor, SiteSettings, ProductImage, Category, db
+from models import Product, Lead, SiteSettings, ProductImage, Category, db
+from sqlalchemy import select, update
+import queries
+import catalog
+import visitors
+import related
+import trending
+import facets
+import inventory
+import metrics
 from forms import LeadForm
 from werkzeug.utils import secure_filename
-import hashlib
-import requests
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import json
 from datetime import datetime
 import re
@@ -16,29 +20,19 @@ import re
 bp = Blueprint('main', __name__)
 
 # Helper functions
-def get_or_create_visitor():
-    """Get or create visitor record based on IP hash"""
-    ip_address = request.remote_addr
-    ip_hash = hashlib.sha256(ip_address.encode()).hexdigest()
-    
-    visitor = Visitor.query.filter_by(ip_hash=ip_hash).first()
-    if not visitor:
-        visitor = Visitor(ip_hash=ip_hash)
-        db.session.add(visitor)
-    else:
-        visitor.views_count += 1
-        visitor.last_seen = datetime.utcnow()
-    
-    db.session.commit()
-    return visitor
+def track_visitor(product_id=None):
+    """Count this visitor in today's unique-visitor sketches"""
+    if g.get('skip_tracking'):
+        return  # Known crawlers are not tracked
+    visitors.record_visit(visitors.visitor_key(request.remote_addr), product_id=product_id)
 
 def get_site_settings():
-    """Get site settings, create default if not exists"""
-    settings = SiteSettings.query.first()
-    if not settings:
-        settings = SiteSettings()
-        db.session.add(settings)
+    """Get site settings (a cached read-only record), create default if not exists"""
+    settings = queries.site_settings()
+    if settings is None:
+        db.session.add(SiteSettings())
         db.session.commit()
+        settings = queries.site_settings()
     return settings
 
 def calculate_discounted_price(original_price, discount_percent):
@@ -68,9 +62,13 @@ def notify_admin_via_telegram(message_text):
     
     if not bot_token or not chat_id:
         print("Telegram credentials not set in site settings")
+        metrics.notification('telegram', 'not_configured')
         return False
     
     try:
+        # Imported on first use: only checkout notifications need an HTTP client
+        import requests
+        
         url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
         payload = {
             'chat_id': chat_id,
@@ -78,9 +76,12 @@ def notify_admin_via_telegram(message_text):
             'parse_mode': 'HTML'
         }
         response = requests.post(url, json=payload)
-        return response.status_code == 200
+        sent = response.status_code == 200
+        metrics.notification('telegram', 'sent' if sent else 'failed')
+        return sent
     except Exception as e:
         print(f"Error sending Telegram notification: {e}")
+        metrics.notification('telegram', 'failed')
         return False
 
 def send_admin_email(subject, body):
@@ -94,9 +95,15 @@ def send_admin_email(subject, body):
     
     if not all([smtp_host, smtp_port, smtp_user, smtp_pass]):
         print("SMTP credentials not set in environment variables")
+        metrics.notification('email', 'not_configured')
         return False
     
     try:
+        # Imported on first use to keep worker start-up lean
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        
         msg = MIMEMultipart()
         msg['From'] = smtp_user
         msg['To'] = admin_email
@@ -111,53 +118,73 @@ def send_admin_email(subject, body):
         text = msg.as_string()
         server.sendmail(smtp_user, admin_email, text)
         server.quit()
+        metrics.notification('email', 'sent')
         return True
     except Exception as e:
         print(f"Error sending email: {e}")
+        metrics.notification('email', 'failed')
         return False
 
+@bp.app_context_processor
+def inject_nav_categories():
+    """Categories for the header dropdown, loaded only when the cached fragment is rebuilt"""
+    def nav_categories():
+        return catalog.current().categories
+    return {'nav_categories': nav_categories}
+
 # Routes
 @bp.route('/')
 def index():
-    get_or_create_visitor()  # Track visitor
+    track_visitor()
     settings = get_site_settings()
     
-    # Get active products, ordered by newest first
-    products = Product.query.filter_by(active=True).order_by(Product.created_at.desc()).all()
+    # Active products from the catalog snapshot, newest first unless another
+    # sort or a price range is requested; discounted prices are precomputed
+    products, listing = catalog.current().listing(request.args)
     
-    # Get hot products to display prominently
-    hot_products = Product.query.filter_by(active=True, is_hot_product=True).limit(4).all()
-    
-    # Calculate discounted prices for each product
-    for product in products:
-        product.discounted_price = product.get_discounted_price(settings.global_discount_percent)
-    
-    for product in hot_products:
-        product.discounted_price = product.get_discounted_price(settings.global_discount_percent)
+    # Pinned hot products, then the currently trending ones
+    hot_products = trending.hot_products(limit=4)
     
     return render_template('public/index.html', 
                          products=products, 
                          hot_products=hot_products,
-                         settings=settings)
+                         settings=settings,
+                         listing=listing)
 
 @bp.route('/product/<int:product_id>')
 def product_detail(product_id):
-    get_or_create_visitor()  # Track visitor
+    track_visitor(product_id)
     settings = get_site_settings()
     
-    product = Product.query.get_or_404(product_id)
-    if not product.active:
+    product = catalog.current().products.get(product_id)
+    if product is None:
+        # Not in the snapshot: inactive or missing
+        if queries.product(product_id) is None:
+            abort(404)
         flash('Product not found', 'error')
         return redirect(url_for('main.index'))
     
-    # Increment product view count
-    product.views += 1
-    db.session.commit()
+    # Increment product view count (not for crawlers); the counter update
+    # skips cache invalidation, so the snapshot's count may lag behind. Stock
+    # moves without invalidating the snapshot either: read both from the row
+    if not g.get('skip_tracking'):
+        views, stock = db.session.execute(
+            update(Product).where(Product.id == product.id)
+            .values(views=Product.views + 1).returning(Product.views, Product.stock)
+            .execution_options(skip_cache_invalidation=True)
+        ).one()
+        db.session.commit()
+        trending.record(product.id, 'view')
+    else:
+        views = product.views
+        stock = db.session.scalar(select(Product.stock).where(Product.id == product.id))
+    inventory.maybe_sweep()
     
-    # Calculate discounted price
-    product.discounted_price = product.get_discounted_price(settings.global_discount_percent)
+    # Precomputed by related.py; one lookup on the (product_id, rank) key
+    related_products = related.related_products(product.id)
     
-    return render_template('public/product_detail.html', product=product, settings=settings)
+    return render_template('public/product_detail.html', product=product, settings=settings,
+                           related_products=related_products, views=views, stock=stock)
 
 @bp.route('/cart')
 def cart():
@@ -169,7 +196,7 @@ def cart():
     subtotal = 0
     
     for item in cart_items:
-        product = Product.query.get(item['product_id'])
+        product = queries.product(item['product_id'])
         if product:
             discounted_price = product.get_discounted_price(settings.global_discount_percent)
             line_total = discounted_price * item['quantity']
@@ -197,19 +224,27 @@ def add_to_cart():
         return redirect(request.referrer or url_for('main.index'))
     
     # Check if product exists and is active
-    product = Product.query.filter_by(id=product_id, active=True).first()
-    if not product:
+    product = queries.product(product_id)
+    if not product or not product.active:
         flash('Product not available', 'error')
         return redirect(request.referrer or url_for('main.index'))
     
-    # Check stock if stock tracking is enabled
-    if product.stock is not None and quantity > product.stock:
-        flash(f'Only {product.stock} items available in stock', 'error')
+    # Check stock if stock tracking is enabled (cached records do not follow
+    # stock changes); expired holds on the product are released first
+    inventory.maybe_sweep()
+    stock = inventory.available_stock(product_id, quantity)
+    if stock is not None and quantity > stock:
+        flash(f'Only {stock} items available in stock', 'error')
         return redirect(request.referrer or url_for('main.index'))
     
     # Increment add_to_cart_count
-    product.add_to_cart_count += quantity
+    db.session.execute(
+        update(Product).where(Product.id == product_id)
+        .values(add_to_cart_count=Product.add_to_cart_count + quantity)
+        .execution_options(skip_cache_invalidation=True)
+    )
     db.session.commit()
+    trending.record(product.id, 'cart', quantity)
     
     # Add to cart session
     cart = session.get('cart', [])
@@ -244,6 +279,12 @@ def remove_from_cart():
     
     return redirect(url_for('main.cart'))
 
+def _out_of_stock(error):
+    product = queries.product(error.product_id)
+    title = product.title if product else 'an item in your cart'
+    flash(f'Only {error.available} of {title} left in stock', 'error')
+    return redirect(url_for('main.cart'))
+
 @bp.route('/checkout', methods=['GET', 'POST'])
 def checkout():
     cart_items = session.get('cart', [])
@@ -258,7 +299,7 @@ def checkout():
     subtotal = 0
     
     for item in cart_items:
-        product = Product.query.get(item['product_id'])
+        product = queries.product(item['product_id'])
         if product:
             discounted_price = product.get_discounted_price(settings.global_discount_percent)
             line_total = discounted_price * item['quantity']
@@ -272,10 +313,20 @@ def checkout():
             subtotal += line_total
     
     form = LeadForm()
+    if request.method == 'GET':
+        # Hold the cart's units while the customer fills in the form
+        try:
+            inventory.reserve_cart(inventory.reservation_token(), cart_items)
+            db.session.commit()
+        except inventory.InsufficientStock as e:
+            db.session.rollback()
+            return _out_of_stock(e)
+    
     if form.validate_on_submit():
         # Validate phone number
         if not validate_phone_number(form.phone_number.data):
             flash('Phone number must be 10-15 digits', 'error')
+            metrics.checkout('invalid')
             return render_template('public/checkout.html', form=form, 
                                  products_in_cart=products_in_cart, 
                                  subtotal=subtotal, 
@@ -284,6 +335,7 @@ def checkout():
         # Validate telegram username if provided
         if form.telegram_username.data and not validate_telegram_username(form.telegram_username.data):
             flash('Invalid Telegram username format', 'error')
+            metrics.checkout('invalid')
             return render_template('public/checkout.html', form=form, 
                                  products_in_cart=products_in_cart, 
                                  subtotal=subtotal, 
@@ -306,13 +358,26 @@ def checkout():
         )
         
         db.session.add(lead)
+        # Take the stock in the same transaction; nothing is sold if any line falls short
+        try:
+            inventory.commit_cart(inventory.reservation_token(), cart_items)
+        except inventory.InsufficientStock as e:
+            db.session.rollback()
+            metrics.checkout('out_of_stock')
+            return _out_of_stock(e)
         db.session.commit()
+        metrics.checkout('placed')
+        
+        # Update co-purchase counts and related products off the request
+        related.record_lead(current_app._get_current_object(), cart_items)
+        for item in cart_items:
+            trending.record(item['product_id'], 'order', item['quantity'])
         
         # Prepare notification message for Telegram
         product_titles = []
         product_ids = []
         for item in cart_items:
-            product = Product.query.get(item['product_id'])
+            product = queries.product(item['product_id'])
             if product:
                 product_titles.append(f"{product.title} (x{item['quantity']})")
                 product_ids.append(str(product.id))
@@ -371,6 +436,8 @@ def checkout():
         
         return render_template('public/checkout_success.html', settings=settings, order_id=lead.order_id)
     
+    if request.method == 'POST':
+        metrics.checkout('invalid')
     return render_template('public/checkout.html', form=form, 
                          products_in_cart=products_in_cart, 
                          subtotal=subtotal, 
@@ -399,7 +466,7 @@ def my_orders():
             product_id = item.get('product_id')
             quantity = item.get('quantity', 1)
             if product_id:
-                product = Product.query.get(product_id)
+                product = queries.product(product_id)
                 if product:
                     order.processed_products.append({
                         'product': product,
@@ -447,7 +514,7 @@ def order_lookup():
                 product_id = item.get('product_id')
                 quantity = item.get('quantity', 1)
                 if product_id:
-                    product = Product.query.get(product_id)
+                    product = queries.product(product_id)
                     if product:
                         order.processed_products.append({
                             'product': product,
@@ -534,32 +601,56 @@ def update_cart_quantity():
 
 @bp.route('/category/<int:category_id>')
 def category_products(category_id):
-    get_or_create_visitor()  # Track visitor
+    track_visitor()
     settings = get_site_settings()
     
-    category = Category.query.get_or_404(category_id)
+    snapshot = catalog.current()
+    category = snapshot.category_by_id.get(category_id)
+    if category is None:
+        abort(404)
     
-    # Get active products in this category, ordered by newest first
-    products = Product.query.filter_by(category_id=category_id, active=True).order_by(Product.created_at.desc()).all()
+    # Active products in this category, newest first unless another sort or a price range is requested
+    products, listing = snapshot.listing(request.args, category_id=category_id)
     
-    # Calculate discounted prices for each product
-    for product in products:
-        product.discounted_price = product.get_discounted_price(settings.global_discount_percent)
+    # Top trending products in this category (pinned hot ones first)
+    hot_products = trending.hot_products(limit=4, category_id=category_id)
     
     return render_template('public/index.html', 
                          products=products, 
+                         hot_products=hot_products,
                          settings=settings, 
-                         selected_category=category)
+                         selected_category=category,
+                         listing=listing)
+
+
+@bp.route('/browse')
+def browse():
+    track_visitor()
+    settings = get_site_settings()
+    state = facets.BrowseState.from_args(request.args)
+    
+    # Called from inside a {% cache %} block keyed by the filter state and
+    # catalog version, so a cache hit runs no queries
+    def browse_results():
+        return facets.browse(state)
+    
+    return render_template('public/browse.html',
+                         state=state,
+                         browse_results=browse_results,
+                         price_bands=facets.PRICE_BANDS,
+                         flags=facets.FLAGS,
+                         settings=settings)
 
 
 @bp.route('/categories')
 def all_categories():
-    get_or_create_visitor()  # Track visitor
+    track_visitor()
     settings = get_site_settings()
     
-    # Get all active categories
-    categories = Category.query.filter_by(is_active=True).all()
+    # Active categories and their active product counts
+    snapshot = catalog.current()
     
     return render_template('public/categories.html', 
-                         categories=categories, 
+                         categories=snapshot.categories, 
+                         product_counts=snapshot.category_counts,
                          settings=settings)
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""Prometheus metrics, exposed on ``/metrics``.
+
+Collected per worker process:
+
+- request counts by endpoint, method and status, and latency histograms
+  by endpoint
+- database queries and query time per bind (SQLite busy waits show up as
+  query time), "database is locked" errors, pool checkouts, time spent
+  getting a connection and connections in use
+- fragment / query / report cache hits, misses and stale answers
+- checkout outcomes, admin notification outcomes and the background task
+  queue (depth and failures)
+
+Under gunicorn every worker writes its samples to files in
+``PROMETHEUS_MULTIPROC_DIR`` (``gunicorn.conf.py`` sets it up) and the
+endpoint merges them, so a scrape sees the whole host whichever worker
+answers it. Scrapers authenticate with ``Authorization: Bearer
+<METRICS_TOKEN>``; a logged-in admin can open the page too.
+
+``prometheus_client`` is optional: without it the counters are no-ops and
+``/metrics`` answers 503.
+"""
+import hmac
+import os
+import time
+
+from flask import Response, current_app, g, request, session
+from sqlalchemy import event
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+
+PREFIX = 'baign_mart_'
+
+
+class _NullMetric:
+    """Stand-in when prometheus_client is not installed"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+if prometheus_client is None:
+    Counter = Histogram = Gauge = _NullMetric
+
+# Every metric has labels, so nothing is written until a worker records a
+# sample (the preloading gunicorn master creates no files of its own)
+REQUESTS = Counter(f'{PREFIX}http_requests_total', 'HTTP requests', ['endpoint', 'method', 'status'])
+REQUEST_LATENCY = Histogram(f'{PREFIX}http_request_duration_seconds', 'Time to produce a response',
+                            ['endpoint'], buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+QUERIES = Counter(f'{PREFIX}db_queries_total', 'SQL statements executed', ['bind'])
+QUERY_LATENCY = Histogram(f'{PREFIX}db_query_duration_seconds', 'SQL statement execution time', ['bind'],
+                          buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5))
+DB_LOCKED = Counter(f'{PREFIX}db_locked_errors_total', '"database is locked" errors', ['bind'])
+POOL_CHECKOUTS = Counter(f'{PREFIX}db_pool_checkouts_total', 'Connections taken from the pool', ['bind'])
+POOL_WAIT = Histogram(f'{PREFIX}db_pool_wait_seconds', 'Time to get a pooled connection', ['bind'],
+                      buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+POOL_IN_USE = Gauge(f'{PREFIX}db_pool_connections_in_use', 'Connections checked out', ['bind'],
+                    multiprocess_mode='livesum')
+CACHE_LOOKUPS = Counter(f'{PREFIX}cache_lookups_total', 'Cache lookups', ['cache', 'result'])
+CHECKOUTS = Counter(f'{PREFIX}checkouts_total', 'Checkout form submissions by outcome', ['outcome'])
+NOTIFICATIONS = Counter(f'{PREFIX}notifications_total', 'Admin notifications by channel and outcome',
+                        ['channel', 'outcome'])
+TASKS_QUEUED = Gauge(f'{PREFIX}background_tasks_queued', 'Background tasks waiting or running', ['queue'],
+                     multiprocess_mode='livesum')
+TASK_FAILURES = Counter(f'{PREFIX}background_task_failures_total', 'Background tasks that raised', ['task'])
+
+
+def cache_lookup(cache, result):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def checkout(outcome):
+    CHECKOUTS.labels(outcome).inc()
+
+
+def notification(channel, outcome):
+    NOTIFICATIONS.labels(channel, outcome).inc()
+
+
+# ---------------------------------------------------------------------------
+# Requests
+# ---------------------------------------------------------------------------
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    return response
+
+
+# ---------------------------------------------------------------------------
+# Database
+# ---------------------------------------------------------------------------
+
+def _instrument_engine(engine, bind):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        QUERIES.labels(bind).inc()
+        QUERY_LATENCY.labels(bind).observe(time.perf_counter() - conn.info['metrics_started'].pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def on_error(context):
+        started = context.connection.info.get('metrics_started') if context.connection is not None else None
+        if started:
+            started.pop()
+        if 'database is locked' in str(context.original_exception):
+            DB_LOCKED.labels(bind).inc()
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.labels(bind).inc()
+        POOL_IN_USE.labels(bind).inc()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        POOL_IN_USE.labels(bind).dec()
+
+    # Pool events have no "waiting" hook, so time the whole acquisition
+    # (queue wait plus any new connection) around Engine.raw_connection,
+    # which survives the pool being recreated by dispose()
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            POOL_WAIT.labels(bind).observe(time.perf_counter() - started)
+
+    engine.raw_connection = timed_raw_connection
+
+
+# ---------------------------------------------------------------------------
+# Exposition
+# ---------------------------------------------------------------------------
+
+def _authorized():
+    token = current_app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:].encode(), token.encode()):
+        return True
+    return bool(session.get('admin_logged_in'))
+
+
+def render():
+    """Prometheus text exposition of this host's metrics (all workers)"""
+    registry = prometheus_client.REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry)
+
+
+def metrics_view():
+    if not _authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+    if prometheus_client is None:
+        return Response('prometheus_client is not installed\n', status=503, mimetype='text/plain')
+    return Response(render(), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Collect metrics for an application and serve them on /metrics"""
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if prometheus_client is None:
+        return
+    from models import db
+    with app.app_context():
+        for key, engine in db.engines.items():
+            _instrument_engine(engine, key or 'primary')
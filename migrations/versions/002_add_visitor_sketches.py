@@ -0,0 +1,35 @@
+"""Add visitor_sketches table for HyperLogLog unique-visitor counts
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('visitor_sketches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('registers', sa.LargeBinary(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'product_id', name='uq_visitor_sketches_day_product')
+    )
+    op.create_index('ix_visitor_sketches_day', 'visitor_sketches', ['day'])
+
+
+def downgrade():
+    op.drop_index('ix_visitor_sketches_day', table_name='visitor_sketches')
+    op.drop_table('visitor_sketches')
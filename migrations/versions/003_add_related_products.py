@@ -0,0 +1,39 @@
+"""Add product_pairs and related_products tables
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_pairs',
+        sa.Column('product_a', sa.Integer(), nullable=False),
+        sa.Column('product_b', sa.Integer(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('product_a', 'product_b')
+    )
+    op.create_index('ix_product_pairs_product_b', 'product_pairs', ['product_b'])
+    op.create_table('related_products',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('related_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('product_id', 'rank')
+    )
+
+
+def downgrade():
+    op.drop_table('related_products')
+    op.drop_index('ix_product_pairs_product_b', table_name='product_pairs')
+    op.drop_table('product_pairs')
@@ -0,0 +1,32 @@
+"""Add product_trends table for time-decayed trending scores
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_trends',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('log_score', sa.Float(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index('ix_product_trends_log_score', 'product_trends', ['log_score'])
+
+
+def downgrade():
+    op.drop_index('ix_product_trends_log_score', table_name='product_trends')
+    op.drop_table('product_trends')
@@ -0,0 +1,39 @@
+"""Add indexed products.effective_price
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 13:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('effective_price', sa.Float(), nullable=True))
+        batch_op.create_index('ix_products_effective_price', ['effective_price'])
+
+    # Same rule and integer rounding as models.compute_effective_price
+    op.execute("""
+        UPDATE products SET effective_price = (
+            CAST(price_inr * 100 + 0.5 AS INTEGER) * MAX(0, 10000 - CAST((CASE
+                WHEN discount_override IS NOT NULL AND discount_override >= 0 THEN discount_override
+                WHEN per_product_discount IS NOT NULL AND per_product_discount >= 0 THEN per_product_discount
+                ELSE COALESCE((SELECT global_discount_percent FROM site_settings ORDER BY id LIMIT 1), 40.0)
+            END) * 100 + 0.5 AS INTEGER)) + 5000
+        ) / 10000 / 100.0
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_effective_price')
+        batch_op.drop_column('effective_price')
@@ -0,0 +1,23 @@
+"""Index leads.created_at for newest-first lists and date-range reports
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_leads_created_at', 'leads', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_leads_created_at', table_name='leads')
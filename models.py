@@ -2,8 +2,29 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import json
 
-# Initialize db instance globally
-db = SQLAlchemy()
+from replica import RoutingSession
+
+# Initialize db instance globally; reads may be routed to a replica (see replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def compute_effective_price(price_inr, discount_override, per_product_discount, global_discount_percent):
+    """Customer-facing price; pricing.effective_price_sql is the SQL twin
+
+    Rounds in integers (whole paise times hundredths of a percent, half up)
+    rather than with ``round()``, whose float rounding differs from SQL
+    ``ROUND``, so both store exactly the same value.
+    """
+    # Priority: discount_override (specific for this product) > per_product_discount > global_discount
+    if discount_override is not None and discount_override >= 0:
+        discount_percent = discount_override
+    elif per_product_discount is not None and per_product_discount >= 0:
+        discount_percent = per_product_discount
+    else:
+        discount_percent = global_discount_percent or 0
+    paise = int(price_inr * 100 + 0.5)
+    factor = max(0, 10000 - int(discount_percent * 100 + 0.5))
+    return (paise * factor + 5000) // 10000 / 100
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -29,6 +50,8 @@ class Product(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
     # Add hot/featured product functionality
     is_hot_product = db.Column(db.Boolean, default=False)  # For hot products on homepage
+    # Price after discounts, maintained by pricing.py for SQL-side sorting and filtering
+    effective_price = db.Column(db.Float, nullable=True, index=True)
     
     def get_first_image(self):
         """Get the first image for this product"""
@@ -40,14 +63,8 @@ class Product(db.Model):
     
     def get_discounted_price(self, global_discount_percent):
         """Calculate discounted price based on global, per product, or override discount"""
-        # Priority: discount_override (specific for this product) > per_product_discount > global_discount
-        if self.discount_override is not None and self.discount_override >= 0:
-            discount_percent = self.discount_override
-        elif self.per_product_discount is not None and self.per_product_discount >= 0:
-            discount_percent = self.per_product_discount
-        else:
-            discount_percent = global_discount_percent
-        return round(self.price_inr * (1 - discount_percent / 100), 2)
+        return compute_effective_price(self.price_inr, self.discount_override,
+                                       self.per_product_discount, global_discount_percent)
     
     def to_dict(self):
         """Convert product to dictionary for JSON serialization"""
@@ -103,7 +120,7 @@ class Lead(db.Model):
     total_amount = db.Column(db.Float, nullable=False)
     message = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), default='new')  # new, contacted, completed
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Newest-first lists and reports
     
     def get_products(self):
         """Parse products_json to get actual product data"""
@@ -149,6 +166,59 @@ class Visitor(db.Model):
         }
 
 
+class VisitorSketch(db.Model):
+    """HyperLogLog sketch of distinct visitors for one day (see visitors.py)"""
+    __tablename__ = 'visitor_sketches'
+    __table_args__ = (db.UniqueConstraint('day', 'product_id', name='uq_visitor_sketches_day_product'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False, default=0)  # 0 = whole site
+    registers = db.Column(db.LargeBinary, nullable=False)  # hll.HyperLogLog.to_bytes()
+    version = db.Column(db.Integer, nullable=False, default=0)  # Optimistic lock for merges
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ProductPair(db.Model):
+    """How many orders contained both products (product_a < product_b)"""
+    __tablename__ = 'product_pairs'
+    
+    product_a = db.Column(db.Integer, primary_key=True)
+    product_b = db.Column(db.Integer, primary_key=True, index=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RelatedProduct(db.Model):
+    """Precomputed top-K related products (see related.py)"""
+    __tablename__ = 'related_products'
+    
+    product_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)  # 0 = most related
+    related_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class ProductTrend(db.Model):
+    """Exponentially decayed popularity of a product (see trending.py)"""
+    __tablename__ = 'product_trends'
+    
+    product_id = db.Column(db.Integer, primary_key=True)
+    log_score = db.Column(db.Float, nullable=False, index=True)  # log of score at the landmark time
+    version = db.Column(db.Integer, nullable=False, default=0)  # Optimistic lock for merges
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StockReservation(db.Model):
+    """Units held for a checkout until expires_at (see inventory.py)"""
+    __tablename__ = 'stock_reservations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False, index=True)  # Per-session reservation token
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
 class AdminUser(db.Model):
     __tablename__ = 'admin_users'
     
@@ -0,0 +1,123 @@
+"""Materialised ``Product.effective_price``.
+
+The customer-facing price depends on the product's own discounts and on
+``SiteSettings.global_discount_percent``. Storing it in an indexed column
+lets listings sort and filter by price in SQL. It is kept current by:
+
+- a mapper hook that recomputes it whenever a product is saved with a new
+  price or discount
+- a flush hook that re-prices every product in one ``UPDATE`` when the
+  global discount changes
+- bulk statements (admin bulk actions, catalog import) setting it
+  themselves, since they bypass the mapper hooks
+
+Python and SQL round the same way (integer paise, half up; see
+``models.compute_effective_price``), so every path stores the same value
+and SQL ordering agrees with the prices shown on the pages.
+"""
+from sqlalchemy import Integer, and_, case, cast, event, inspect, select, update
+from sqlalchemy.orm import Session, object_session
+
+from models import Product, SiteSettings, compute_effective_price
+
+PRICE_FIELDS = ('price_inr', 'discount_override', 'per_product_discount')
+
+DEFAULT_GLOBAL_DISCOUNT = SiteSettings.__table__.c.global_discount_percent.default.arg
+
+
+def effective_discount_sql(global_discount, discount_override=None, per_product_discount=None):
+    """SQL expression for the discount percentage a product gets (override, own or global)"""
+    discount_override = Product.discount_override if discount_override is None else discount_override
+    per_product_discount = Product.per_product_discount if per_product_discount is None else per_product_discount
+    return case(
+        (and_(discount_override.isnot(None), discount_override >= 0), discount_override),
+        (and_(per_product_discount.isnot(None), per_product_discount >= 0), per_product_discount),
+        else_=0 if global_discount is None else global_discount,
+    )
+
+
+def effective_price_sql(global_discount, price_inr=None, discount_override=None, per_product_discount=None):
+    """SQL expression for the effective price; column overrides allow pricing new values in an UPDATE"""
+    price_inr = Product.price_inr if price_inr is None else price_inr
+    discount = effective_discount_sql(global_discount, discount_override, per_product_discount)
+    # Same integer rounding as models.compute_effective_price (CAST truncates like int())
+    paise = cast(price_inr * 100 + 0.5, Integer)
+    basis_points = cast(discount * 100 + 0.5, Integer)
+    factor = case((basis_points > 10000, 0), else_=10000 - basis_points)
+    return (paise * factor + 5000) // 10000 / 100.0
+
+
+def current_global_discount(connection):
+    value = connection.execute(
+        select(SiteSettings.global_discount_percent).order_by(SiteSettings.id).limit(1)
+    ).scalar()
+    return DEFAULT_GLOBAL_DISCOUNT if value is None else value
+
+
+def refresh_effective_prices(session, global_discount=None, where=None):
+    """Re-price all products (or those matching ``where``) in one UPDATE"""
+    if global_discount is None:
+        global_discount = current_global_discount(session.connection())
+    statement = update(Product).values(effective_price=effective_price_sql(global_discount))
+    if where is not None:
+        statement = statement.where(where)
+    return session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def _settings_changes(session):
+    """New global discount set in this flush, or None"""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, SiteSettings):
+            continue
+        value = obj.global_discount_percent
+        if obj in session.new:
+            return DEFAULT_GLOBAL_DISCOUNT if value is None else value
+        history = inspect(obj).attrs.global_discount_percent.history
+        if history.added and history.added != history.deleted:
+            return value
+    return None
+
+
+def _before_flush(session, flush_context, instances):
+    new_global = _settings_changes(session)
+    if new_global is None:
+        return
+    session.info['global_discount'] = new_global
+    # Products saved in this same flush are priced by the mapper hook
+    refresh_effective_prices(session, new_global)
+
+
+def _after_flush(session, flush_context):
+    session.info.pop('global_discount', None)
+
+
+def _price_product(mapper, connection, target):
+    if inspect(target).persistent and not any(
+            inspect(target).attrs[field].history.has_changes() for field in PRICE_FIELDS):
+        return
+    session = object_session(target)
+    global_discount = session.info.get('global_discount') if session is not None else None
+    if global_discount is None:
+        global_discount = current_global_discount(connection)
+    target.effective_price = compute_effective_price(
+        target.price_inr, target.discount_override, target.per_product_discount, global_discount
+    )
+
+
+_listeners_installed = False
+
+
+def install_listeners():
+    """Register the pricing hooks once per process"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Product, 'before_insert', _price_product)
+    event.listen(Product, 'before_update', _price_product)
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'after_flush', _after_flush)
+    _listeners_installed = True
+
+
+def init_app(app):
+    install_listeners()
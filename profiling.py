@@ -0,0 +1,279 @@
+"""On-demand request profiling.
+
+A request runs under ``cProfile`` when either:
+
+- a logged-in admin adds ``?_profile=1`` or the header ``X-Profile: 1``
+- it hits the endpoint chosen for sampling on ``/admin-pn/profiles``, and
+  wins the 1-in-N draw
+
+The profile covers the view and template rendering, from this hook's
+``before_request`` to ``after_request``; for a streamed response it runs on
+until the server closes the response, so rows and templates rendered while
+the body streams are included.
+Stats are written to ``PROFILE_DIR`` as ``<timestamp>_<endpoint>.prof`` with
+a small JSON file of request details; the oldest are deleted beyond
+``PROFILE_MAX_FILES`` / ``PROFILE_MAX_BYTES``. The sampling choice is kept
+in the same directory so it applies to every worker. Only one request per
+process is profiled at a time.
+
+``collapsed_stacks`` turns a profile into the folded format read by
+flamegraph.pl and speedscope. cProfile only records caller/callee pairs, so
+time is split across a function's callers in proportion: stacks are an
+approximation.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, request, session
+
+_NAME = re.compile(r'^[0-9]{8}T[0-9]{6}_[0-9]{6}_[A-Za-z0-9_.-]+$')
+
+_active = threading.Lock()
+_sampling = {'mtime': None, 'value': None}
+
+
+class ProfileNotFound(Exception):
+    pass
+
+
+def _folder():
+    return current_app.config['PROFILE_DIR']
+
+
+def _sampling_path():
+    return os.path.join(_folder(), 'sampling.json')
+
+
+def get_sampling():
+    """{'endpoint': name, 'every': n} or None; re-read only when the file changes"""
+    try:
+        mtime = os.stat(_sampling_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if mtime != _sampling['mtime']:
+        try:
+            with open(_sampling_path()) as f:
+                _sampling['value'] = json.load(f)
+        except (OSError, ValueError):
+            _sampling['value'] = None
+        _sampling['mtime'] = mtime
+    return _sampling['value']
+
+
+def set_sampling(endpoint, every):
+    """Profile 1 in ``every`` requests to ``endpoint`` in all workers; a falsy ``every`` stops sampling"""
+    if not endpoint or not every:
+        try:
+            os.remove(_sampling_path())
+        except FileNotFoundError:
+            pass
+        return
+    temp_path = f"{_sampling_path()}.{os.getpid()}"
+    with open(temp_path, 'w') as f:
+        json.dump({'endpoint': endpoint, 'every': int(every)}, f)
+    os.replace(temp_path, _sampling_path())
+
+
+def _trigger():
+    """'admin', 'sampled' or None for the current request"""
+    # The session is only read when asked for, so other responses get no Vary: Cookie
+    if ((request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1')
+            and session.get('admin_logged_in')):
+        return 'admin'
+    sampling = get_sampling()
+    if sampling and request.endpoint == sampling['endpoint'] and random.randrange(sampling['every']) == 0:
+        return 'sampled'
+    return None
+
+
+def _start():
+    trigger = _trigger()
+    if trigger is None or not _active.acquire(blocking=False):
+        return
+    g.profile = (cProfile.Profile(), trigger, time.perf_counter())
+    g.profile[0].enable()
+
+
+def _finish(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    details = {
+        'endpoint': request.endpoint or 'unmatched',
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'status': response.status_code,
+        'trigger': profile[1],
+    }
+    app = current_app._get_current_object()
+    if response.is_streamed:
+        # The body is generated while the server iterates it, after this hook
+        response.call_on_close(lambda: _stop(app, profile, details))
+    else:
+        _stop(app, profile, details)
+    return response
+
+
+def _stop(app, profile, details):
+    profiler, _, started = profile
+    try:
+        profiler.disable()
+        with app.app_context():
+            save(profiler, dict(details, duration_ms=round((time.perf_counter() - started) * 1000, 1)))
+    finally:
+        _active.release()
+
+
+def _abandon(exc):
+    # after_request never ran (the request raised): stop profiling, keep nothing
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile[0].disable()
+        _active.release()
+
+
+def save(profiler, details):
+    """Write a profile and its details; returns its name"""
+    now = datetime.utcnow()
+    endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', details['endpoint'])
+    name = f"{now:%Y%m%dT%H%M%S_%f}_{endpoint}"
+    os.makedirs(_folder(), exist_ok=True)
+    profiler.dump_stats(os.path.join(_folder(), f'{name}.prof'))
+    with open(os.path.join(_folder(), f'{name}.json'), 'w') as f:
+        json.dump(dict(details, name=name, created=now.isoformat(timespec='seconds')), f)
+    prune()
+    return name
+
+
+def prune():
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES or PROFILE_MAX_BYTES"""
+    entries = []
+    for filename in os.listdir(_folder()):
+        name, ext = os.path.splitext(filename)
+        if ext == '.prof' and _NAME.match(name):
+            try:
+                entries.append((name, os.path.getsize(os.path.join(_folder(), filename))))
+            except FileNotFoundError:
+                pass
+    entries.sort(reverse=True)  # Names start with the timestamp: newest first
+    total = 0
+    for count, (name, size) in enumerate(entries, start=1):
+        total += size
+        if count > current_app.config['PROFILE_MAX_FILES'] or total > current_app.config['PROFILE_MAX_BYTES']:
+            delete(name)
+
+
+def delete(name):
+    for ext in ('.prof', '.json'):
+        try:
+            os.remove(profile_path(name, ext))
+        except FileNotFoundError:
+            pass
+
+
+def profile_path(name, ext='.prof'):
+    if not _NAME.match(name or ''):
+        raise ProfileNotFound(name)
+    return os.path.join(_folder(), name + ext)
+
+
+def list_profiles():
+    """Details of the stored profiles, newest first"""
+    profiles = []
+    try:
+        filenames = sorted(os.listdir(_folder()), reverse=True)
+    except FileNotFoundError:
+        return profiles
+    for filename in filenames:
+        name, ext = os.path.splitext(filename)
+        if ext != '.json' or not _NAME.match(name):
+            continue
+        try:
+            with open(os.path.join(_folder(), filename)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def load(name):
+    """(details, pstats.Stats) of a stored profile"""
+    try:
+        with open(profile_path(name, '.json')) as f:
+            details = json.load(f)
+        return details, pstats.Stats(profile_path(name))
+    except (OSError, ValueError):
+        raise ProfileNotFound(name)
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # Built-in, e.g. <method 'execute' of 'sqlite3.Cursor' objects>
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def top_functions(stats, limit=30):
+    """The ``limit`` functions with the highest cumulative time"""
+    rows = []
+    for func, (primitive_calls, calls, total_time, cumulative_time, _) in stats.stats.items():
+        rows.append({
+            'function': _label(func),
+            'file': func[0],
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'total_ms': round(total_time * 1000, 3),
+            'cumulative_ms': round(cumulative_time * 1000, 3),
+            'per_call_ms': round(cumulative_time * 1000 / calls, 3) if calls else 0,
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+
+def collapsed_stacks(stats, max_depth=64, min_us=1):
+    """Lines of ``frame;frame;frame <microseconds>`` (folded stacks)"""
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [func for func, row in stats.stats.items() if not row[4]]
+    totals = {}
+
+    def walk(func, stack, share):
+        stack = stack + [_label(func)]
+        self_us = stats.stats[func][2] * share * 1_000_000
+        if self_us >= min_us:
+            key = ';'.join(stack)
+            totals[key] = totals.get(key, 0) + self_us
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_time in callees.get(func, ()):
+            callee_time = stats.stats[callee][3]
+            if callee_time <= 0 or _label(callee) in stack:
+                continue
+            # The callee's time spent under this caller, scaled by this path's share of the caller
+            callee_share = share * min(1.0, edge_time / callee_time)
+            if callee_time * callee_share * 1_000_000 >= min_us:
+                walk(callee, stack, callee_share)
+
+    for root in roots:
+        walk(root, [], 1.0)
+    return [f"{stack} {int(round(us))}" for stack, us in sorted(totals.items()) if int(round(us))]
+
+
+def init_app(app):
+    """Configure request profiling for an application"""
+    app.config.setdefault('PROFILE_DIR', os.environ.get(
+        'PROFILE_DIR', os.path.join(app.instance_path, 'profiles')))
+    app.config.setdefault('PROFILE_MAX_FILES', int(os.environ.get('PROFILE_MAX_FILES', 50)))
+    app.config.setdefault('PROFILE_MAX_BYTES', int(os.environ.get('PROFILE_MAX_BYTES', 50 * 1024 * 1024)))
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_abandon)
@@ -0,0 +1,89 @@
+"""Cached storefront queries.
+
+Settings and product-by-id lookups (cart, checkout, orders) go through
+``cache.cached_query``: a worker hits the database again only after a
+commit touches ``products``, ``product_images`` or ``site_settings`` (or
+after ``QUERY_CACHE_TTL``). The record classes are shared with the catalog
+snapshot (catalog.py).
+
+Results are read-only records copied out of the ORM rows, so they can be
+shared between requests and never lazy-load or go stale inside a session.
+They keep the attribute names and helper methods the templates already use.
+"""
+from sqlalchemy.orm import selectinload
+
+from cache import cached_query
+from models import Product, SiteSettings, compute_effective_price
+
+
+class Record:
+    """Immutable value object built from an ORM row"""
+    __slots__ = ()
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = cls._fields + tuple(cls.__dict__.get('__slots__', ()))  # Inherited slots first
+
+    def __init__(self, **values):
+        for name in self._fields:
+            object.__setattr__(self, name, values[name])
+
+    @classmethod
+    def from_row(cls, row, **extra):
+        return cls(**{name: extra[name] if name in extra else getattr(row, name) for name in cls._fields})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {getattr(self, 'id', '')}>"
+
+
+class SettingsRecord(Record):
+    __slots__ = ('id', 'store_name', 'banner_text', 'global_discount_percent', 'theme_name',
+                 'privacy_policy', 'terms', 'about', 'contact_email', 'contact_phone',
+                 'contact_address', 'telegram_bot_token', 'admin_telegram_chat_id', 'updated_at')
+
+
+class CategoryRecord(Record):
+    __slots__ = ('id', 'name', 'description', 'is_active', 'featured')
+
+
+class ImageRecord(Record):
+    __slots__ = ('id', 'filename', 'position')
+
+
+class ProductRecord(Record):
+    __slots__ = ('id', 'title', 'description', 'price_inr', 'active', 'stock', 'views',
+                 'add_to_cart_count', 'featured', 'discount_override', 'per_product_discount',
+                 'created_at', 'category_id', 'is_hot_product', 'effective_price', 'images')
+
+    @classmethod
+    def from_row(cls, row, **extra):
+        images = sorted(row.images, key=lambda image: (image.position or 0, image.id))
+        return super().from_row(row, images=tuple(ImageRecord.from_row(image) for image in images), **extra)
+
+    def get_first_image(self):
+        return self.images[0] if self.images else None
+
+    def get_discounted_price(self, global_discount_percent):
+        return compute_effective_price(self.price_inr, self.discount_override,
+                                       self.per_product_discount, global_discount_percent)
+
+
+@cached_query('site_settings')
+def site_settings():
+    """The settings row, or None if it was never created"""
+    row = SiteSettings.query.first()
+    return SettingsRecord.from_row(row) if row else None
+
+
+@cached_query('products', 'product_images')
+def product(product_id):
+    """A product with its images (active or not), or None"""
+    row = Product.query.options(selectinload(Product.images)).filter_by(id=product_id).first()
+    return ProductRecord.from_row(row) if row else None
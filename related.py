@@ -0,0 +1,187 @@
+"""Precomputed related products.
+
+Each product's top ``RELATED_TOP_K`` related products are kept in
+``related_products``, ranked by
+
+    score = orders containing both products + CATEGORY_WEIGHT if same category
+
+with product views breaking ties. Co-purchase counts live in
+``product_pairs``. A new lead only changes the pairs among its own products,
+so ``record_lead`` updates those pairs and re-ranks just those products on
+the background thread. ``rebuild_all`` (``flask rebuild-related``) recomputes
+everything from the leads and catalog; run it after large catalog changes or
+nightly.
+"""
+import json
+from itertools import combinations
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import Lead, Product, ProductPair, RelatedProduct, db
+import catalog
+import tasks
+
+RELATED_TOP_K = 8
+CATEGORY_WEIGHT = 0.5
+
+
+def lead_product_ids(items):
+    """Distinct product ids of a lead's cart items"""
+    ids = set()
+    for item in items:
+        try:
+            ids.add(int(item['product_id']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return ids
+
+
+def related_products(product_id, limit=4):
+    """Active related products for the detail page, in rank order"""
+    related_ids = db.session.scalars(
+        select(RelatedProduct.related_id)
+        .where(RelatedProduct.product_id == product_id)
+        .order_by(RelatedProduct.rank)
+    ).all()
+    # Inactive products are not in the catalog snapshot
+    products = catalog.current().products
+    return [products[pid] for pid in related_ids if pid in products][:limit]
+
+
+def _rank(product_id, category_id, co_counts, category_members, views):
+    scores = dict(co_counts)
+    if category_id is not None:
+        for other in category_members.get(category_id, ()):
+            scores[other] = scores.get(other, 0) + CATEGORY_WEIGHT
+    scores.pop(product_id, None)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -views.get(item[0], 0), item[0]))
+    return ranked[:RELATED_TOP_K]
+
+
+def _category_members(category_ids):
+    """{category_id: ids of its top active products by views} for ranking"""
+    members = {}
+    for category_id in category_ids:
+        if category_id is None:
+            continue
+        # One more than K so the product itself can be dropped
+        members[category_id] = db.session.scalars(
+            select(Product.id)
+            .where(Product.category_id == category_id, Product.active == True)
+            .order_by(Product.views.desc(), Product.id)
+            .limit(RELATED_TOP_K + 1)
+        ).all()
+    return members
+
+
+def _write_rankings(rankings):
+    """Replace the stored lists of the products in ``rankings``"""
+    if not rankings:
+        return
+    db.session.execute(delete(RelatedProduct).where(RelatedProduct.product_id.in_(list(rankings))))
+    rows = [
+        {'product_id': product_id, 'rank': rank, 'related_id': related_id, 'score': score}
+        for product_id, ranked in rankings.items()
+        for rank, (related_id, score) in enumerate(ranked)
+    ]
+    if rows:
+        db.session.execute(insert(RelatedProduct), rows)
+
+
+def refresh_products(product_ids):
+    """Recompute the related lists of ``product_ids`` from the stored pairs"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    products = db.session.execute(
+        select(Product.id, Product.category_id).where(Product.id.in_(product_ids))
+    ).all()
+    co_counts = {product_id: {} for product_id in product_ids}
+    pairs = db.session.execute(
+        select(ProductPair.product_a, ProductPair.product_b, ProductPair.orders)
+        .where(or_(ProductPair.product_a.in_(product_ids), ProductPair.product_b.in_(product_ids)))
+    )
+    for a, b, orders in pairs:
+        if a in co_counts:
+            co_counts[a][b] = orders
+        if b in co_counts:
+            co_counts[b][a] = orders
+
+    members = _category_members({category_id for _, category_id in products})
+    candidate_ids = set().union(*co_counts.values(), *members.values())
+    views = dict(db.session.execute(
+        select(Product.id, Product.views).where(Product.id.in_(candidate_ids), Product.active == True)
+    ).all()) if candidate_ids else {}
+    # Inactive or deleted products are never recommended
+    rankings = {}
+    for product_id, category_id in products:
+        active_counts = {other: n for other, n in co_counts[product_id].items() if other in views}
+        rankings[product_id] = _rank(product_id, category_id, active_counts, members, views)
+    _write_rankings(rankings)
+
+
+def _increment_pair(a, b):
+    while True:
+        result = db.session.execute(
+            update(ProductPair)
+            .where(ProductPair.product_a == a, ProductPair.product_b == b)
+            .values(orders=ProductPair.orders + 1)
+        )
+        if result.rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(ProductPair).values(product_a=a, product_b=b, orders=1))
+            return
+        except IntegrityError:
+            continue  # Another worker inserted the pair first
+
+
+def update_for_lead(app, product_ids):
+    """Count a new order's product pairs and re-rank its products"""
+    with app.app_context():
+        try:
+            for a, b in combinations(sorted(product_ids), 2):
+                _increment_pair(a, b)
+            refresh_products(product_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+def record_lead(app, items):
+    """Schedule the incremental update for a lead on the background thread"""
+    product_ids = lead_product_ids(items)
+    if product_ids:
+        tasks.enqueue(update_for_lead, app, product_ids)
+
+
+def rebuild_all(batch_size=1000):
+    """Recompute all pair counts and related lists; returns (pairs, products)"""
+    pair_counts = {}
+    query = select(Lead.products_json).execution_options(yield_per=batch_size)
+    for (products_json,) in db.session.execute(query):
+        try:
+            items = json.loads(products_json) if products_json else []
+        except ValueError:
+            continue
+        for pair in combinations(sorted(lead_product_ids(items)), 2):
+            pair_counts[pair] = pair_counts.get(pair, 0) + 1
+
+    db.session.execute(delete(ProductPair))
+    if pair_counts:
+        db.session.execute(insert(ProductPair), [
+            {'product_a': a, 'product_b': b, 'orders': n} for (a, b), n in pair_counts.items()
+        ])
+    db.session.flush()
+
+    product_ids = db.session.scalars(select(Product.id).order_by(Product.id)).all()
+    db.session.execute(delete(RelatedProduct))
+    for start in range(0, len(product_ids), batch_size):
+        refresh_products(product_ids[start:start + batch_size])
+    db.session.commit()
+    return len(pair_counts), len(product_ids)
@@ -0,0 +1,128 @@
+"""Read/write routing between the primary database and a read replica.
+
+Set ``DATABASE_REPLICA_URL`` to give the app a ``replica`` bind (via
+``SQLALCHEMY_BINDS``). Without it everything uses the primary, unchanged.
+
+A request reads from the replica only when all of these hold:
+
+- it is a GET/HEAD to one of ``REPLICA_ENDPOINTS`` (storefront listings and
+  admin reports)
+- the visitor has not written anything in the last ``REPLICA_STICKY_SECONDS``
+  (a timestamp in their session, so they always see their own changes)
+- no catalog table changed in that window either (the cache tag versions),
+  so a lagging replica never fills the fragment cache with stale pages
+
+Even then only SELECT statements go to the replica: flushes, DML, raw SQL and
+every query after the request's first write use the primary.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+SAFE_METHODS = frozenset({'GET', 'HEAD'})
+
+# Read-only pages whose queries may be served by the replica
+REPLICA_ENDPOINTS = frozenset({
+    'main.index',
+    'main.category_products',
+    'main.all_categories',
+    'main.browse',
+    'admin.dashboard',
+    'admin.analytics',
+    'admin.leads',
+    'admin.orders',
+    'admin.export_orders',
+    'admin.export_leads',
+})
+
+
+class RoutingSession(Session):
+    """Session sending a request's reads to the replica when ``g.db_replica`` is set"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['wrote'] = True
+            elif (getattr(clause, 'is_select', False) and not self.info.get('wrote')
+                  and g.get('db_replica')):
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, even on a replica page"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('db_replica')
+    g.db_replica = False
+    try:
+        yield
+    finally:
+        g.db_replica = previous
+
+
+def _catalog_changed_since(seconds):
+    import cache
+    versions = cache.tag_versions(sorted(cache.TAGGED_TABLES))
+    return time.time_ns() - max(versions) < seconds * 1_000_000_000
+
+
+def _choose_bind():
+    g.db_replica = (
+        request.method in SAFE_METHODS
+        and request.endpoint in current_app.config['REPLICA_ENDPOINTS']
+        and session.get('db_primary_until', 0) <= time.time()
+        and not _catalog_changed_since(current_app.config['REPLICA_STICKY_SECONDS'])
+    )
+
+
+def _stick_after_write(response):
+    if request.method not in SAFE_METHODS:
+        session['db_primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def configure(app):
+    """Add the replica bind from ``DATABASE_REPLICA_URL`` (before ``db.init_app``)"""
+    url = app.config.setdefault('DATABASE_REPLICA_URL', os.environ.get('DATABASE_REPLICA_URL'))
+    if url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = url
+
+
+def sync_sqlite_replica():
+    """Copy a SQLite primary onto a SQLite replica file (local testing)"""
+    import sqlite3
+    from models import db
+    engines = db.engines
+    if REPLICA_BIND not in engines:
+        raise RuntimeError('DATABASE_REPLICA_URL is not set')
+    if any(engines[key].url.get_backend_name() != 'sqlite' for key in (None, REPLICA_BIND)):
+        raise RuntimeError('sync-replica only copies SQLite databases; use streaming replication otherwise')
+    paths = [engines[key].url.database for key in (None, REPLICA_BIND)]
+    source, target = sqlite3.connect(paths[0]), sqlite3.connect(paths[1])
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    engines[REPLICA_BIND].dispose()
+    return paths
+
+
+def init_app(app):
+    """Route reads for an application that has a replica bind"""
+    app.config.setdefault('REPLICA_ENDPOINTS', REPLICA_ENDPOINTS)
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    app.before_request(_choose_bind)
+    app.after_request(_stick_after_write)
@@ -8,11 +8,10 @@ source /root/w/baign_mart/venv/bin/activate
 export FLASK_ENV=production
 export FLASK_DEBUG=0
 
-# Run the application with gunicorn if available, otherwise use Flask's built-in server
-if command -v gunicorn &> /dev/null; then
-    echo "Starting with Gunicorn..."
-    gunicorn --workers 4 --bind 0.0.0.0:5000 --timeout 120 run:app
-else
-    echo "Gunicorn not found. Starting with Flask development server in production mode..."
-    python production.py
-fi
\ No newline at end of file
+# Create tables and default data once per deploy, outside the worker import path
+python -m flask --app wsgi init-db
+
+# Serve with gunicorn; worker count, threads and recycling come from gunicorn.conf.py
+# (reload gracefully with: kill -HUP $(cat gunicorn.pid))
+echo "Starting with Gunicorn..."
+exec gunicorn -c gunicorn.conf.py wsgi:app
@@ -0,0 +1,61 @@
+"""Tiny in-process background task queue.
+
+Work that should not hold up a request (deleting files, flushing counters)
+is handed to a single daemon thread per worker process. Tasks must not rely
+on the request context; pass plain values in.
+"""
+import os
+import queue
+import threading
+import traceback
+
+import metrics
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _run():
+    while True:
+        func, args, kwargs = _queue.get()
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            print(f"Background task {getattr(func, '__name__', func)} failed:")
+            traceback.print_exc()
+            metrics.TASK_FAILURES.labels(getattr(func, '__name__', 'unknown')).inc()
+        finally:
+            metrics.TASKS_QUEUED.labels('background').dec()
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    # Threads do not survive fork(); start one lazily in each process
+    if _worker is None or not _worker.is_alive():
+        with _worker_lock:
+            if _worker is None or not _worker.is_alive():
+                _worker = threading.Thread(target=_run, name='background-tasks', daemon=True)
+                _worker.start()
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the background thread"""
+    _ensure_worker()
+    metrics.TASKS_QUEUED.labels('background').inc()
+    _queue.put((func, args, kwargs))
+
+
+def drain():
+    """Block until every queued task has finished (used by tests and shutdown)"""
+    _queue.join()
+
+
+def delete_files(paths):
+    """Remove files, ignoring ones that are already gone"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,52 @@
+"""Shared test setup: a fresh app on a throwaway database for every test"""
+import unittest
+import tempfile
+import shutil
+import os
+from unittest import mock
+
+from app import create_app
+
+
+class AppTestCase(unittest.TestCase):
+    """Creates ``self.app`` and ``self.db`` on a new SQLite file with the tables created
+
+    Settings in ``config`` are passed to create_app, so they apply before the
+    extensions read theirs. Every test also gets its own cache version and
+    lock directories, and the environment is restored afterwards.
+    """
+    config = {}
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict(os.environ))
+        db_fd, self.db_path = tempfile.mkstemp()
+        os.close(db_fd)
+        self.addCleanup(os.unlink, self.db_path)
+        self.app, self.db = self.create_app()
+        with self.app.app_context():
+            self.db.create_all()
+        self.addCleanup(self.drop_all)
+
+    def create_app(self, **config):
+        """An app on this test's database; keyword arguments override ``config``"""
+        cache_dir = self.temp_dir()
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'TESTING': True,
+            'CACHE_VERSION_DIR': os.path.join(cache_dir, 'versions'),
+            'CACHE_LOCK_DIR': os.path.join(cache_dir, 'locks'),
+        }
+        settings.update(self.config)
+        settings.update(config)
+        return create_app(settings)
+
+    def temp_dir(self):
+        """A temporary directory removed after the test"""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        return path
+
+    def drop_all(self):
+        with self.app.app_context():
+            self.db.session.remove()
+            self.db.drop_all()
@@ -0,0 +1,73 @@
+import unittest
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from support import AppTestCase
+
+
+class AdminStreamingTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Product, Lead
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Streamed Course', description='', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.flush()
+            start = datetime(2024, 1, 1)
+            statuses = ['pending', 'completed', 'new']
+            self.db.session.add_all([
+                Lead(order_id=f'ORD{i:05d}', full_name=f'Customer {i}', email='a@example.com',
+                     phone_number='1234567890', total_amount=100.0, status=statuses[i % 3],
+                     products_json=json.dumps([{'product_id': product.id, 'quantity': 2}, {'product_id': 999, 'quantity': 1}]),
+                     created_at=start + timedelta(minutes=i))
+                for i in range(1200)
+            ])
+            self.db.session.commit()
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+
+    def test_orders_page_streams_every_section(self):
+        """Test that the orders page streams in pieces and lists every order with its products"""
+        response = self.client.get('/admin-pn/orders', buffered=False)
+        self.assertTrue(response.is_streamed)
+        chunks = list(response.response)
+        response.close()
+        self.assertGreater(len(chunks), 10)
+        # The page chrome goes out before any row has been rendered
+        self.assertIn(b'Admin Panel', chunks[0])
+        self.assertNotIn(b'ORD01199', chunks[0])
+        page = b''.join(chunks).decode()
+        self.assertEqual(page.count('Streamed Course (x2)'), 1200)
+        self.assertIn('>400<', page.replace(' ', '').replace('\n', ''))
+        # Newest first within a section
+        self.assertLess(page.index('ORD01197'), page.index('ORD00003'))
+
+    def test_first_gzipped_chunk_carries_the_page_head(self):
+        """Test that under gzip the first streamed chunk decodes to the page chrome, not just a header"""
+        response = self.client.get('/admin-pn/leads', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        self.addCleanup(response.close)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        first = next(iter(response.response))
+        self.assertGreater(len(first), 10)
+        self.assertIn(b'Admin Panel', zlib.decompressobj(31).decompress(first))
+
+    def test_leads_page_consumes_flashes_before_streaming(self):
+        """Test that flashed messages shown on a streamed page are not shown again"""
+        with self.client.session_transaction() as sess:
+            sess['_flashes'] = [('success', 'Saved once')]
+        self.assertIn(b'Saved once', self.client.get('/admin-pn/leads').data)
+        self.assertNotIn(b'Saved once', self.client.get('/admin-pn/leads').data)
+
+    def test_analytics_page_streams_product_rows(self):
+        """Test that the analytics page still lists the products"""
+        response = self.client.get('/admin-pn/analytics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Streamed Course', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+from support import AppTestCase
+
+BROWSER = 'Mozilla/5.0 (X11; Linux x86_64) Firefox/125.0'
+CRAWLER = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'admission.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_burst_then_refill(self):
+        """Test that a bucket allows its burst, refuses, then refills over time"""
+        from admission import take_token
+        results = [take_token(self.path, 'ip', rate=1, capacity=3, now=100.0) for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        self.assertFalse(take_token(self.path, 'ip', rate=1, capacity=3, now=100.5))
+        self.assertTrue(take_token(self.path, 'ip', rate=1, capacity=3, now=101.0))
+        self.assertFalse(take_token(self.path, 'ip', rate=1, capacity=3, now=101.0))
+        # Other clients have their own bucket
+        self.assertTrue(take_token(self.path, 'other', rate=1, capacity=3, now=100.0))
+
+    def test_classify(self):
+        from admission import classify
+        self.assertEqual(classify('/checkout', CRAWLER), 'priority')
+        self.assertEqual(classify('/admin-pn/products', ''), 'priority')
+        self.assertEqual(classify('/static/css/style.css', CRAWLER), 'exempt')
+        self.assertEqual(classify('/', CRAWLER), 'bot')
+        self.assertEqual(classify('/', ''), 'bot')
+        self.assertEqual(classify('/', BROWSER), 'normal')
+
+
+class AdmissionTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['ADMISSION_ENABLED'] = True
+        self.app.config['ADMISSION_DB_PATH'] = os.path.join(self.temp_dir(), 'admission.db')
+        self.app.config['ADMISSION_RATE'] = 0.001
+        self.app.config['ADMISSION_BURST'] = 3
+        self.app.config['ADMISSION_BOT_RATE'] = 0.001
+        self.app.config['ADMISSION_BOT_BURST'] = 2
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Course', description='A course', price_inr=100.0, active=True)
+            self.db.session.add(product)
+            self.db.session.commit()
+            self.product_id = product.id
+
+    def test_bots_are_not_tracked(self):
+        """Test that crawler page views write no visitor rows or view counts"""
+        import visitors
+        from models import Product
+        client = self.app.test_client()
+        response = client.get(f'/product/{self.product_id}', headers={'User-Agent': CRAWLER})
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            visitors.flush()
+            self.assertEqual(visitors.unique_visitors(), 0)
+            self.assertEqual(self.db.session.get(Product, self.product_id).views, 0)
+
+        client.get(f'/product/{self.product_id}', headers={'User-Agent': BROWSER})
+        with self.app.app_context():
+            visitors.flush()
+            self.assertEqual(visitors.unique_visitors(), 1)
+            self.assertEqual(self.db.session.get(Product, self.product_id).views, 1)
+
+    def test_rate_limit_spares_priority_paths(self):
+        """Test that an over-limit client gets 429 but can still check out"""
+        client = self.app.test_client()
+        headers = {'User-Agent': CRAWLER}
+        statuses = [client.get('/', headers=headers).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertIn('Retry-After', client.get('/', headers=headers).headers)
+
+        self.assertNotEqual(client.get('/checkout', headers=headers).status_code, 429)
+        self.assertNotEqual(client.get('/admin-pn/login', headers=headers).status_code, 429)
+
+        # Browsers from the same address use a separate, larger bucket
+        self.assertEqual(client.get('/', headers={'User-Agent': BROWSER}).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,11 +11,12 @@ class BaignMartTestCase(unittest.TestCase):
         # Create a temporary database for testing
         self.db_fd, self.db_path = tempfile.mkstemp()
         
-        # Set up the app
-        self.app, self.db = create_app()
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
-        self.app.config['TESTING'] = True
-        self.app.config['WTF_CSRF_ENABLED'] = False  # Disable CSRF for testing
+        # Set up the app on it (the URI must be set before the engine is created)
+        self.app, self.db = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,  # Disable CSRF for testing
+        })
         
         # Import models after db is created
         from models import db, Product, Lead, SiteSettings
@@ -0,0 +1,138 @@
+import unittest
+import threading
+import sqlite3
+import time
+import os
+
+from support import AppTestCase
+import backup
+
+
+class BackupTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backup_dir = self.temp_dir()
+        self.upload_dir = self.temp_dir()
+        self.app.config['BACKUP_DIR'] = self.backup_dir
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+        self.app.config['BACKUP_STEP_SLEEP'] = 0
+
+        from models import SiteSettings, Product, ProductImage
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Backed Up Course', description='', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.flush()
+            self.db.session.add_all([ProductImage(product_id=product.id, filename='kept.jpg'),
+                                     ProductImage(product_id=product.id, filename='lost.jpg')])
+            self.db.session.commit()
+            self.product_id = product.id
+        with open(os.path.join(self.upload_dir, 'kept.jpg'), 'wb') as f:
+            f.write(b'jpeg')
+
+    def test_backup_manifest_and_verify(self):
+        """Test that a backup restores to the same rows and lists the uploads"""
+        with self.app.app_context():
+            self.assertTrue(backup.is_due())
+            manifest = backup.create_backup()
+            self.assertEqual(backup.list_backups(), [manifest['name']])
+            self.assertIn('verified', backup.load_manifest(manifest['name']))
+            self.assertEqual(manifest['tables']['products'], 1)
+            self.assertEqual([item['name'] for item in manifest['uploads']], ['kept.jpg'])
+            self.assertEqual(manifest['missing_uploads'], ['lost.jpg'])
+            self.assertFalse(backup.is_due())
+            self.assertFalse([f for f in os.listdir(self.backup_dir) if f.endswith('.tmp')])
+
+            archive = os.path.join(self.backup_dir, manifest['archive'])
+            with open(archive, 'ab') as f:
+                f.write(b'tampered')
+            with self.assertRaises(backup.BackupError):
+                backup.verify_backup(manifest['name'])
+            with self.assertRaises(backup.BackupError):
+                backup.verify_backup('../baign_mart')
+
+    def test_rotation(self):
+        """Test that only the newest BACKUP_KEEP backups are kept"""
+        self.app.config['BACKUP_KEEP'] = 2
+        with self.app.app_context():
+            names = [backup.create_backup(verify=False)['name'] for _ in range(3)]
+            self.assertEqual(backup.list_backups(), names[:0:-1])
+            self.assertEqual(len(os.listdir(self.backup_dir)), 5)  # 2 archives, 2 manifests, lock
+            self.assertEqual(backup.rotate(keep=1), [names[1]])
+
+    def test_backup_during_writes(self):
+        """Test that writes go through while a backup copies the database in small steps"""
+        self.app.config['BACKUP_PAGES_PER_STEP'] = 1
+        self.app.config['BACKUP_STEP_SLEEP'] = 0.002
+        from models import Product
+        with self.app.app_context():
+            self.db.session.add_all([Product(title=f'Course {i}', description='x' * 4000, price_inr=100.0)
+                                     for i in range(20)])
+            self.db.session.commit()
+
+        stop = threading.Event()
+        writes = []
+
+        def writer():
+            connection = sqlite3.connect(self.db_path, timeout=5)
+            while not stop.is_set():
+                started = time.monotonic()
+                connection.execute('UPDATE products SET views = views + 1')
+                connection.commit()
+                writes.append(time.monotonic() - started)
+                time.sleep(0.001)
+            connection.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            with self.app.app_context():
+                manifest = backup.create_backup()
+        finally:
+            stop.set()
+            thread.join()
+        self.assertGreater(len(writes), 0)
+        self.assertLess(max(writes), 0.25)
+        self.assertGreater(manifest['steps'], 1)
+        self.assertEqual(manifest['tables']['products'], 21)
+
+    def test_command(self):
+        """Test the backup and verify-backup commands"""
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['verify-backup'])
+        self.assertNotEqual(result.exit_code, 0)
+        result = runner.invoke(args=['backup'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('1 product images are missing', result.output)
+        result = runner.invoke(args=['verify-backup'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('verified', result.output)
+
+    def test_scheduled_command_backs_up_only_when_due(self):
+        """Test that backup --if-due skips fresh backups and a backup already running"""
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['backup', '--if-due'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('written', result.output)
+        result = runner.invoke(args=['backup', '--if-due'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('No backup due', result.output)
+        with self.app.app_context():
+            self.assertEqual(len(backup.list_backups()), 1)
+
+        self.app.config['BACKUP_INTERVAL_HOURS'] = 0
+        with self.app.app_context():
+            held = backup._lock()
+        try:
+            result = runner.invoke(args=['backup', '--if-due'])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn('Another backup is running', result.output)
+            self.assertNotEqual(runner.invoke(args=['backup']).exit_code, 0)
+        finally:
+            held.close()
+        with self.app.app_context():
+            self.assertEqual(len(backup.list_backups()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
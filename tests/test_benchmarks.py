@@ -0,0 +1,94 @@
+import unittest
+import os
+from unittest import mock
+
+from app import warm_up
+from benchmarks.loadtest import Results, percentile
+from benchmarks.seed import seed
+from support import AppTestCase
+
+
+class PercentileTestCase(unittest.TestCase):
+    def test_nearest_rank(self):
+        """Test nearest-rank percentiles on a known distribution"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_unexpected_statuses_are_errors(self):
+        """Test that throttled, redirected or failed requests are errors, not fast samples"""
+        def response(status):
+            return mock.Mock(status_code=status, headers={'X-Query-Count': '3'})
+
+        results = Results()
+        results.record('home', 0.010, response(200))
+        results.record('home', 0.001, response(429))
+        results.record('admin_orders', 0.002, response(302))
+        results.record('cart_add', 0.020, response(302))
+        results.record('cart_add', 0.030, None)
+        summary = results.summary(elapsed=1.0)
+        home = summary['scenarios']['home']
+        self.assertEqual((home['requests'], home['errors'], home['rps'], home['p99_ms']), (2, 1, 1.0, 10.0))
+        self.assertEqual(home['error_statuses'], {'429': 1})
+        self.assertEqual(summary['scenarios']['admin_orders']['errors'], 1)
+        self.assertEqual(summary['scenarios']['cart_add']['error_statuses'], {'failed': 1})
+        self.assertEqual((summary['total']['requests'], summary['total']['errors']), (5, 3))
+
+
+class SeedTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = self.temp_dir()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+
+    def seeded(self, app, seed_value=42):
+        """Seed ``app`` and return its rows (without the run-relative timestamps)"""
+        from models import Product, ProductImage, Lead, Visitor
+
+        seed(app, products=50, images_per_product=2, leads=200, visitors=300,
+             chunk_size=64, seed_value=seed_value, log=lambda message: None)
+
+        with app.app_context():
+            return {
+                'products': [(p.title, p.description, p.price_inr, p.active, p.stock, p.per_product_discount,
+                              p.effective_price, p.category_id, p.is_hot_product)
+                             for p in Product.query.order_by(Product.id)],
+                'images': [(i.product_id, i.filename, i.position)
+                           for i in ProductImage.query.order_by(ProductImage.id)],
+                'leads': [(l.order_id, l.products_json, l.total_amount, l.status)
+                          for l in Lead.query.order_by(Lead.id)],
+                'visitors': [(v.ip_hash, v.views_count) for v in Visitor.query.order_by(Visitor.id)],
+            }
+
+    def other_app(self):
+        folder = self.temp_dir()
+        app, _ = self.create_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(folder, 'seed.db')}",
+                                 UPLOAD_FOLDER=os.path.join(folder, 'uploads'))
+        return app
+
+    def test_seed_is_reproducible(self):
+        """Test that the seeder loads the requested rows, the same ones for the same seed"""
+        rows = self.seeded(self.app)
+        self.assertEqual([len(rows[table]) for table in ('products', 'images', 'leads', 'visitors')],
+                         [50, 100, 200, 300])
+        self.assertEqual(sorted(os.listdir(self.upload_dir)), sorted(image[1] for image in rows['images']))
+
+        self.assertEqual(self.seeded(self.other_app()), rows)
+        self.assertNotEqual(self.seeded(self.other_app(), seed_value=7)['products'], rows['products'])
+
+
+class WarmUpTestCase(AppTestCase):
+    def test_warm_up_precompiles_templates(self):
+        """Test that warm-up writes every template to the shared bytecode cache"""
+        cache_dir = self.temp_dir()
+        app, db = self.create_app(JINJA_CACHE_DIR=cache_dir)
+        warm_up(app)
+
+        templates = app.jinja_env.list_templates(extensions=['html'])
+        self.assertEqual(len(os.listdir(cache_dir)), len(templates))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+
+from support import AppTestCase
+
+
+class BulkProductActionsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = self.temp_dir()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+
+        from models import Product, ProductImage, Category, SiteSettings
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            self.category = Category(name='Fitness Course')
+            self.db.session.add(self.category)
+            for i in range(5):
+                self.db.session.add(Product(title=f'Product {i}', price_inr=100.0, active=True))
+            self.db.session.commit()
+            self.category_id = self.category.id
+            self.product_ids = [p.id for p in Product.query.order_by(Product.id)]
+
+            # One image on the first product, with a file on disk
+            image_path = os.path.join(self.upload_dir, 'p0.jpg')
+            with open(image_path, 'wb') as f:
+                f.write(b'jpeg')
+            self.db.session.add(ProductImage(product_id=self.product_ids[0], filename='p0.jpg'))
+            self.db.session.commit()
+
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+
+    def test_bulk_price_change_and_category(self):
+        """Test percentage price change and category move on selected products"""
+        from models import Product
+        selected = self.product_ids[:3]
+        self.client.post('/admin-pn/products/bulk', data={
+            'action': 'price_percent', 'amount': '-10', 'product_ids': selected})
+        self.client.post('/admin-pn/products/bulk', data={
+            'action': 'set_category', 'category_id': self.category_id, 'product_ids': selected})
+
+        with self.app.app_context():
+            for product in Product.query.all():
+                if product.id in selected:
+                    self.assertEqual(product.price_inr, 90.0)
+                    self.assertEqual(product.category_id, self.category_id)
+                else:
+                    self.assertEqual(product.price_inr, 100.0)
+                    self.assertIsNone(product.category_id)
+
+    def test_bulk_action_on_filter(self):
+        """Test predicate-based deactivation of everything matching the filter"""
+        from models import Product
+        self.client.post('/admin-pn/products/bulk', data={'action': 'deactivate', 'scope': 'filter'})
+
+        with self.app.app_context():
+            self.assertEqual(Product.query.filter_by(active=True).count(), 0)
+
+    def test_bulk_delete_queues_image_removal(self):
+        """Test bulk delete removes rows at once and image files in the background"""
+        import tasks
+        from datetime import datetime
+        from models import (Product, ProductImage, ProductPair, RelatedProduct, ProductTrend,
+                            StockReservation)
+        first, second, kept = self.product_ids[0], self.product_ids[1], self.product_ids[2]
+        with self.app.app_context():
+            self.db.session.add_all([
+                ProductPair(product_a=first, product_b=kept, orders=1),
+                ProductPair(product_a=kept, product_b=self.product_ids[3], orders=1),
+                RelatedProduct(product_id=kept, rank=0, related_id=second, score=1.0),
+                RelatedProduct(product_id=first, rank=0, related_id=kept, score=1.0),
+                RelatedProduct(product_id=kept, rank=1, related_id=self.product_ids[3], score=0.5),
+                ProductTrend(product_id=first, log_score=1.0),
+                ProductTrend(product_id=kept, log_score=1.0),
+                StockReservation(token='t', product_id=second, quantity=1, expires_at=datetime.utcnow()),
+            ])
+            self.db.session.commit()
+
+        self.client.post('/admin-pn/products/bulk', data={
+            'action': 'delete', 'product_ids': [first, second]})
+        tasks.drain()
+
+        with self.app.app_context():
+            self.assertEqual(Product.query.count(), 3)
+            self.assertEqual(ProductImage.query.count(), 0)
+            # Rows about the deleted products go with them
+            self.assertEqual(ProductPair.query.count(), 1)
+            self.assertEqual([(r.product_id, r.related_id) for r in RelatedProduct.query],
+                             [(kept, self.product_ids[3])])
+            self.assertEqual([t.product_id for t in ProductTrend.query], [kept])
+            self.assertEqual(StockReservation.query.count(), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, 'p0.jpg')))
+
+
+if __name__ == '__main__':
+    unittest.main()
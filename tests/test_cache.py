@@ -0,0 +1,77 @@
+import unittest
+
+from support import AppTestCase
+
+
+class FragmentCacheTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Category
+        with self.app.app_context():
+            self.db.session.add(SiteSettings(store_name='Cache Mart'))
+            self.db.session.add(Category(name='Fitness Course', is_active=True))
+            self.db.session.commit()
+
+    def count_queries(self, path):
+        from sqlalchemy import event
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = self.db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.app.test_client().get(path)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        return response, statements
+
+    def test_layout_categories_come_from_database_once(self):
+        """Test the nav dropdown lists DB categories without a query per page"""
+        response, statements = self.count_queries('/about')
+        self.assertIn(b'Fitness Course', response.data)
+        self.assertTrue(any('FROM categories' in s for s in statements))
+
+        response, statements = self.count_queries('/about')
+        self.assertIn(b'Fitness Course', response.data)
+        self.assertFalse(any('FROM categories' in s for s in statements))
+
+    def test_commit_invalidates_tagged_fragments(self):
+        """Test that editing settings or categories re-renders the layout"""
+        from models import SiteSettings, Category
+        client = self.app.test_client()
+        self.assertIn(b'Cache Mart', client.get('/about').data)
+
+        with self.app.app_context():
+            SiteSettings.query.first().store_name = 'Renamed Mart'
+            self.db.session.add(Category(name='Dating Course', is_active=True))
+            self.db.session.commit()
+
+        data = client.get('/about').data
+        self.assertIn(b'Renamed Mart', data)
+        self.assertIn(b'Dating Course', data)
+
+    def test_view_counters_do_not_invalidate(self):
+        """Test that product view counters leave the products tag alone"""
+        import cache
+        from models import Product
+        with self.app.app_context():
+            product = Product(title='Course', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.commit()
+            version = cache.tag_version('products')
+
+            product.views += 1
+            self.db.session.commit()
+            self.assertEqual(cache.tag_version('products'), version)
+
+            product.price_inr = 120.0
+            self.db.session.commit()
+            self.assertGreater(cache.tag_version('products'), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+
+from support import AppTestCase
+import catalog
+
+
+class CatalogSnapshotTestCase(AppTestCase):
+    config = {'WTF_CSRF_ENABLED': False}
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+        from models import SiteSettings, Product, Category
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            courses = Category(name='Courses')
+            hidden = Category(name='Hidden', is_active=False)
+            self.db.session.add_all([courses, hidden])
+            self.db.session.flush()
+            now = datetime.utcnow()
+            products = [
+                Product(title='Cheap Course', description='', price_inr=100.0, category_id=courses.id,
+                        created_at=now - timedelta(days=2)),
+                Product(title='Pricey Course', description='', price_inr=1000.0, category_id=courses.id,
+                        is_hot_product=True, created_at=now - timedelta(days=1)),
+                Product(title='Own Discount', description='', price_inr=500.0, discount_override=0,
+                        created_at=now),
+                Product(title='Retired Course', description='', price_inr=200.0, active=False),
+            ]
+            self.db.session.add_all(products)
+            self.db.session.commit()
+            self.ids = {product.title: product.id for product in products}
+            self.category_id, self.hidden_id = courses.id, hidden.id
+
+    def test_listings_and_indexes(self):
+        """Test listing orders, price filters and the category and hot indexes"""
+        with self.app.test_request_context():
+            snapshot = catalog.current()
+            titles = lambda products: [p.title for p in products]
+            products, listing = snapshot.listing(MultiDict())
+            self.assertEqual(titles(products), ['Own Discount', 'Pricey Course', 'Cheap Course'])
+            self.assertEqual(listing['sort'], 'newest')
+            products, _ = snapshot.listing(MultiDict({'sort': 'price_asc', 'max_price': '500'}))
+            self.assertEqual([(p.title, p.discounted_price) for p in products],
+                             [('Cheap Course', 60.0), ('Own Discount', 500.0)])
+            products, _ = snapshot.listing(MultiDict({'sort': 'price_desc'}), category_id=self.category_id)
+            self.assertEqual(titles(products), ['Pricey Course', 'Cheap Course'])
+
+            self.assertEqual(titles(snapshot.hot_products()), ['Pricey Course'])
+            self.assertEqual(titles(snapshot.hot_products(self.category_id)), ['Pricey Course'])
+            self.assertEqual([c.name for c in snapshot.categories], ['Courses'])
+            self.assertEqual(snapshot.category_counts[self.category_id], 2)
+            self.assertNotIn(self.ids['Retired Course'], snapshot.products)
+
+            with self.assertRaises(AttributeError):
+                snapshot.products[self.ids['Cheap Course']].title = 'Changed'
+            with self.assertRaises(TypeError):
+                snapshot.products[0] = None
+
+    def test_pages_read_the_snapshot(self):
+        """Test that storefront pages run no catalog queries once the snapshot is built"""
+        self.client.get('/')
+        statements = []
+
+        def record(conn, cursor, statement, *rest):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = self.db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.get(f'/category/{self.category_id}?sort=price_asc')
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        self.assertIn(b'Pricey Course', response.data)
+        self.assertFalse([s for s in statements if 'FROM products' in s or 'FROM categories' in s])
+
+        self.assertIn(b'2 products', self.client.get('/categories').data)
+        self.assertEqual(self.client.get(f'/category/{self.hidden_id}').status_code, 404)
+        self.assertEqual(self.client.get(f"/product/{self.ids['Retired Course']}").status_code, 302)
+        self.assertEqual(self.client.get('/product/9999').status_code, 404)
+
+    def test_rebuilt_and_swapped_on_change(self):
+        """Test that a commit builds a new snapshot while the old one stays intact"""
+        from models import Product
+        with self.app.app_context():
+            old = catalog.current()
+            self.assertIs(catalog.current(), old)
+            self.db.session.get(Product, self.ids['Cheap Course']).price_inr = 300.0
+            self.db.session.commit()
+            new = catalog.current()
+            self.assertIsNot(new, old)
+            self.assertEqual(new.products[self.ids['Cheap Course']].discounted_price, 180.0)
+            self.assertEqual(old.products[self.ids['Cheap Course']].discounted_price, 60.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import zipfile
+import os
+import io
+
+from support import AppTestCase
+
+
+class CatalogImportExportTestCase(AppTestCase):
+    config = {'WTF_CSRF_ENABLED': False}
+
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = self.temp_dir()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+
+        # Images zip with two small files
+        self.zip_path = os.path.join(self.temp_dir(), 'images.zip')
+        with zipfile.ZipFile(self.zip_path, 'w') as archive:
+            archive.writestr('photos/a.jpg', b'fake-jpeg-a')
+            archive.writestr('photos/b.png', b'fake-png-b')
+
+    def import_csv(self, text, **kwargs):
+        import catalog_io
+        return catalog_io.import_products(catalog_io.read_rows(io.StringIO(text), 'csv'),
+                                          upload_folder=self.upload_dir, **kwargs)
+
+    def test_import_validates_rows_and_creates_categories(self):
+        """Test that valid rows are inserted and invalid rows are reported"""
+        from models import Product, ProductImage, Category
+        csv_text = (
+            "title,price_inr,category,images,stock\n"
+            "Course A,499,Fitness Course,a.jpg;b.png,10\n"
+            ",199,Fitness Course,,\n"
+            "Course C,abc,,,\n"
+            "Course D,999,Business Course,,\n"
+            "Course E,inf,,,\n"
+            "Course F,999,,,1e999\n"
+        )
+        with self.app.app_context():
+            report = self.import_csv(csv_text, images=self.zip_path, chunk_size=2)
+
+            self.assertEqual(report.created, 2)
+            self.assertEqual(report.categories_created, 2)
+            self.assertEqual([line for line, _ in report.errors], [3, 4, 6, 7])
+            self.assertEqual(Product.query.count(), 2)
+            self.assertEqual(Category.query.count(), 2)
+
+            course_a = Product.query.filter_by(title='Course A').first()
+            self.assertEqual(course_a.stock, 10)
+            self.assertEqual(course_a.category.name, 'Fitness Course')
+            filenames = [img.filename for img in sorted(course_a.images, key=lambda i: i.position)]
+            self.assertEqual(len(filenames), 2)
+            for filename in filenames:
+                self.assertTrue(os.path.exists(os.path.join(self.upload_dir, filename)))
+            self.assertEqual(ProductImage.query.count(), 2)
+
+    def test_admin_import_reports_unreadable_files(self):
+        """Test that a malformed CSV is reported instead of failing the request"""
+        from models import Product
+        with self.app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['admin_logged_in'] = True
+            csv_bytes = b'title,price_inr,stock\nCourse A,1e999,\nCourse B,10,1e999\n' + b'x' * 200000 + b',1,\n'
+            response = client.post('/admin-pn/products/import', data={
+                'data_file': (io.BytesIO(csv_bytes), 'products.csv'),
+            }, content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'Could not read the catalog file: field larger than field limit', response.data)
+        with self.app.app_context():
+            self.assertEqual(Product.query.count(), 0)
+
+    def test_export_round_trip_updates_in_place(self):
+        """Test that an edited export re-imports as updates, keeping images"""
+        import catalog_io
+        from models import Product, ProductImage
+        with self.app.app_context():
+            self.import_csv("title,price_inr,images\nCourse A,499,a.jpg\n", images=self.zip_path)
+
+            exported = ''.join(catalog_io.export_products('csv'))
+            edited = exported.replace('499.0', '599.0')
+            report = self.import_csv(edited)
+
+            self.assertEqual(report.errors, [])
+            self.assertEqual(report.created, 0)
+            self.assertEqual(report.updated, 1)
+            self.assertEqual(Product.query.count(), 1)
+            self.assertEqual(Product.query.first().price_inr, 599.0)
+            self.assertEqual(ProductImage.query.count(), 1)
+
+    def test_admin_export_streams_jsonl(self):
+        """Test the admin JSONL export endpoint"""
+        with self.app.app_context():
+            self.import_csv("title,price_inr\nCourse A,499\nCourse B,299\n")
+
+        with self.app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['admin_logged_in'] = True
+            response = client.get('/admin-pn/export/products.jsonl')
+            self.assertEqual(response.status_code, 200)
+            lines = response.get_data(as_text=True).strip().splitlines()
+            self.assertEqual(len(lines), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
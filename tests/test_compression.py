@@ -0,0 +1,93 @@
+import unittest
+import gzip
+import zlib
+
+from compression import CompressionMiddleware, negotiate
+
+from support import AppTestCase
+
+GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+
+class CompressionTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from flask import Response
+        rows = [f'{i},customer{i}@example.com,{i * 10}\n' for i in range(2000)]
+
+        @self.app.route('/_test/export.csv')
+        def export():
+            return Response((row for row in rows), mimetype='text/csv')
+
+        @self.app.route('/_test/tiny.json')
+        def tiny():
+            return {'ok': True}
+
+        @self.app.route('/_test/image.png')
+        def image():
+            return Response(b'\x89PNG' + b'\x00' * 5000, mimetype='image/png')
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            self.db.session.add_all([
+                Product(title=f'Course {i}', description='A long course description ' * 5, price_inr=100.0 + i)
+                for i in range(30)
+            ])
+            self.db.session.commit()
+        self.client = self.app.test_client()
+        self.rows = rows
+
+    def test_negotiation(self):
+        """Test Accept-Encoding parsing with q-values and wildcards"""
+        self.assertEqual(negotiate('gzip, deflate, br', brotli_available=True), 'br')
+        self.assertEqual(negotiate('gzip, deflate, br', brotli_available=False), 'gzip')
+        self.assertEqual(negotiate('br;q=0.5, gzip', brotli_available=True), 'gzip')
+        self.assertEqual(negotiate('gzip;q=0, identity'), None)
+        self.assertEqual(negotiate('*', brotli_available=False), 'gzip')
+        self.assertEqual(negotiate(''), None)
+
+    def test_html_page_is_gzipped_with_vary(self):
+        """Test that a large page is compressed and cache variants are separated"""
+        plain = self.client.get('/')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        response = self.client.get('/', headers=GZIP)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('Cookie', response.headers['Vary'])
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertLess(len(response.data), len(plain.data) / 3)
+        self.assertIn(b'Course 29', gzip.decompress(response.data))
+
+    def test_small_and_binary_responses_are_untouched(self):
+        """Test the size threshold and that images are never compressed"""
+        self.assertNotIn('Content-Encoding', self.client.get('/_test/tiny.json', headers=GZIP).headers)
+        image = self.client.get('/_test/image.png', headers=GZIP)
+        self.assertNotIn('Content-Encoding', image.headers)
+        self.assertNotIn('Vary', image.headers)
+
+    def test_streamed_response_is_compressed_incrementally(self):
+        """Test that a streamed CSV is compressed without buffering the whole body"""
+        response = self.client.get('/_test/export.csv', headers=GZIP)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(gzip.decompress(response.data).decode(), ''.join(self.rows))
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/csv')])
+            return (row.encode() for row in self.rows)
+
+        middleware = CompressionMiddleware(app, stream_flush_bytes=4096)
+        body = middleware({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}, lambda status, headers: None)
+        decoder = zlib.decompressobj(31)
+        pieces = [decoder.decompress(chunk) for chunk in body]
+        # Output arrives in several decodable pieces, not one block at the end
+        self.assertGreater(sum(1 for piece in pieces if piece), 5)
+        self.assertEqual(b''.join(pieces).decode(), ''.join(self.rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
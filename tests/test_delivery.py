@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import os
+
+from support import AppTestCase
+
+
+class FileDeliveryTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.image = os.urandom(4096)
+
+    def make_app(self, mode):
+        app, _ = self.create_app(FILE_DELIVERY=mode)
+        upload_folder = os.path.join(app.static_folder, 'uploads')
+        os.makedirs(upload_folder, exist_ok=True)
+        handle, path = tempfile.mkstemp(prefix='test_delivery_', suffix='.jpg', dir=upload_folder)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self.image)
+        self.addCleanup(os.remove, path)
+        return app, os.path.basename(path)
+
+    def test_sendfile_serves_ranges(self):
+        """Test that the default mode sends the file from Python with Range support"""
+        app, name = self.make_app('sendfile')
+        client = app.test_client()
+        response = client.get(f'/static/uploads/{name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.image)
+        self.assertEqual(response.cache_control.max_age, app.config['UPLOAD_MAX_AGE'])
+        response.close()
+
+        response = client.get(f'/static/uploads/{name}', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.image[100:200])
+        response.close()
+
+    def test_x_accel_redirect_hands_the_file_to_nginx(self):
+        """Test that nginx mode answers with an internal redirect and no body"""
+        app, name = self.make_app('x-accel-redirect')
+        client = app.test_client()
+        response = client.get(f'/static/uploads/{name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'], f'/_protected/static/uploads/{name}')
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertEqual(response.data, b'')
+
+        self.assertEqual(client.get('/static/uploads/missing.jpg').status_code, 404)
+        self.assertEqual(client.get('/static/../app.py').status_code, 404)
+
+    def test_x_sendfile_sets_header(self):
+        """Test that Apache mode sets X-Sendfile to the file's path"""
+        app, name = self.make_app('x-sendfile')
+        response = app.test_client().get(f'/static/uploads/{name}')
+        self.assertEqual(response.headers['X-Sendfile'], os.path.join(app.static_folder, 'uploads', name))
+        response.close()
+
+    def test_handed_off_text_files_are_not_compressed(self):
+        """Test that a CSS file handed to the web server is sent uncompressed with its header intact"""
+        for mode, header in (('x-sendfile', 'X-Sendfile'), ('x-accel-redirect', 'X-Accel-Redirect')):
+            with self.subTest(mode=mode):
+                app, _ = self.make_app(mode)
+                response = app.test_client().get('/static/css/style.css', headers={'Accept-Encoding': 'gzip'})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(header, response.headers)
+                self.assertNotIn('Content-Encoding', response.headers)
+                self.assertEqual(response.data, b'')
+                response.close()
+
+    def test_upload_url(self):
+        """Test that image URLs follow UPLOAD_URL when a CDN is configured"""
+        import delivery
+        app, _ = self.make_app('sendfile')
+        with app.test_request_context():
+            self.assertEqual(delivery.upload_url('1_a b.jpg'), '/static/uploads/1_a%20b.jpg')
+            app.config['UPLOAD_URL'] = 'https://cdn.example.com/uploads/'
+            self.assertEqual(delivery.upload_url('1_a.jpg'), 'https://cdn.example.com/uploads/1_a.jpg')
+
+    def test_unknown_mode_is_rejected(self):
+        """Test that a misspelt FILE_DELIVERY fails at startup"""
+        with self.assertRaises(ValueError):
+            self.create_app(FILE_DELIVERY='nginx')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+from support import AppTestCase
+
+
+class FacetedBrowseTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Product, Category
+        with self.app.app_context():
+            self.db.session.add(SiteSettings(global_discount_percent=0.0))
+            fitness = Category(name='Fitness Course')
+            dating = Category(name='Dating Course')
+            self.db.session.add_all([fitness, dating])
+            self.db.session.add_all([
+                Product(title='Gym Basics', description='', price_inr=300.0, category=fitness, stock=0),
+                Product(title='Gym Pro', description='', price_inr=1500.0, category=fitness, featured=True),
+                Product(title='Texting 101', description='', price_inr=400.0, category=dating,
+                        per_product_discount=10.0),
+                Product(title='Retired', description='', price_inr=100.0, category=dating, active=False),
+            ])
+            self.db.session.commit()
+            self.fitness_id, self.dating_id = fitness.id, dating.id
+
+    def test_counts_are_disjunctive_and_from_one_query(self):
+        """Test facet counts apply the other groups' filters but not their own"""
+        import facets
+        from sqlalchemy import event
+        state = facets.BrowseState(categories=[self.fitness_id], prices=['0-500'])
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            event.listen(self.db.engine, 'before_cursor_execute', record)
+            try:
+                counts = facets.facet_counts(state, [(self.fitness_id, ''), (self.dating_id, '')])
+            finally:
+                event.remove(self.db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(counts['total'], 1)
+        self.assertEqual(counts['categories'], {self.fitness_id: 1, self.dating_id: 1})
+        self.assertEqual(counts['prices'], {'0-500': 1, '500-1000': 0, '1000-2000': 1, '2000-': 0})
+        self.assertEqual(counts['flags'], {'discounted': 0, 'in_stock': 0, 'featured': 0, 'hot': 0})
+
+    def test_extra_discount_beats_the_global_discount(self):
+        """Test that only products priced below the store-wide discount count as discounted"""
+        import facets
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            state = facets.BrowseState(flags=['discounted'])
+            self.assertEqual([p.title for p in facets.browse(state)['products']], ['Texting 101'])
+
+            SiteSettings.query.first().global_discount_percent = 40.0
+            Product.query.filter_by(title='Gym Pro').first().discount_override = 50.0
+            self.db.session.commit()
+            result = facets.browse(state)
+            # Texting 101's own 10% is now less than the 40% everything else gets
+            self.assertEqual([p.title for p in result['products']], ['Gym Pro'])
+            self.assertEqual(result['counts']['flags']['discounted'], 1)
+
+            # Prices whose discounted value sits on a rounding boundary get no extra discount
+            SiteSettings.query.first().global_discount_percent = 10.0
+            self.db.session.add_all([Product(title='Boundary A', description='', price_inr=2.05),
+                                     Product(title='Boundary B', description='', price_inr=6.25)])
+            self.db.session.commit()
+            self.assertEqual([p.title for p in facets.browse(state)['products']], ['Gym Pro'])
+
+    def test_browse_page_filters_and_caches_by_catalog_version(self):
+        from models import Product
+        client = self.app.test_client()
+        url = f'/browse?category={self.fitness_id}&in_stock=1'
+        data = client.get(url).get_data(as_text=True)
+        self.assertIn('Gym Pro', data)
+        self.assertNotIn('Gym Basics', data)
+        self.assertNotIn('Texting 101', data)
+        self.assertIn('1 products', data)
+
+        # Served from the fragment cache until the catalog changes
+        with self.app.app_context():
+            self.db.session.execute(self.db.text("UPDATE products SET title = 'Sneaky' WHERE title = 'Gym Pro'"))
+            self.db.session.commit()
+        self.assertIn('Gym Pro', client.get(url).get_data(as_text=True))
+
+        with self.app.app_context():
+            Product.query.filter_by(title='Gym Basics').first().stock = 5
+            self.db.session.commit()
+        data = client.get(url).get_data(as_text=True)
+        self.assertIn('Gym Basics', data)
+        self.assertIn('Sneaky', data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import threading
+from datetime import datetime, timedelta
+
+from support import AppTestCase
+
+
+class InventoryTestCase(AppTestCase):
+    config = {'WTF_CSRF_ENABLED': False}
+
+    def setUp(self):
+        super().setUp()
+        self.app.config['STOCK_SWEEP_SECONDS'] = 3600
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            limited = Product(title='Limited', description='', price_inr=100.0, stock=3)
+            unlimited = Product(title='Unlimited', description='', price_inr=50.0)
+            self.db.session.add_all([limited, unlimited])
+            self.db.session.commit()
+            self.limited_id, self.unlimited_id = limited.id, unlimited.id
+
+    def tearDown(self):
+        import tasks
+        tasks.drain()
+
+    def stock(self):
+        from models import Product
+        with self.app.app_context():
+            return self.db.session.get(Product, self.limited_id).stock
+
+    def test_take_stock_never_oversells_under_concurrency(self):
+        """Test that parallel conditional decrements sell exactly the available units"""
+        import inventory
+        sold, refused = [], []
+
+        def buy():
+            with self.app.app_context():
+                try:
+                    inventory.take_stock(self.limited_id, 1)
+                    self.db.session.commit()
+                    sold.append(1)
+                except inventory.InsufficientStock:
+                    self.db.session.rollback()
+                    refused.append(1)
+                finally:
+                    self.db.session.remove()
+
+        threads = [threading.Thread(target=buy) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(sold), len(refused)), (3, 5))
+        self.assertEqual(self.stock(), 0)
+
+    def test_reservation_adjusts_and_expires(self):
+        """Test that re-reserving takes only the difference and the sweeper returns expired holds"""
+        import inventory
+        from models import StockReservation
+        cart = [{'product_id': self.limited_id, 'quantity': 2}, {'product_id': self.unlimited_id, 'quantity': 5}]
+        with self.app.test_request_context():
+            inventory.reserve_cart('tok', cart)
+            self.db.session.commit()
+            self.assertEqual(StockReservation.query.count(), 1)  # untracked product is not held
+        self.assertEqual(self.stock(), 1)
+
+        with self.app.test_request_context():
+            inventory.reserve_cart('tok', [{'product_id': self.limited_id, 'quantity': 1}])
+            self.db.session.commit()
+            with self.assertRaises(inventory.InsufficientStock):
+                inventory.reserve_cart('other', [{'product_id': self.limited_id, 'quantity': 3}])
+            self.db.session.rollback()
+        self.assertEqual(self.stock(), 2)
+
+        with self.app.app_context():
+            self.assertEqual(inventory.release_expired(now=datetime.utcnow()), 0)
+            self.assertEqual(inventory.release_expired(now=datetime.utcnow() + timedelta(minutes=16)), 1)
+            self.assertEqual(StockReservation.query.count(), 0)
+        self.assertEqual(self.stock(), 3)
+
+    def test_checkout_takes_stock_and_refuses_when_sold_out(self):
+        """Test that placing an order consumes the hold and a later buyer cannot oversell"""
+        from models import Lead, StockReservation
+        form = {'full_name': 'Test User', 'email': 'test@example.com', 'phone_number': '1234567890'}
+        buyer, rival = self.app.test_client(), self.app.test_client()
+        for client, quantity in ((buyer, 2), (rival, 2)):
+            client.post('/cart/add', data={'product_id': self.limited_id, 'quantity': quantity})
+
+        self.assertEqual(buyer.get('/checkout').status_code, 200)
+        self.assertEqual(self.stock(), 1)
+        # Only one unit is left, so the rival cannot even start checkout
+        response = rival.get('/checkout')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/cart', response.headers['Location'])
+
+        response = buyer.post('/checkout', data=form)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), 1)
+        with self.app.app_context():
+            self.assertEqual(StockReservation.query.count(), 0)
+            self.assertEqual(Lead.query.count(), 1)
+
+        # Posting without a hold takes stock directly and rolls back the whole order on shortfall
+        response = rival.post('/checkout', data=form)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stock(), 1)
+        with self.app.app_context():
+            self.assertEqual(Lead.query.count(), 1)
+
+    def test_expired_reservation_does_not_block_add_to_cart(self):
+        """Test that an abandoned checkout's expired hold is released when the next shopper adds the item"""
+        import inventory
+        with self.app.test_request_context():
+            inventory.reserve_cart('abandoned', [{'product_id': self.limited_id, 'quantity': 3}],
+                                   now=datetime.utcnow() - timedelta(hours=1))
+            self.db.session.commit()
+        self.assertEqual(self.stock(), 0)
+
+        client = self.app.test_client()
+        client.post('/cart/add', data={'product_id': self.limited_id, 'quantity': 2})
+        with client.session_transaction() as sess:
+            self.assertEqual(sess['cart'], [{'product_id': self.limited_id, 'quantity': 2}])
+        self.assertEqual(self.stock(), 3)
+
+    def test_stock_movements_keep_catalog_caches(self):
+        """Test that holding stock at checkout bumps only the stock tag and pages show fresh stock"""
+        import cache
+        client = self.app.test_client()
+        client.post('/cart/add', data={'product_id': self.limited_id, 'quantity': 2})
+        with self.app.app_context():
+            before = cache.tag_versions(('products', 'stock'))
+
+        self.assertEqual(client.get('/checkout').status_code, 200)
+        self.assertEqual(self.stock(), 1)
+        with self.app.app_context():
+            after = cache.tag_versions(('products', 'stock'))
+        self.assertEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+        response = client.get(f'/product/{self.limited_id}')
+        self.assertIn(b'1 available', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
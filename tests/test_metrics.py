@@ -0,0 +1,96 @@
+import unittest
+import subprocess
+import sys
+import os
+
+from support import AppTestCase
+import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample(name, **labels):
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@unittest.skipIf(metrics.prometheus_client is None, 'prometheus_client is not installed')
+class MetricsTestCase(AppTestCase):
+    config = {'WTF_CSRF_ENABLED': False, 'METRICS_TOKEN': 'scrape-secret'}
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Metered Course', description='', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.commit()
+            self.product_id = product.id
+
+    def scrape(self):
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True)
+
+    def test_endpoint_is_protected(self):
+        """Test that /metrics needs the bearer token or an admin session"""
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 401)
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_requests_and_queries_are_counted(self):
+        """Test request latency, status and database metrics for a page view"""
+        labels = dict(endpoint='main.index', method='GET', status='200')
+        requests_before = sample('baign_mart_http_requests_total', **labels)
+        queries_before = sample('baign_mart_db_queries_total', bind='primary')
+        checkouts_before = sample('baign_mart_db_pool_checkouts_total', bind='primary')
+
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+        self.assertEqual(sample('baign_mart_http_requests_total', **labels), requests_before + 1)
+        self.assertGreater(sample('baign_mart_db_queries_total', bind='primary'), queries_before)
+        self.assertGreater(sample('baign_mart_db_pool_checkouts_total', bind='primary'), checkouts_before)
+        self.assertEqual(sample('baign_mart_db_pool_connections_in_use', bind='primary'), 0)
+        text = self.scrape()
+        self.assertIn('baign_mart_http_request_duration_seconds_bucket{endpoint="main.index"', text)
+        self.assertIn('baign_mart_db_pool_wait_seconds_count{bind="primary"}', text)
+
+    def test_cache_lookups(self):
+        """Test that named caches report hits and misses"""
+        from cache import LRUCache
+        store = LRUCache(4, name='unit')
+        store.get('a')
+        store.set('a', 1)
+        store.get('a')
+        store.get('a')
+        self.assertEqual(sample('baign_mart_cache_lookups_total', cache='unit', result='miss'), 1)
+        self.assertEqual(sample('baign_mart_cache_lookups_total', cache='unit', result='hit'), 2)
+
+    def test_checkout_outcomes(self):
+        """Test that rejected checkout submissions are counted"""
+        before = sample('baign_mart_checkouts_total', outcome='invalid')
+        with self.client.session_transaction() as sess:
+            sess['cart'] = [{'product_id': self.product_id, 'quantity': 1}]
+        self.client.post('/checkout', data={'full_name': ''})
+        self.assertEqual(sample('baign_mart_checkouts_total', outcome='invalid'), before + 1)
+
+    def test_workers_are_merged_in_multiprocess_mode(self):
+        """Test that samples written by separate processes are summed on scrape"""
+        directory = self.temp_dir()
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+        worker = "import metrics; metrics.checkout('placed')"
+        for _ in range(2):
+            subprocess.run([sys.executable, '-c', worker], cwd=ROOT, env=env, check=True)
+        output = subprocess.run([sys.executable, '-c', "import metrics; print(metrics.render().decode())"],
+                                cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        self.assertIn('baign_mart_checkouts_total{outcome="placed"} 2.0', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+from support import AppTestCase
+
+
+class EffectivePriceTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings(global_discount_percent=50.0))
+            self.db.session.commit()
+            products = [
+                Product(title='Cheap', description='', price_inr=200.0),
+                Product(title='Override', description='', price_inr=1000.0, discount_override=10.0),
+                Product(title='Pricey', description='', price_inr=3000.0),
+            ]
+            self.db.session.add_all(products)
+            self.db.session.commit()
+            self.ids = {p.title: p.id for p in products}
+
+    def prices(self):
+        from models import Product
+        with self.app.app_context():
+            return {p.title: p.effective_price for p in Product.query}
+
+    def test_maintained_on_save_and_global_discount_change(self):
+        from models import Product, SiteSettings
+        self.assertEqual(self.prices(), {'Cheap': 100.0, 'Override': 900.0, 'Pricey': 1500.0})
+
+        with self.app.app_context():
+            self.db.session.get(Product, self.ids['Cheap']).per_product_discount = 25.0
+            self.db.session.commit()
+            SiteSettings.query.first().global_discount_percent = 20.0
+            self.db.session.commit()
+        self.assertEqual(self.prices(), {'Cheap': 150.0, 'Override': 900.0, 'Pricey': 2400.0})
+
+        # Each product's effective price matches what the pages display
+        with self.app.app_context():
+            for product in Product.query:
+                self.assertEqual(product.effective_price, product.get_discounted_price(20.0))
+
+    def test_saves_and_sql_repricing_round_alike(self):
+        """Test that per-save and global repricing store the same value on rounding boundaries"""
+        from models import Product, SiteSettings
+        with self.app.app_context():
+            SiteSettings.query.first().global_discount_percent = 10.0
+            self.db.session.commit()
+            self.db.session.add_all([Product(title='Boundary A', description='', price_inr=2.05),
+                                     Product(title='Boundary B', description='', price_inr=6.25)])
+            self.db.session.commit()
+        saved = self.prices()
+        self.assertEqual((saved['Boundary A'], saved['Boundary B']), (1.85, 5.63))
+
+        with self.app.app_context():
+            SiteSettings.query.first().global_discount_percent = 40.0
+            self.db.session.commit()
+            SiteSettings.query.first().global_discount_percent = 10.0
+            self.db.session.commit()
+        self.assertEqual(self.prices(), saved)
+
+    def test_bulk_actions_reprice_in_the_same_update(self):
+        from admin import apply_bulk_action
+        from models import Product
+        with self.app.app_context():
+            apply_bulk_action(Product.query, 'price_percent', amount=10)
+            apply_bulk_action(Product.query.filter_by(title='Pricey'), 'set_discount', amount=0)
+            apply_bulk_action(Product.query.filter_by(title='Override'), 'clear_discount')
+            self.db.session.commit()
+        self.assertEqual(self.prices(), {'Cheap': 110.0, 'Override': 550.0, 'Pricey': 3300.0})
+
+    def test_listing_sort_and_range_in_sql(self):
+        client = self.app.test_client()
+        data = client.get('/?sort=price_desc').get_data(as_text=True)
+        self.assertLess(data.index('Pricey'), data.index('Override'))
+        self.assertLess(data.index('Override'), data.index('Cheap'))
+
+        data = client.get('/?sort=price_asc&min_price=150&max_price=1000').get_data(as_text=True)
+        self.assertIn('Override', data)
+        self.assertNotIn('Cheap', data)
+        self.assertNotIn('Pricey', data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import cProfile
+import pstats
+
+from support import AppTestCase
+import profiling
+
+
+def _inner():
+    return sum(range(20000))
+
+
+def _outer():
+    return [_inner() for _ in range(5)]
+
+
+class ProfilingTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.folder = self.temp_dir()
+        self.app.config['PROFILE_DIR'] = self.folder
+        self.client = self.app.test_client()
+
+        from models import SiteSettings
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            self.db.session.commit()
+
+    def login(self):
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+
+    def stored(self):
+        with self.app.app_context():
+            return profiling.list_profiles()
+
+    def test_only_admins_can_trigger(self):
+        """Test that the query flag is ignored for visitors"""
+        self.client.get('/?_profile=1')
+        self.assertEqual(self.stored(), [])
+
+        self.login()
+        self.assertEqual(self.client.get('/?_profile=1').status_code, 200)
+        self.client.get('/', headers={'X-Profile': '1'})
+        profiles = self.stored()
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(profiles[0]['endpoint'], 'main.index')
+        self.assertEqual(profiles[0]['status'], 200)
+        self.assertEqual({profile['trigger'] for profile in profiles}, {'admin'})
+
+    def test_profile_pages(self):
+        """Test the top-N view, collapsed stacks and raw download"""
+        self.login()
+        self.client.get('/?_profile=1')
+        name = self.stored()[0]['name']
+
+        response = self.client.get('/admin-pn/profiles')
+        self.assertIn(name.encode(), response.data)
+        response = self.client.get(f'/admin-pn/profiles/{name}?limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'index (main.py:', response.data)
+
+        response = self.client.get(f'/admin-pn/profiles/{name}/collapsed')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertTrue(any('index (main.py:' in line for line in lines))
+
+        response = self.client.get(f'/admin-pn/profiles/{name}/download')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        self.assertEqual(self.client.get('/admin-pn/profiles/../secret').status_code, 404)
+
+        self.client.post(f'/admin-pn/profiles/{name}/delete')
+        self.assertEqual(self.stored(), [])
+
+    def test_streamed_body_is_profiled(self):
+        """Test that a streamed page's profile includes the rows rendered while the body streams"""
+        self.login()
+        response = self.client.get('/admin-pn/leads?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Admin Panel', response.data)
+        response.close()  # As the WSGI server does once the body is sent
+        profiles = self.stored()
+        self.assertEqual([profile['endpoint'] for profile in profiles], ['admin.leads'])
+        with self.app.app_context():
+            _, stats = profiling.load(profiles[0]['name'])
+        self.assertIn('iter_leads', {name for _, _, name in stats.stats})
+        # The next request can be profiled again
+        self.client.get('/?_profile=1')
+        self.assertEqual(len(self.stored()), 2)
+
+    def test_sampling_and_disk_bound(self):
+        """Test 1-in-N sampling of a chosen endpoint and pruning of old profiles"""
+        self.app.config['PROFILE_MAX_FILES'] = 2
+        self.login()
+        self.client.post('/admin-pn/profiles', data={'endpoint': 'main.index', 'every': '1'})
+        visitor = self.app.test_client()
+        for _ in range(3):
+            visitor.get('/')
+        visitor.get('/categories')
+        profiles = self.stored()
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual({(profile['endpoint'], profile['trigger']) for profile in profiles},
+                         {('main.index', 'sampled')})
+
+        self.client.post('/admin-pn/profiles', data={'endpoint': ''})
+        with self.app.app_context():
+            self.assertIsNone(profiling.get_sampling())
+
+    def test_collapsed_stacks_follow_calls(self):
+        """Test that folded stacks nest callees under their callers"""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        _outer()
+        profiler.disable()
+        lines = profiling.collapsed_stacks(pstats.Stats(profiler))
+        nested = [line for line in lines if '_outer (test_profiling.py' in line and '_inner (test_profiling.py' in line]
+        self.assertTrue(nested)
+        self.assertLess(nested[0].index('_outer'), nested[0].index('_inner'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+from sqlalchemy import event
+
+from support import AppTestCase
+import queries
+
+
+class QueryCacheTestCase(AppTestCase):
+    config = {'WTF_CSRF_ENABLED': False}
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Cached Course', description='', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.commit()
+            self.product_id = product.id
+
+    def count_queries(self, func, *args):
+        statements = []
+
+        def record(conn, cursor, statement, *rest):
+            statements.append(statement)
+
+        engine = self.db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            return func(*args), len(statements)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+
+    def test_repeated_lookups_skip_the_database(self):
+        """Test that a cached product is served without queries until it changes"""
+        from models import Product, ProductImage
+        with self.app.app_context():
+            product, count = self.count_queries(queries.product, self.product_id)
+            self.assertEqual(product.title, 'Cached Course')
+            self.assertGreater(count, 0)
+            again, count = self.count_queries(queries.product, self.product_id)
+            self.assertIs(again, product)
+            self.assertEqual(count, 0)
+
+            self.db.session.add(ProductImage(product_id=self.product_id, filename='a.jpg'))
+            self.db.session.commit()
+            product = queries.product(self.product_id)
+            self.assertEqual(product.get_first_image().filename, 'a.jpg')
+
+            self.db.session.get(Product, self.product_id).title = 'Renamed Course'
+            self.db.session.commit()
+            self.assertEqual(queries.product(self.product_id).title, 'Renamed Course')
+
+    def test_records_are_read_only(self):
+        """Test that cached values cannot be modified by a caller"""
+        with self.app.app_context():
+            product = queries.product(self.product_id)
+            with self.assertRaises(AttributeError):
+                product.title = 'Changed'
+            with self.assertRaises(AttributeError):
+                queries.site_settings().store_name = 'Changed'
+            self.assertEqual(product.get_discounted_price(40.0), 60.0)
+
+    def test_view_counter_keeps_the_cache(self):
+        """Test that product page views update the counter without invalidating entries"""
+        from models import Product
+        self.client.get(f'/product/{self.product_id}')
+        with self.app.app_context():
+            cached = queries.product(self.product_id)
+        response = self.client.get(f'/product/{self.product_id}')
+        self.assertIn(b'Views:</span> 2', response.data)
+        with self.app.app_context():
+            self.assertIs(queries.product(self.product_id), cached)
+            self.assertEqual(self.db.session.get(Product, self.product_id).views, 2)
+
+    def test_settings_follow_commits(self):
+        """Test that a settings change is seen on the next lookup"""
+        from models import SiteSettings
+        with self.app.app_context():
+            self.assertEqual(queries.site_settings().store_name, 'Baign Mart')
+            SiteSettings.query.first().store_name = 'New Name'
+            self.db.session.commit()
+            self.assertEqual(queries.site_settings().store_name, 'New Name')
+
+    def test_disabled(self):
+        """Test that QUERY_CACHE_ENABLED=False always queries"""
+        self.app.config['QUERY_CACHE_ENABLED'] = False
+        with self.app.app_context():
+            queries.site_settings()
+            _, count = self.count_queries(queries.site_settings)
+            self.assertGreater(count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import json
+
+from support import AppTestCase
+
+
+class RelatedProductsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Product, Category
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            fitness = Category(name='Fitness Course')
+            dating = Category(name='Dating Course')
+            self.db.session.add_all([fitness, dating])
+            self.db.session.flush()
+            products = [
+                Product(title='Gym', description='', price_inr=100.0, category=fitness),
+                Product(title='Diet', description='', price_inr=100.0, category=fitness, views=10),
+                Product(title='Yoga', description='', price_inr=100.0, category=fitness),
+                Product(title='Texting', description='', price_inr=100.0, category=dating),
+                Product(title='Hidden', description='', price_inr=100.0, category=dating, active=False),
+            ]
+            self.db.session.add_all(products)
+            self.db.session.commit()
+            self.ids = {p.title: p.id for p in products}
+
+    def add_lead(self, *titles):
+        from models import Lead
+        items = [{'product_id': self.ids[t], 'quantity': 1} for t in titles]
+        with self.app.app_context():
+            lead = Lead(order_id=f'ORD{Lead.query.count()}', full_name='A', email='a@example.com',
+                        phone_number='1234567890', products_json=json.dumps(items), total_amount=1)
+            self.db.session.add(lead)
+            self.db.session.commit()
+        return items
+
+    def related_titles(self, title):
+        import related
+        with self.app.app_context():
+            return [p.title for p in related.related_products(self.ids[title])]
+
+    def test_rebuild_ranks_co_purchases_then_category(self):
+        """Test that co-purchased products outrank same-category ones, inactive ones are skipped"""
+        import related
+        self.add_lead('Gym', 'Texting')
+        self.add_lead('Gym', 'Texting', 'Hidden')
+        with self.app.app_context():
+            pairs, products = related.rebuild_all()
+        self.assertEqual((pairs, products), (3, 5))
+        self.assertEqual(self.related_titles('Gym'), ['Texting', 'Diet', 'Yoga'])
+        self.assertEqual(self.related_titles('Yoga'), ['Diet', 'Gym'])
+
+    def test_new_lead_updates_incrementally(self):
+        """Test that a lead updates its products' lists without a rebuild"""
+        import related
+        import tasks
+        with self.app.app_context():
+            related.rebuild_all()
+        self.assertEqual(self.related_titles('Texting'), [])
+
+        items = self.add_lead('Texting', 'Yoga')
+        related.record_lead(self.app, items)
+        tasks.drain()
+        self.assertEqual(self.related_titles('Texting'), ['Yoga'])
+        self.assertEqual(self.related_titles('Yoga')[0], 'Texting')
+
+    def test_detail_page_shows_related_products(self):
+        import related
+        self.add_lead('Gym', 'Texting')
+        with self.app.app_context():
+            related.rebuild_all()
+        response = self.app.test_client().get(f"/product/{self.ids['Gym']}")
+        self.assertIn(b'Related Products', response.data)
+        self.assertIn(b'Texting', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import tempfile
+import time
+import os
+
+from support import AppTestCase
+
+
+class ReplicaRoutingTestCase(AppTestCase):
+    def setUp(self):
+        from models import db
+        replica_fd, replica_path = tempfile.mkstemp()
+        os.close(replica_fd)
+        self.addCleanup(os.unlink, replica_path)
+        # The bind's (empty) metadata is registered on the shared db; later apps have no replica
+        self.addCleanup(db.metadatas.pop, 'replica', None)
+        self.config = {'DATABASE_REPLICA_URL': f'sqlite:///{replica_path}'}
+        super().setUp()
+        self.app.config['FRAGMENT_CACHE_ENABLED'] = False
+        self.version_dir = self.app.config['CACHE_VERSION_DIR']
+
+        import replica
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Original Title', description='', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.commit()
+            self.product_id = product.id
+            replica.sync_sqlite_replica()
+            # The primary moves on without the replica seeing it (no cache tag bump either)
+            self.db.session.execute(self.db.text("UPDATE products SET title = 'Primary Title'"))
+            self.db.session.commit()
+        self.age_catalog()
+
+    def age_catalog(self):
+        """Make every catalog change look older than the stickiness window"""
+        past = time.time() - 60
+        for name in os.listdir(self.version_dir):
+            os.utime(os.path.join(self.version_dir, name), (past, past))
+
+    def test_storefront_reads_replica_but_writers_stick_to_primary(self):
+        """Test that listings read the replica until the visitor writes something"""
+        client = self.app.test_client()
+        self.assertIn(b'Original Title', client.get('/browse').data)
+        # Pages outside the read-only list always use the primary
+        self.assertIn(b'Primary Title', client.get(f'/product/{self.product_id}').data)
+
+        client.post('/cart/add', data={'product_id': self.product_id, 'quantity': 1})
+        self.assertIn(b'Primary Title', client.get('/browse').data)
+        # Other visitors still read the replica
+        self.assertIn(b'Original Title', self.app.test_client().get('/browse').data)
+
+    def test_catalog_snapshot_is_read_from_primary(self):
+        """Test that the storefront snapshot never holds replica data"""
+        self.assertIn(b'Primary Title', self.app.test_client().get('/').data)
+
+    def test_recent_catalog_change_routes_everyone_to_primary(self):
+        """Test that a committed catalog edit is read from the primary during the window"""
+        from models import Product
+        with self.app.app_context():
+            self.db.session.get(Product, self.product_id).price_inr = 120.0
+            self.db.session.commit()
+        self.assertIn(b'Primary Title', self.app.test_client().get('/').data)
+
+    def test_writes_and_later_reads_use_primary(self):
+        """Test that DML goes to the primary and pins the rest of the request there"""
+        from flask import g
+        from sqlalchemy import select, update
+        from models import Product
+        with self.app.test_request_context():
+            g.db_replica = True
+            primary, replica = self.db.engines[None], self.db.engines['replica']
+            self.assertIs(self.db.session.get_bind(clause=select(Product)), replica)
+            self.assertIs(self.db.session.get_bind(clause=update(Product)), primary)
+            self.assertIs(self.db.session.get_bind(clause=select(Product)), primary)
+
+
+if __name__ == '__main__':
+    unittest.main()
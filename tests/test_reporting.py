@@ -0,0 +1,90 @@
+import unittest
+import json
+from datetime import date, datetime
+from unittest import mock
+
+from support import AppTestCase
+
+
+class ReportingTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Product, Category, Lead
+        with self.app.app_context():
+            self.db.session.add(SiteSettings(global_discount_percent=0.0))
+            fitness = Category(name='Fitness Course')
+            self.db.session.add(fitness)
+            gym = Product(title='Gym', description='', price_inr=100.0, category=fitness, views=40, add_to_cart_count=10)
+            diet = Product(title='Diet', description='', price_inr=300.0)
+            self.db.session.add_all([gym, diet])
+            self.db.session.commit()
+            self.gym, self.diet = gym.id, diet.id
+            gym, diet = self.gym, self.diet
+
+            def lead(n, day, lines, total):
+                return Lead(order_id=f'ORD{n}', full_name='A', email='a@example.com', phone_number='1234567890',
+                            products_json=lines if isinstance(lines, str) else json.dumps(lines),
+                            total_amount=total, created_at=datetime(2024, 1, day, 12))
+            self.db.session.add_all([
+                # 2 x 100 + 1 x 300 at list price: the 450 total splits 180 / 270
+                lead(1, 1, [{'product_id': gym, 'quantity': 2}, {'product_id': diet, 'quantity': 1}], 450.0),
+                lead(2, 2, [{'product_id': gym, 'quantity': 1}], 90.0),
+                lead(3, 2, [{'product_id': 999, 'quantity': 1}], 50.0),  # product since deleted
+                lead(4, 3, 'not json', 10.0),
+                lead(5, 20, [{'product_id': diet, 'quantity': 1}], 300.0),  # outside the range below
+            ])
+            self.db.session.commit()
+
+    def check_report(self, report):
+        by_id = {row['product_id']: row for row in report['products']}
+        self.assertAlmostEqual(by_id[self.gym]['revenue'], 270.0)
+        self.assertEqual((by_id[self.gym]['units'], by_id[self.gym]['orders']), (3, 2))
+        self.assertAlmostEqual(by_id[self.diet]['revenue'], 270.0)
+        self.assertAlmostEqual(by_id[0]['revenue'], 50.0)
+        self.assertEqual((by_id[self.gym]['view_to_cart'], by_id[self.gym]['cart_to_order']), (25.0, 30.0))
+        categories = {row['name']: row['revenue'] for row in report['categories']}
+        self.assertEqual(categories, {'Fitness Course': 270.0, 'Uncategorized': 320.0})
+        self.assertEqual((report['orders'], report['revenue']), (4, 600.0))
+        self.assertEqual([day['revenue'] for day in report['daily']], [450.0, 140.0, 10.0])
+
+    def test_report_with_and_without_numpy(self):
+        """Test that both aggregators split revenue the same way across chunks"""
+        import reporting
+        with self.app.app_context():
+            if reporting.np is not None:
+                self.check_report(reporting.build_report(date(2024, 1, 1), date(2024, 1, 10), chunk_size=2))
+            with mock.patch.object(reporting, 'np', None):
+                report = reporting.build_report(date(2024, 1, 1), date(2024, 1, 10), chunk_size=2)
+                self.assertFalse(report['vectorized'])
+                self.check_report(report)
+                with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                    reporting.init_app(self.app)
+                self.assertIn('numpy is not installed', logs.output[0])
+
+    def test_report_is_cached_until_a_new_lead(self):
+        """Test that the cached report is reused until a newer lead arrives"""
+        import reporting
+        from models import Lead
+        with self.app.app_context():
+            first = reporting.revenue_report(date(2024, 1, 1), date(2024, 1, 31))
+            self.assertIs(reporting.revenue_report(date(2024, 1, 1), date(2024, 1, 31)), first)
+            self.db.session.add(Lead(order_id='ORD6', full_name='A', email='a@example.com', phone_number='1234567890',
+                                     products_json=json.dumps([{'product_id': self.gym, 'quantity': 1}]),
+                                     total_amount=100.0, created_at=datetime(2024, 1, 25)))
+            self.db.session.commit()
+            self.assertEqual(reporting.revenue_report(date(2024, 1, 1), date(2024, 1, 31))['orders'], first['orders'] + 1)
+
+    def test_analytics_page_shows_report(self):
+        """Test that the admin analytics page renders the date-range report"""
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        response = client.get('/admin-pn/analytics?start=2024-01-01&end=2024-01-10')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'600.00', response.data)
+        self.assertIn(b'Fitness Course', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import threading
+import time
+
+from support import AppTestCase
+import cache
+
+
+class SingleFlightTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = cache.LRUCache(16, name='test')
+
+    def slow_build(self, calls, value, seconds=0.2):
+        def build():
+            calls.append(value)
+            time.sleep(seconds)
+            return value
+        return build
+
+    def in_threads(self, count, func):
+        results = [None] * count
+
+        def run(index):
+            with self.app.app_context():
+                results[index] = func()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_misses_build_once(self):
+        """Test that callers without a value wait for the one rebuilding it"""
+        calls = []
+        build = self.slow_build(calls, 'fresh')
+        results = self.in_threads(8, lambda: cache.cached_build(self.store, 'key', (1,), build))
+        self.assertEqual(results, ['fresh'] * 8)
+        self.assertEqual(calls, ['fresh'])
+
+    def test_stale_value_served_during_rebuild(self):
+        """Test that callers with a previous value get it while one caller rebuilds"""
+        with self.app.app_context():
+            cache.cached_build(self.store, 'key', (1,), lambda: 'old')
+        calls = []
+        build = self.slow_build(calls, 'new')
+        results = self.in_threads(6, lambda: cache.cached_build(self.store, 'key', (2,), build))
+        self.assertEqual(calls, ['new'])
+        self.assertEqual(sorted(results), ['new'] + ['old'] * 5)
+        with self.app.app_context():
+            self.assertEqual(cache.cached_build(self.store, 'key', (2,), build), 'new')
+
+    @unittest.skipIf(cache.fcntl is None, 'fcntl is not available')
+    def test_other_worker_holds_the_lease(self):
+        """Test that a lease held by another process defers the rebuild"""
+        import fcntl
+        with self.app.app_context():
+            cache.cached_build(self.store, 'key', (1,), lambda: 'old')
+            path = cache._lease_path(cache._stripe(('test', 'key')))
+            with open(path, 'a') as other_worker:
+                fcntl.flock(other_worker, fcntl.LOCK_EX)
+                self.assertEqual(cache.cached_build(self.store, 'key', (2,), lambda: 'new'), 'old')
+                # Nothing to fall back on: wait SINGLE_FLIGHT_WAIT, then build anyway
+                self.app.config['SINGLE_FLIGHT_WAIT'] = 0.05
+                empty = cache.LRUCache(16, name='test')
+                started = time.monotonic()
+                self.assertEqual(cache.cached_build(empty, 'key', (2,), lambda: 'built'), 'built')
+                self.assertGreaterEqual(time.monotonic() - started, 0.05)
+            self.assertEqual(cache.cached_build(self.store, 'key', (2,), lambda: 'new'), 'new')
+
+    def test_nested_flights_on_one_stripe(self):
+        """Test that a rebuild needing a key on its own stripe does not wait for itself"""
+        with self.app.app_context():
+            with cache.single_flight('outer', wait=1) as leader:
+                self.assertTrue(leader)
+                started = time.monotonic()
+                with cache.single_flight('outer', wait=1) as nested:
+                    self.assertTrue(nested)
+                self.assertLess(time.monotonic() - started, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import time
+from unittest import mock
+
+from support import AppTestCase
+
+HOUR = 3600
+
+
+class TrendingTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Product, Category
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            fitness = Category(name='Fitness Course')
+            self.db.session.add(fitness)
+            products = [
+                Product(title='Old Hit', description='', price_inr=100.0, category=fitness),
+                Product(title='New Hit', description='', price_inr=100.0, category=fitness),
+                Product(title='Pinned', description='', price_inr=100.0, is_hot_product=True),
+                Product(title='Quiet', description='', price_inr=100.0),
+            ]
+            self.db.session.add_all(products)
+            self.db.session.commit()
+            self.ids = {p.title: p.id for p in products}
+            self.category_id = fitness.id
+
+    def test_scores_decay_and_merge_across_flushes(self):
+        """Test that recent events outrank older, larger ones after enough half-lives"""
+        import trending
+        from models import ProductTrend
+        now = time.time()
+        with self.app.app_context():
+            # 100 views three days ago vs. two orders (40) just now; half-life is 24h
+            for _ in range(100):
+                trending.record(self.ids['Old Hit'], 'view', timestamp=now - 72 * HOUR)
+            trending.flush()
+            trending.record(self.ids['New Hit'], 'order', 2, timestamp=now)
+            trending.flush()
+
+            engine = self.app.extensions['trending']
+            scores = {row.product_id: engine.current_score(row.log_score, now) for row in ProductTrend.query}
+            self.assertAlmostEqual(scores[self.ids['Old Hit']], 12.5, places=6)
+            self.assertAlmostEqual(scores[self.ids['New Hit']], 40.0, places=6)
+            self.assertEqual(engine.trending_ids, [self.ids['New Hit'], self.ids['Old Hit']])
+            self.assertEqual(engine.category_ids[self.category_id], [self.ids['New Hit'], self.ids['Old Hit']])
+
+            # A second flush of the same product merges into its score
+            trending.record(self.ids['Old Hit'], 'cart', 6, timestamp=now)
+            trending.flush()
+            score = engine.current_score(self.db.session.get(ProductTrend, self.ids['Old Hit']).log_score, now)
+            self.assertAlmostEqual(score, 42.5, places=6)
+
+    def test_homepage_pins_hot_products_before_trending(self):
+        import trending
+        client = self.app.test_client()
+        client.get(f"/product/{self.ids['New Hit']}")
+        with self.app.app_context():
+            trending.flush()
+            titles = [p.title for p in trending.hot_products(limit=4)]
+            self.assertEqual(titles, ['Pinned', 'New Hit'])
+            titles = [p.title for p in trending.hot_products(limit=4, category_id=self.category_id)]
+            self.assertEqual(titles, ['New Hit'])
+
+        data = client.get('/').data
+        self.assertIn(b'Trending Now', data)
+        self.assertIn(b'Top in Fitness Course', client.get(f'/category/{self.category_id}').data)
+
+    def test_failed_flush_does_not_fail_the_page(self):
+        """Test that a due flush runs in the background and a locked database keeps the events"""
+        import tasks
+        import trending
+        from sqlalchemy.exc import OperationalError
+        engine = self.app.extensions['trending']
+        engine.flush_seconds = 0
+        client = self.app.test_client()
+        client.get(f"/product/{self.ids['New Hit']}")
+
+        locked = OperationalError('UPDATE product_trends', {}, Exception('database is locked'))
+        with mock.patch.object(trending, '_merge_score', side_effect=locked), \
+                mock.patch('traceback.print_exc'):
+            self.assertEqual(client.get('/').status_code, 200)
+            tasks.drain()
+        self.assertIn(self.ids['New Hit'], engine.pending)
+
+        client.get('/')
+        tasks.drain()
+        self.assertEqual(engine.pending, {})
+        self.assertEqual(engine.trending_ids, [self.ids['New Hit']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+import hashlib
+import os
+
+from support import AppTestCase
+
+
+class ChunkedUploadTestCase(AppTestCase):
+    config = {'WTF_CSRF_ENABLED': False}
+
+    def setUp(self):
+        super().setUp()
+        self.folder = self.temp_dir()
+        self.app.config['UPLOAD_FOLDER'] = os.path.join(self.folder, 'uploads')
+        self.app.config['UPLOAD_TEMP_FOLDER'] = os.path.join(self.folder, 'tmp')
+        self.app.config['UPLOAD_CHUNK_SIZE'] = 1000
+        self.client = self.app.test_client()
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Existing', description='', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.commit()
+            self.product_id = product.id
+
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+
+        self.image = os.urandom(2500)
+
+    def start(self, data=None, **extra):
+        data = data if data is not None else self.image
+        return self.client.post('/admin-pn/uploads', json=dict(
+            filename='photo.png', size=len(data), sha256=hashlib.sha256(data).hexdigest(), **extra))
+
+    def put(self, upload_id, first, last, data=None, **headers):
+        data = data if data is not None else self.image
+        chunk = data[first:last + 1]
+        headers['Content-Range'] = f'bytes {first}-{last}/{len(data)}'
+        return self.client.put(f'/admin-pn/uploads/{upload_id}', data=chunk, headers=headers)
+
+    def upload(self, data=None, **extra):
+        data = data if data is not None else self.image
+        upload_id = self.start(data, **extra).get_json()['id']
+        for first in range(0, len(data), 1000):
+            response = self.put(upload_id, first, min(first + 999, len(data) - 1), data)
+            self.assertEqual(response.status_code, 200)
+        return upload_id, response.get_json()
+
+    def test_chunks_are_appended_and_resumed(self):
+        """Test that an interrupted upload resumes from the offset the server reports"""
+        response = self.start()
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.get_json()['id']
+        self.assertEqual(response.get_json()['chunk_size'], 1000)
+
+        self.assertEqual(self.put(upload_id, 0, 999).status_code, 200)
+        # A retried chunk the server already has is refused with the current offset
+        response = self.put(upload_id, 0, 999)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['offset'], 1000)
+        self.assertEqual(self.client.get(f'/admin-pn/uploads/{upload_id}').get_json()['offset'], 1000)
+
+        self.put(upload_id, 1000, 1999)
+        state = self.put(upload_id, 2000, 2499).get_json()
+        self.assertTrue(state['complete'])
+        self.assertEqual(state['offset'], 2500)
+        with open(os.path.join(self.folder, 'tmp', f'{upload_id}.part'), 'rb') as f:
+            self.assertEqual(f.read(), self.image)
+
+    def test_chunk_checksum_mismatch_is_discarded(self):
+        """Test that a corrupted chunk is rolled back and can be sent again"""
+        upload_id = self.start().get_json()['id']
+        response = self.put(upload_id, 0, 999, **{'X-Chunk-SHA256': '0' * 64})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['offset'], 0)
+
+        good = hashlib.sha256(self.image[:1000]).hexdigest()
+        self.assertEqual(self.put(upload_id, 0, 999, **{'X-Chunk-SHA256': good}).status_code, 200)
+
+    def test_file_checksum_mismatch_drops_the_upload(self):
+        """Test that a file whose bytes do not match the announced SHA-256 is not kept"""
+        upload_id = self.start().get_json()['id']
+        corrupted = bytes(len(self.image))
+        for first in (0, 1000):
+            self.put(upload_id, first, first + 999, corrupted)
+        response = self.put(upload_id, 2000, 2499, corrupted)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f'/admin-pn/uploads/{upload_id}').status_code, 404)
+
+    def test_rejects_bad_requests(self):
+        """Test that oversized chunks, bad ranges and non-images are refused"""
+        upload_id = self.start().get_json()['id']
+        self.assertEqual(self.put(upload_id, 0, 1499).status_code, 413)
+        response = self.client.put(f'/admin-pn/uploads/{upload_id}', data=b'x')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(f'/admin-pn/uploads/{upload_id}', data=b'x',
+                                   headers={'Content-Range': 'bytes 0-0/9'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(self.client.get('/admin-pn/uploads/not-an-upload').status_code, 404)
+
+        response = self.client.post('/admin-pn/uploads', json={'filename': 'run.sh', 'size': 10, 'sha256': '0' * 64})
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_naming_a_product_is_attached_on_completion(self):
+        """Test that finishing an upload for an existing product adds the image"""
+        from models import ProductImage
+        upload_id, state = self.upload(product_id=self.product_id)
+        self.assertEqual(state['image']['product_id'], self.product_id)
+        with self.app.app_context():
+            image = ProductImage.query.filter_by(product_id=self.product_id).one()
+            with open(os.path.join(self.app.config['UPLOAD_FOLDER'], image.filename), 'rb') as f:
+                self.assertEqual(f.read(), self.image)
+        self.assertEqual(os.listdir(os.path.join(self.folder, 'tmp')), [])
+
+    def test_new_product_form_attaches_finished_uploads(self):
+        """Test that the product form accepts upload ids instead of file fields"""
+        from models import Product
+        first, _ = self.upload()
+        second, _ = self.upload(os.urandom(1200))
+        response = self.client.post('/admin-pn/products/new', data={
+            'title': 'Chunked Course', 'price_inr': '499', 'active': 'y',
+            'upload_ids': [first, second],
+        })
+        self.assertEqual(response.status_code, 302)
+        with self.app.app_context():
+            product = Product.query.filter_by(title='Chunked Course').one()
+            self.assertEqual([image.position for image in product.images], [0, 1])
+
+        # Ids are used up once attached
+        response = self.client.post('/admin-pn/products/new', data={
+            'title': 'Again', 'price_inr': '499', 'upload_ids': [first],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'expired upload', response.data)
+
+    def test_purge_removes_stale_uploads(self):
+        """Test that unfinished uploads past the expiry are removed"""
+        import time
+        import uploads
+        upload_id = self.start().get_json()['id']
+        with self.app.app_context():
+            self.assertEqual(uploads.purge_expired(), 0)
+            self.assertEqual(uploads.purge_expired(now=time.time() + 25 * 3600), 1)
+        self.assertEqual(self.client.get(f'/admin-pn/uploads/{upload_id}').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from datetime import date, timedelta
+
+from hll import HyperLogLog
+from support import AppTestCase
+
+
+class HyperLogLogTestCase(unittest.TestCase):
+    def test_estimate_within_error_bounds(self):
+        """Test estimates stay within a few standard errors of the true count"""
+        for n in (0, 1, 50, 5000, 50000):
+            sketch = HyperLogLog()
+            for i in range(n):
+                sketch.add(f'visitor-{i}')
+            self.assertLessEqual(abs(sketch.count() - n), max(1, 4 * sketch.relative_error * n))
+
+    def test_merge_is_union_and_round_trips(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            a.add(str(i))
+        for i in range(2000, 5000):
+            b.add(str(i))
+        union = HyperLogLog.union([a, b])
+        self.assertAlmostEqual(union.count(), 5000, delta=5000 * 4 * union.relative_error)
+        self.assertEqual(HyperLogLog.from_bytes(union.to_bytes()).registers, union.registers)
+        with self.assertRaises(ValueError):
+            a.merge(HyperLogLog(precision=10))
+
+
+class VisitorSketchTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        from models import SiteSettings, Product
+        with self.app.app_context():
+            self.db.session.add(SiteSettings())
+            product = Product(title='Course', description='A course', price_inr=100.0)
+            self.db.session.add(product)
+            self.db.session.commit()
+            self.product_id = product.id
+
+    def test_flushes_merge_across_days_and_workers(self):
+        """Test that repeated flushes merge, and ranges union daily sketches"""
+        import visitors
+        from models import VisitorSketch
+        today = date(2026, 3, 31)
+        with self.app.app_context():
+            # Two "workers" flushing overlapping visitors for the same day
+            for start in (0, 50):
+                for i in range(start, start + 100):
+                    visitors.record_visit(f'ip-{i}', day=today)
+                visitors.flush()
+            for i in range(40):
+                visitors.record_visit(f'ip-{i}', product_id=self.product_id, day=today - timedelta(days=40))
+            visitors.flush()
+
+            self.assertEqual(VisitorSketch.query.filter_by(day=today).count(), 1)
+            # Small counts use linear counting: within a couple of the truth
+            self.assertAlmostEqual(visitors.unique_visitors(days=1, today=today), 150, delta=3)
+            self.assertAlmostEqual(visitors.unique_visitors(days=30, today=today), 150, delta=3)
+            self.assertAlmostEqual(visitors.unique_visitors(), 150, delta=3)
+            self.assertEqual(visitors.unique_visitors(days=30, product_id=self.product_id, today=today), 0)
+            viewers = visitors.unique_viewers_by_product([self.product_id], days=60, today=today)
+            self.assertAlmostEqual(viewers[self.product_id], 40, delta=2)
+
+    def test_pages_and_dashboard(self):
+        """Test that storefront hits are counted once per visitor on the dashboard"""
+        client = self.app.test_client()
+        for _ in range(3):
+            client.get('/', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        client.get(f'/product/{self.product_id}', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+
+        with client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        response = client.get('/admin-pn/dashboard')
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            import visitors
+            self.assertEqual(visitors.unique_visitors(days=30), 2)
+        self.assertIn(b'1 unique viewers', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
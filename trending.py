@@ -0,0 +1,226 @@
+"""Time-decayed trending scores for products.
+
+Every view, add-to-cart and order adds a weight to its product's score, and
+scores halve every ``TRENDING_HALF_LIFE_HOURS``. Instead of decaying every
+row on a timer, scores are kept in log space relative to a fixed landmark
+time: an event of weight ``w`` at time ``t`` adds ``log(w) + λ(t - LANDMARK)``
+(via logaddexp), so older events count exponentially less and the stored
+``log_score`` orders products exactly as their current decayed scores do.
+
+Events are buffered per worker and merged into ``product_trends`` every
+``TRENDING_FLUSH_SECONDS``. The merge runs on the background task queue, so
+a slow or locked database never fails the page that found it due; pages
+keep using the last snapshot. After a flush each worker reloads a small
+in-memory snapshot: the overall top ``TRENDING_TOP_N`` and the top
+``TRENDING_CATEGORY_TOP_N`` per category, so pages never sort at request
+time. Products flagged ``is_hot_product`` are pinned ahead of the trending
+ones.
+"""
+import atexit
+import math
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+import catalog
+from models import Product, ProductTrend, db
+import tasks
+
+# 2024-01-01T00:00:00Z; any fixed time works
+LANDMARK = 1704067200.0
+
+EVENT_WEIGHTS = {'view': 1.0, 'cart': 5.0, 'order': 20.0}
+
+
+def logaddexp(a, b):
+    """log(exp(a) + exp(b)) without overflow"""
+    if a is None:
+        return b
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+class TrendingEngine:
+    """Per-worker event buffer and top-N snapshot"""
+
+    def __init__(self, half_life_hours, flush_seconds, top_n, category_top_n):
+        self.decay_rate = math.log(2) / (half_life_hours * 3600)
+        self.flush_seconds = flush_seconds
+        self.top_n = top_n
+        self.category_top_n = category_top_n
+        self.pending = {}  # product_id -> log weight at the landmark
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.trending_ids = []
+        self.category_ids = {}  # category_id -> [product_id, ...]
+        self.loaded = False
+
+    def log_weight(self, weight, timestamp):
+        return math.log(weight) + self.decay_rate * (timestamp - LANDMARK)
+
+    def current_score(self, log_score, now=None):
+        """Decayed score of a stored ``log_score`` at time ``now``"""
+        now = time.time() if now is None else now
+        return math.exp(log_score - self.decay_rate * (now - LANDMARK))
+
+    def add(self, product_id, weight, timestamp):
+        with self.lock:
+            self.pending[product_id] = logaddexp(self.pending.get(product_id), self.log_weight(weight, timestamp))
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        return pending
+
+    def put_back(self, pending):
+        with self.lock:
+            for product_id, log_weight in pending.items():
+                self.pending[product_id] = logaddexp(self.pending.get(product_id), log_weight)
+
+    def claim_flush(self):
+        """True for the one caller that should schedule the due flush"""
+        with self.lock:
+            if time.monotonic() - self.last_flush < self.flush_seconds:
+                return False
+            self.last_flush = time.monotonic()
+        return True
+
+
+def _engine():
+    return current_app.extensions['trending']
+
+
+def record(product_id, event, amount=1, timestamp=None):
+    """Buffer a 'view', 'cart' or 'order' event for a product"""
+    if not product_id or amount <= 0:
+        return
+    timestamp = time.time() if timestamp is None else timestamp
+    _engine().add(product_id, EVENT_WEIGHTS[event] * amount, timestamp)
+
+
+def _merge_score(product_id, log_weight):
+    while True:
+        row = db.session.execute(
+            select(ProductTrend.log_score, ProductTrend.version).filter_by(product_id=product_id)
+        ).first()
+        if row is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(ProductTrend).values(
+                        product_id=product_id, log_score=log_weight, version=0
+                    ))
+                return
+            except IntegrityError:
+                continue  # Another worker created the row first; merge into it
+        result = db.session.execute(
+            update(ProductTrend)
+            .where(ProductTrend.product_id == product_id, ProductTrend.version == row.version)
+            .values(log_score=logaddexp(row.log_score, log_weight), version=row.version + 1)
+        )
+        if result.rowcount:
+            return
+
+
+def load_snapshot():
+    """Reload this worker's in-memory top-N lists from the stored scores"""
+    engine = _engine()
+    trending_ids = db.session.scalars(
+        select(ProductTrend.product_id)
+        .join(Product, Product.id == ProductTrend.product_id)
+        .where(Product.active == True)
+        .order_by(ProductTrend.log_score.desc())
+        .limit(engine.top_n)
+    ).all()
+
+    position = func.row_number().over(
+        partition_by=Product.category_id, order_by=ProductTrend.log_score.desc()
+    ).label('position')
+    ranked = (
+        select(Product.category_id, ProductTrend.product_id, position)
+        .join(Product, Product.id == ProductTrend.product_id)
+        .where(Product.active == True, Product.category_id.isnot(None))
+        .subquery()
+    )
+    category_ids = {}
+    for category_id, product_id in db.session.execute(
+        select(ranked.c.category_id, ranked.c.product_id)
+        .where(ranked.c.position <= engine.category_top_n)
+        .order_by(ranked.c.category_id, ranked.c.position)
+    ):
+        category_ids.setdefault(category_id, []).append(product_id)
+
+    engine.trending_ids, engine.category_ids, engine.loaded = trending_ids, category_ids, True
+
+
+def flush(reload=True):
+    """Merge this worker's buffered events into the stored scores"""
+    engine = _engine()
+    pending = engine.take()
+    if pending:
+        try:
+            for product_id in sorted(pending):
+                _merge_score(product_id, pending[product_id])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            engine.put_back(pending)  # Keep the events for the next attempt
+            raise
+    if reload:
+        load_snapshot()
+    return len(pending)
+
+
+def _flush_in_background(app):
+    with app.app_context():
+        try:
+            flush()
+        finally:
+            db.session.remove()
+
+
+def _refresh_if_stale():
+    engine = _engine()
+    if not engine.loaded:
+        load_snapshot()  # Reads only; the first page needs lists to show
+    if engine.claim_flush():
+        tasks.enqueue(_flush_in_background, current_app._get_current_object())
+
+
+def hot_products(limit=4, category_id=None):
+    """Pinned hot products, then the trending ones (overall or in a category)"""
+    _refresh_if_stale()
+    engine = _engine()
+    snapshot = catalog.current()
+    pinned = list(snapshot.hot_products(category_id)[:limit])
+
+    ranked_ids = engine.category_ids.get(category_id, []) if category_id is not None else engine.trending_ids
+    pinned_ids = {product.id for product in pinned}
+    wanted = [snapshot.products[pid] for pid in ranked_ids if pid in snapshot.products and pid not in pinned_ids]
+    return pinned + wanted[:limit - len(pinned)]
+
+
+def _flush_at_exit(app):
+    if app.testing:
+        return
+    with app.app_context():
+        try:
+            flush(reload=False)
+        except Exception as e:
+            print(f"Could not flush trending scores: {e}")
+
+
+def init_app(app):
+    """Configure the trending engine for an application"""
+    app.config.setdefault('TRENDING_HALF_LIFE_HOURS', 24)
+    app.config.setdefault('TRENDING_FLUSH_SECONDS', 30)
+    app.config.setdefault('TRENDING_TOP_N', 20)
+    app.config.setdefault('TRENDING_CATEGORY_TOP_N', 8)
+    app.extensions['trending'] = TrendingEngine(
+        app.config['TRENDING_HALF_LIFE_HOURS'], app.config['TRENDING_FLUSH_SECONDS'],
+        app.config['TRENDING_TOP_N'], app.config['TRENDING_CATEGORY_TOP_N'],
+    )
+    atexit.register(_flush_at_exit, app)
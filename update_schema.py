@@ -25,6 +25,16 @@ with app.app_context():
         except Exception as e:
             print(f"! Could not add is_hot_product column: {e}")
     
+    if 'effective_price' not in col_names:
+        try:
+            db.session.execute(db.text("ALTER TABLE products ADD COLUMN effective_price FLOAT"))
+            db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_products_effective_price ON products (effective_price)"))
+            import pricing
+            pricing.refresh_effective_prices(db.session)
+            print("✓ Added and populated effective_price column on products table")
+        except Exception as e:
+            print(f"! Could not add effective_price column: {e}")
+    
     # Create categories table if it doesn't exist
     try:
         db.session.execute(db.text("""
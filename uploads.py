@@ -0,0 +1,246 @@
+"""Chunked, resumable admin image uploads.
+
+Instead of one multipart POST holding every image, the product form sends
+each image in pieces:
+
+1. ``POST /admin-pn/uploads`` with ``{"filename", "size", "sha256"}`` starts
+   an upload and returns its id and the chunk size to use
+2. ``PUT /admin-pn/uploads/<id>`` with ``Content-Range: bytes first-last/size``
+   appends one chunk; an ``X-Chunk-SHA256`` header, when sent, is checked
+   before the chunk is kept
+3. ``GET /admin-pn/uploads/<id>`` returns how many bytes have arrived, so an
+   interrupted upload carries on from there
+
+Chunks are copied from the request stream in small blocks straight onto
+``<id>.part`` in ``UPLOAD_TEMP_FOLDER``; the upload's details sit next to it
+in ``<id>.json``, so any worker can take the next chunk. Once the last byte
+is in, the SHA-256 of the whole file is checked. A completed upload is
+attached to its product by moving the file into ``UPLOAD_FOLDER``: right
+away if the upload named a product, otherwise when the product form is
+saved with its ``upload_ids``. Unfinished uploads are removed after
+``UPLOAD_EXPIRY_HOURS``.
+"""
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from models import ProductImage, db
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: chunks of one upload are not serialised across processes
+
+READ_BLOCK = 64 * 1024
+
+_ID = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """An upload request that cannot be applied; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _paths(upload_id):
+    if not _ID.match(upload_id or ''):
+        raise UploadError('Unknown upload', 404)
+    folder = current_app.config['UPLOAD_TEMP_FOLDER']
+    return os.path.join(folder, f'{upload_id}.part'), os.path.join(folder, f'{upload_id}.json')
+
+
+def _load(upload_id):
+    _, state_path = _paths(upload_id)
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Unknown or expired upload', 404)
+
+
+def _save(state):
+    _, state_path = _paths(state['id'])
+    temp_path = f"{state_path}.{os.getpid()}"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, state_path)
+
+
+def _with_offset(state):
+    part_path, _ = _paths(state['id'])
+    try:
+        offset = os.path.getsize(part_path)
+    except FileNotFoundError:
+        offset = state['size'] if state['complete'] else 0
+    return dict(state, offset=offset)
+
+
+def discard(upload_id):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def create_upload(filename, size, sha256, product_id=None):
+    """Start an upload; returns its state (with ``offset`` 0)"""
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise UploadError('size must be a positive number of bytes')
+    if size > current_app.config['UPLOAD_MAX_BYTES']:
+        raise UploadError(f"Images may be at most {current_app.config['UPLOAD_MAX_BYTES']} bytes", 413)
+    sha256 = (sha256 or '').lower()
+    if not _SHA256.match(sha256):
+        raise UploadError('sha256 must be the hex SHA-256 of the file')
+    purge_expired()
+
+    state = {
+        'id': secrets.token_urlsafe(18),
+        'filename': secure_filename(os.path.basename(filename)) or 'image',
+        'size': size,
+        'sha256': sha256,
+        'product_id': product_id,
+        'created': time.time(),
+        'complete': False,
+    }
+    os.makedirs(current_app.config['UPLOAD_TEMP_FOLDER'], exist_ok=True)
+    part_path, _ = _paths(state['id'])
+    open(part_path, 'xb').close()
+    _save(state)
+    return dict(state, offset=0, chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'])
+
+
+def upload_status(upload_id):
+    return _with_offset(_load(upload_id))
+
+
+def _file_sha256(f):
+    f.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(READ_BLOCK), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def write_chunk(upload_id, stream, first, last, total, chunk_sha256=None):
+    """Append bytes ``first``..``last`` (inclusive) read from ``stream``; returns the new state
+
+    Raises UploadError with status 409 and the current ``offset`` when the
+    chunk does not start where the file ends, so the client can resume.
+    """
+    state = _load(upload_id)
+    if state['complete']:
+        raise UploadError('Upload already complete', 409, state['size'])
+    length = last - first + 1
+    if total != state['size'] or first < 0 or length <= 0 or last >= total:
+        raise UploadError('Content-Range does not match the upload', 416)
+    if length > current_app.config['UPLOAD_CHUNK_SIZE']:
+        raise UploadError(f"Chunks may be at most {current_app.config['UPLOAD_CHUNK_SIZE']} bytes", 413)
+
+    part_path, _ = _paths(upload_id)
+    try:
+        f = open(part_path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Unknown or expired upload', 404)
+    with f:
+        if fcntl is not None:
+            # One writer per upload, even when retried chunks race across workers
+            fcntl.flock(f, fcntl.LOCK_EX)
+        offset = f.seek(0, os.SEEK_END)
+        if first != offset:
+            raise UploadError('Chunk does not continue the upload', 409, offset)
+
+        digest = hashlib.sha256()
+        remaining = length
+        while remaining:
+            block = stream.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            remaining -= len(block)
+        if remaining or (chunk_sha256 and digest.hexdigest() != chunk_sha256.lower()):
+            f.truncate(offset)
+            message = 'Chunk was cut short' if remaining else 'Chunk checksum mismatch'
+            raise UploadError(message, 400, offset)
+        f.flush()
+
+        if offset + length == state['size']:
+            if _file_sha256(f) != state['sha256']:
+                f.close()
+                discard(upload_id)
+                raise UploadError('File checksum mismatch; start the upload again', 400)
+            state['complete'] = True
+            _save(state)
+    return dict(state, offset=offset + length)
+
+
+def completed(upload_ids):
+    """States of the given finished uploads, in order; raises UploadError otherwise"""
+    states = []
+    for upload_id in upload_ids:
+        state = _load(upload_id)
+        if not state['complete']:
+            raise UploadError('An image upload has not finished', 409)
+        states.append(state)
+    return states
+
+
+def attach(states, product, position):
+    """Move finished uploads into UPLOAD_FOLDER as the product's images from ``position`` (caller commits)"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+    images = []
+    for i, state in enumerate(states, start=position):
+        name, ext = os.path.splitext(state['filename'])
+        timestamp = int(datetime.utcnow().timestamp())
+        filename = f"{product.id}_{name}_{timestamp}_{i}{ext}"
+        part_path, _ = _paths(state['id'])
+        os.replace(part_path, os.path.join(upload_folder, filename))
+        discard(state['id'])
+        image = ProductImage(product_id=product.id, filename=filename, position=i)
+        db.session.add(image)
+        images.append(image)
+    return images
+
+
+def purge_expired(now=None):
+    """Remove uploads older than UPLOAD_EXPIRY_HOURS; returns how many"""
+    folder = current_app.config['UPLOAD_TEMP_FOLDER']
+    cutoff = (now or time.time()) - current_app.config['UPLOAD_EXPIRY_HOURS'] * 3600
+    removed = 0
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        upload_id, ext = os.path.splitext(name)
+        if ext != '.json' or not _ID.match(upload_id):
+            continue
+        try:
+            if os.path.getmtime(os.path.join(folder, name)) < cutoff:
+                discard(upload_id)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def init_app(app):
+    """Configure chunked uploads for an application"""
+    app.config.setdefault('UPLOAD_TEMP_FOLDER', os.environ.get(
+        'UPLOAD_TEMP_FOLDER', os.path.join(app.instance_path, 'uploads_tmp')))
+    app.config.setdefault('UPLOAD_CHUNK_SIZE', int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024)))
+    app.config.setdefault('UPLOAD_MAX_BYTES', int(os.environ.get('UPLOAD_MAX_BYTES', 25 * 1024 * 1024)))
+    app.config.setdefault('UPLOAD_EXPIRY_HOURS', 24)
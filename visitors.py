@@ -0,0 +1,182 @@
+"""Unique-visitor counting with HyperLogLog sketches.
+
+Instead of one ``Visitor`` row per IP hash, each worker adds visitor keys to
+in-memory sketches, one per (day, product) plus one per day for the whole
+site (``product_id`` 0). Buffered sketches are merged into
+``visitor_sketches`` rows every ``VISITOR_SKETCH_FLUSH_SECONDS``; merges use
+an optimistic version check so concurrent workers never lose each other's
+updates. Any date range is the union of its daily sketches, e.g. "unique
+visitors in the last 30 days" merges 30 small blobs.
+"""
+import atexit
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from hll import HyperLogLog, DEFAULT_PRECISION
+from models import VisitorSketch, db
+
+SITE = 0  # product_id of the site-wide sketches
+
+RELATIVE_ERROR = HyperLogLog(DEFAULT_PRECISION).relative_error
+
+
+def visitor_key(ip_address):
+    """Privacy-preserving visitor identity (same hash the Visitor table used)"""
+    return hashlib.sha256((ip_address or '').encode()).hexdigest()
+
+
+class SketchBuffer:
+    """Per-worker sketches not yet merged into the database"""
+
+    def __init__(self, flush_seconds):
+        self.flush_seconds = flush_seconds
+        self.sketches = {}  # (day, product_id) -> HyperLogLog
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def add(self, day, product_id, key):
+        """Add a visitor key; return True when a flush is due"""
+        with self.lock:
+            self.sketches.setdefault((day, product_id), HyperLogLog()).add(key)
+            return time.monotonic() - self.last_flush >= self.flush_seconds
+
+    def take(self):
+        with self.lock:
+            pending, self.sketches = self.sketches, {}
+            self.last_flush = time.monotonic()
+        return pending
+
+    def put_back(self, pending):
+        with self.lock:
+            for key, sketch in pending.items():
+                self.sketches.setdefault(key, HyperLogLog(sketch.precision)).merge(sketch)
+
+
+def record_visit(key, product_id=None, day=None):
+    """Count ``key`` as a visitor of the site (and of a product) for ``day``"""
+    day = day or datetime.utcnow().date()
+    buffer = current_app.extensions['visitor_sketches']
+    due = buffer.add(day, SITE, key)
+    if product_id:
+        due = buffer.add(day, product_id, key) or due
+    if due:
+        flush()
+
+
+def _merge_row(day, product_id, sketch):
+    """Merge one buffered sketch into its stored row; retry on conflicts"""
+    while True:
+        row = db.session.execute(
+            db.select(VisitorSketch.id, VisitorSketch.registers, VisitorSketch.version)
+            .filter_by(day=day, product_id=product_id)
+        ).first()
+        if row is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(VisitorSketch).values(
+                        day=day, product_id=product_id, registers=sketch.to_bytes(), version=0
+                    ))
+                return
+            except IntegrityError:
+                continue  # Another worker created the row first; merge into it
+
+        stored = HyperLogLog.from_bytes(row.registers)
+        merged = HyperLogLog.union([stored, sketch], stored.precision)
+        if merged.registers == stored.registers:
+            return
+        result = db.session.execute(
+            update(VisitorSketch)
+            .where(VisitorSketch.id == row.id, VisitorSketch.version == row.version)
+            .values(registers=merged.to_bytes(), version=row.version + 1)
+        )
+        if result.rowcount:
+            return
+
+
+def flush():
+    """Write this worker's buffered sketches to the database"""
+    buffer = current_app.extensions['visitor_sketches']
+    pending = buffer.take()
+    if not pending:
+        return 0
+    try:
+        for (day, product_id), sketch in sorted(pending.items(), key=lambda item: item[0]):
+            _merge_row(day, product_id, sketch)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        buffer.put_back(pending)  # Keep the counts for the next attempt
+        raise
+    return len(pending)
+
+
+def _day_range(days, today=None):
+    today = today or datetime.utcnow().date()
+    return today - timedelta(days=days - 1), today
+
+
+def merged_sketch(days=None, product_id=SITE, today=None):
+    """Union of the stored daily sketches for the last ``days`` days (all if None)"""
+    query = db.select(VisitorSketch.registers).filter_by(product_id=product_id)
+    if days is not None:
+        start, end = _day_range(days, today)
+        query = query.filter(VisitorSketch.day.between(start, end))
+    return HyperLogLog.union(HyperLogLog.from_bytes(blob) for blob in db.session.scalars(query))
+
+
+def unique_visitors(days=None, product_id=SITE, today=None):
+    """Estimated distinct visitors over the last ``days`` days (all time if None)"""
+    return merged_sketch(days, product_id, today).count()
+
+
+def unique_viewers_by_product(product_ids, days=30, today=None):
+    """{product_id: estimated distinct viewers} for the last ``days`` days, in one query"""
+    if not product_ids:
+        return {}
+    start, end = _day_range(days, today)
+    rows = db.session.execute(
+        db.select(VisitorSketch.product_id, VisitorSketch.registers)
+        .filter(VisitorSketch.product_id.in_(product_ids), VisitorSketch.day.between(start, end))
+    )
+    grouped = {}
+    for product_id, blob in rows:
+        grouped.setdefault(product_id, []).append(HyperLogLog.from_bytes(blob))
+    return {pid: HyperLogLog.union(grouped[pid]).count() if pid in grouped else 0 for pid in product_ids}
+
+
+def backfill_from_visitor_table(batch_size=1000):
+    """Add legacy ``Visitor`` rows to the sketches of their first and last day"""
+    from models import Visitor
+    buffer = current_app.extensions['visitor_sketches']
+    count = 0
+    query = db.select(Visitor.ip_hash, Visitor.first_seen, Visitor.last_seen).execution_options(yield_per=batch_size)
+    for ip_hash, first_seen, last_seen in db.session.execute(query):
+        for day in {seen.date() for seen in (first_seen, last_seen) if seen}:
+            buffer.add(day, SITE, ip_hash)
+        count += 1
+    flush()
+    return count
+
+
+def _flush_at_exit(app):
+    if app.testing:
+        return
+    with app.app_context():
+        try:
+            flush()
+        except Exception as e:
+            print(f"Could not flush visitor sketches: {e}")
+
+
+def init_app(app):
+    """Configure sketch buffering for an application"""
+    app.config.setdefault('VISITOR_SKETCH_FLUSH_SECONDS', 10)
+    app.extensions['visitor_sketches'] = SketchBuffer(app.config['VISITOR_SKETCH_FLUSH_SECONDS'])
+    # Workers exit gracefully on reload and max_requests; don't lose their buffer
+    atexit.register(_flush_at_exit, app)
@@ -0,0 +1,16 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module only builds the application object. Schema creation
+and seeding happen out of band (``python -m flask --app wsgi init-db``),
+so with ``preload_app`` the master imports everything once and forked
+workers share that memory copy-on-write and start immediately.
+"""
+import os
+from app import create_app, warm_up
+
+app, db = create_app()
+
+if os.environ.get('SKIP_WARM_UP') != '1':
+    warm_up(app)